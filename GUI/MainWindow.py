@@ -101,6 +101,9 @@ class MainWindow(QMainWindow):
         if self.project and self.project.subtitles:
             self.project.UpdateProjectFile()
 
+        if self.project:
+            self.project.Close()
+
         super().closeEvent(e)
 
     def _on_action_requested(self, action_name, params):
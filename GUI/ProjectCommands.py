@@ -4,6 +4,7 @@ from GUI.ProjectDataModel import ProjectDataModel
 from PySubtitleGPT.SubtitleFile import SubtitleFile
 from PySubtitleGPT.SubtitleScene import SubtitleScene
 from PySubtitleGPT.SubtitleBatch import SubtitleBatch
+from PySubtitleGPT.SubtitleLine import SubtitleLine
 from PySubtitleGPT.SubtitleProject import SubtitleProject
 from PySubtitleGPT.SubtitleError import TranslationError
 
@@ -57,7 +58,7 @@ class MergeScenesCommand(Command):
         project : SubtitleProject = self.datamodel.project
 
         if len(self.scene_numbers) > 1:
-            project.subtitles.MergeScenes(self.scene_numbers)
+            project.MergeScenes(self.scene_numbers)
 
         #TODO: incremental updates to the data/view model
         self.datamodel.CreateViewModel()
@@ -82,7 +83,7 @@ class MergeBatchesCommand(Command):
 
         # First merge selected batches in each scene
         if len(self.batch_numbers) > 1:
-            project.subtitles.MergeBatches(self.scene_number, self.batch_numbers)
+            project.MergeBatches(self.scene_number, self.batch_numbers)
 
         #TODO: incremental updates to the data/view model
         self.datamodel.CreateViewModel()
@@ -102,6 +103,7 @@ class TranslateSceneCommand(Command):
         self.datamodel_update = { scene_number : {
 
         }}
+        self.batches_changed = False
 
     def execute(self):
         logging.info(f"Translating scene number {self.scene_number}")
@@ -110,28 +112,55 @@ class TranslateSceneCommand(Command):
 
         project : SubtitleProject = self.datamodel.project
 
+        project.events.line_translated += self._on_line_translated
         project.events.batch_translated += self._on_batch_translated
+        project.events.batch_split += self._on_batches_changed
+        project.events.batches_merged += self._on_batches_changed
 
-        scene = project.TranslateScene(self.scene_number, batch_numbers=self.batch_numbers)
-
-        project.events.batch_translated -= self._on_batch_translated
+        try:
+            scene = project.TranslateScene(self.scene_number, batch_numbers=self.batch_numbers)
+
+        finally:
+            project.events.batches_merged -= self._on_batches_changed
+            project.events.batch_split -= self._on_batches_changed
+            project.events.batch_translated -= self._on_batch_translated
+            project.events.line_translated -= self._on_line_translated
+
+        if self.batches_changed:
+            # Batches were split or merged and renumbered, so the view model has to be rebuilt rather than updated
+            self.datamodel.CreateViewModel()
+            self.datamodel_update = {}
+            return True
 
         if scene:
             self.datamodel_update[scene.number].update({
                 'summary' : scene.summary
             })
 
-            for batch in scene.batches:
-                if not self.batch_numbers or batch.number in self.batch_numbers:
-                    self.datamodel_update[self.scene_number][batch.number] = {
-                        'summary' : batch.summary,
-                        'context' : batch.context,
-                        'errors' : batch.errors,
-                        'translated' : { line.number : { 'text' : line.text } for line in batch.translated } 
-                    }
+            batches = scene.GetBatches(self.batch_numbers) if self.batch_numbers else scene.batches
+            for batch in batches:
+                self.datamodel_update[self.scene_number][batch.number] = {
+                    'summary' : batch.summary,
+                    'context' : batch.context,
+                    'errors' : batch.errors,
+                    'translated' : { line.number : { 'text' : line.text } for line in batch.translated } 
+                }
 
         return True
     
+    def _on_line_translated(self, batch : SubtitleBatch, line : SubtitleLine):
+        if self.datamodel:
+            update = {
+                'translated' : { line.number : { 'text' : line.text } }
+            }
+            self.datamodel.UpdateViewModel({ batch.scene : { 'batches' : { batch.number : update } } })
+
+    def _on_batches_changed(self, scene_number : int, *args):
+        # Rebuild the view model so that updates for the renumbered batches can be applied to it
+        self.batches_changed = True
+        if self.datamodel:
+            self.datamodel.CreateViewModel()
+
     def _on_batch_translated(self, batch : SubtitleBatch):
         if self.datamodel:
             update = {
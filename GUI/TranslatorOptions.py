@@ -11,7 +11,8 @@ from PySide6.QtWidgets import (
     QPushButton, 
     QFileDialog, 
     QDoubleSpinBox, 
-    QSpinBox 
+    QSpinBox,
+    QCheckBox
     )
 from PySide6.QtGui import QTextOption
 
@@ -41,6 +42,10 @@ class TranslatorOptionsDialog(QDialog):
 
         self.scene_threshold_spinbox = self._create_input("Scene Threshold (seconds)", QDoubleSpinBox, default_value=self.data.get('scene_threshold', 2.0))
 
+        self.parallel_batches_checkbox = self._create_input("Translate Batches In Parallel", QCheckBox, default_value=self.data.get('batch_mode') == "parallel")
+
+        self.consistency_pass_checkbox = self._create_input("Consistency Pass", QCheckBox, default_value=bool(self.data.get('consistency_pass')))
+
         layout.addLayout(self.form_layout)
 
         self.button_layout = QHBoxLayout()
@@ -69,6 +74,8 @@ class TranslatorOptionsDialog(QDialog):
                 input_widget.setWordWrapMode(word_wrap_mode)
             elif isinstance(input_widget, QSpinBox) or isinstance(input_widget, QDoubleSpinBox):
                 input_widget.setValue(default_value)
+            elif isinstance(input_widget, QCheckBox):
+                input_widget.setChecked(default_value)
 
         self.form_layout.addRow(label, input_widget)
         return input_widget
@@ -87,6 +94,8 @@ class TranslatorOptionsDialog(QDialog):
         self.data['max_batch_size'] = self.max_batch_size_spinbox.value()
         self.data['batch_threshold'] = self.batch_threshold_spinbox.value()
         self.data['scene_threshold'] = self.scene_threshold_spinbox.value()
+        self.data['batch_mode'] = "parallel" if self.parallel_batches_checkbox.isChecked() else "serial"
+        self.data['consistency_pass'] = self.consistency_pass_checkbox.isChecked()
         super().accept()
 
 
@@ -96,6 +96,8 @@ class ProjectOptions(QGroupBox):
             'max_batch_size' : options.get('max_batch_size'),
             'batch_threshold' : options.get('batch_threshold'),
             'scene_threshold' : options.get('scene_threshold'),
+            'batch_mode' : options.get('batch_mode'),
+            'consistency_pass' : options.get('consistency_pass'),
         }
 
         for key in options:
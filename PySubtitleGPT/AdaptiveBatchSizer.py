@@ -0,0 +1,84 @@
+import logging
+import threading
+
+from PySubtitleGPT.ChatGPTTranslation import ChatGPTTranslation
+from PySubtitleGPT.Helpers import EstimateTokenCount
+
+class AdaptiveBatchSizer:
+    """
+    Tunes the number of lines per batch from the responses to previous batches.
+
+    The batch size shrinks when a response reaches the token limit, and grows when several
+    responses in a row are small and fast. It is shared by every scene in a translation,
+    so it can be updated from several threads at once.
+    """
+    def __init__(self, batch_size : int, min_batch_size : int, max_batch_size : int, fast_response_time : float = 30.0, grow_after : int = 3):
+        self.lock = threading.Lock()
+        self.min_batch_size = max(1, min_batch_size or 1)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size or batch_size)
+        self.batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+        self.fast_response_time = fast_response_time
+        self.grow_after = grow_after
+        self.completion_limit = None
+        self.good_responses = 0
+        self.adjustments = []
+
+    def __str__(self) -> str:
+        return f"AdaptiveBatchSizer: batch size {self.batch_size} ({self.min_batch_size}-{self.max_batch_size})"
+
+    def AddResponse(self, translation : ChatGPTTranslation, line_count : int):
+        """
+        Update the batch size from the response to a batch with a number of lines
+        """
+        if not translation or not line_count:
+            return
+
+        completion_tokens = translation.completion_tokens or EstimateTokenCount(translation.text)
+
+        with self.lock:
+            if translation.reached_token_limit:
+                self.good_responses = 0
+
+                if completion_tokens:
+                    self.completion_limit = min(self.completion_limit or completion_tokens, completion_tokens)
+
+                # Aim for a size that would have fitted, with some margin
+                self._adjust(min(self.batch_size, line_count * 2 // 3), f"a batch of {line_count} lines reached the token limit")
+
+            elif line_count >= self.batch_size * 3 // 4 and self._is_small_and_fast(translation, completion_tokens):
+                # Only batches close to the current size are evidence that it could be larger
+                self.good_responses += 1
+
+                if self.good_responses >= self.grow_after:
+                    self.good_responses = 0
+                    self._adjust(self.batch_size + max(1, self.batch_size // 4), f"{self.grow_after} responses in a row were small and fast")
+
+            else:
+                self.good_responses = 0
+
+    def GetSplitSize(self, batch_size : int):
+        """
+        Number of lines to split a batch after so that it fits the tuned size, or None if it fits already
+        """
+        with self.lock:
+            return self.batch_size if batch_size > self.batch_size else None
+
+    def _is_small_and_fast(self, translation : ChatGPTTranslation, completion_tokens : int):
+        response_time = translation.response_time
+        if response_time and response_time > self.fast_response_time * 1000:
+            return False
+
+        if self.completion_limit and completion_tokens > self.completion_limit // 2:
+            return False
+
+        return True
+
+    def _adjust(self, batch_size : int, reason : str):
+        """
+        Change the batch size within the limits. The lock must be held.
+        """
+        batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+        if batch_size != self.batch_size:
+            logging.info(f"Adjusting batch size from {self.batch_size} to {batch_size} lines because {reason}")
+            self.adjustments.append((self.batch_size, batch_size, reason))
+            self.batch_size = batch_size
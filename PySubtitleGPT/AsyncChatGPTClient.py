@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+import openai
+import openai.error
+
+from PySubtitleGPT.ChatGPTClient import ChatGPTClient
+from PySubtitleGPT.ChatGPTTranslation import ChatGPTTranslation
+from PySubtitleGPT.Helpers import EstimateMessageTokens, EstimateTokenCount
+from PySubtitleGPT.Options import Options
+from PySubtitleGPT.ResponseCache import GetResponseCache
+from PySubtitleGPT.RateLimiter import GetRateLimiter
+from PySubtitleGPT.SubtitleError import NoTranslationError, TranslationError, TranslationImpossibleError
+
+class AsyncChatGPTClient(ChatGPTClient):
+    """
+    Handles communication with OpenAI to request translations, without blocking the event loop.
+
+    Requests are capped by an asyncio.Semaphore, which can be shared between clients
+    to limit the total number of requests in flight.
+    """
+    def __init__(self, options : Options, instructions=None, semaphore : asyncio.Semaphore = None):
+        super().__init__(options, instructions)
+        self.semaphore = semaphore or asyncio.Semaphore(options.get('max_concurrent_requests') or 1)
+
+    async def RequestTranslation(self, prompt : str, lines : list, context : dict, line_callback = None):
+        """
+        Generate the messages to send to OpenAI to request a translation
+        """
+        gpt_prompt = self._generate_prompt(prompt, lines, context)
+
+        stream_callback = self._get_stream_callback(lines, line_callback)
+
+        async with self.semaphore:
+            gpt_translation = await self._send_messages(gpt_prompt.messages, stream_callback=stream_callback)
+
+        translation = ChatGPTTranslation(gpt_translation, gpt_prompt)
+
+        return translation
+
+    async def RequestRetranslation(self, translation : ChatGPTTranslation, errors : list[TranslationError]):
+        """
+        Generate the messages to send to OpenAI to request a retranslation
+        """
+        prompt, temperature = self._generate_retry_prompt(translation, errors)
+
+        async with self.semaphore:
+            retranslation = await self._send_messages(prompt.messages, temperature)
+
+        return retranslation
+
+    async def RequestLineRetranslation(self, prompt : str, lines : list, context_lines : list, errors : list[TranslationError]):
+        """
+        Generate the messages to send to OpenAI to retranslate specific lines
+        """
+        gpt_prompt = self._generate_line_retry_prompt(prompt, lines, context_lines, errors)
+
+        async with self.semaphore:
+            retranslation = await self._send_messages(gpt_prompt.messages, self._get_retry_temperature())
+
+        return retranslation
+
+    async def RequestReview(self, translation : ChatGPTTranslation, summaries : list[str]):
+        """
+        Generate the messages to send to OpenAI to review a translation for consistency
+        """
+        prompt = self._generate_review_prompt(translation, summaries)
+
+        async with self.semaphore:
+            review = await self._send_messages(prompt.messages)
+
+        return review
+
+    async def SendMessages(self, messages : list[str], temperature : float = None, stream_callback = None):
+        """
+        Make a request to the OpenAI API to provide a translation
+        """
+        async with self.semaphore:
+            return await self._send_messages(messages, temperature, stream_callback)
+
+    async def _send_messages(self, messages : list[str], temperature : float = None, stream_callback = None):
+        """
+        Make a request to the OpenAI API, retrying with backoff on transient errors.
+
+        The caller is expected to hold the semaphore.
+        """
+        options = self.options
+        max_retries = options.get('max_retries', 3.0)
+        backoff_time = options.get('backoff_time', 5.0)
+        model = options.get('gpt_model')
+        temperature = temperature or options.get('temperature', 0.0)
+
+        cache = GetResponseCache(options)
+        if cache and not options.get('bypass_cache'):
+            cached = cache.Get(model, temperature, messages)
+            if cached:
+                logging.debug("Using cached response")
+                if stream_callback:
+                    stream_callback(cached.get('text'))
+                return cached
+
+        limiter = GetRateLimiter(options)
+        estimated_tokens = EstimateMessageTokens(messages)
+
+        retries = 0
+
+        while retries <= max_retries:
+            await limiter.AcquireAsync(estimated_tokens)
+
+            total_tokens, headers = None, None
+
+            try:
+                start_time = time.monotonic()
+
+                response = await openai.ChatCompletion.acreate(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=bool(stream_callback)
+                )
+
+                if stream_callback:
+                    translation = await self._process_stream_async(response, stream_callback, start_time)
+                    total_tokens = estimated_tokens + EstimateTokenCount(translation.get('text'))
+                else:
+                    translation = self._process_response(response)
+                    total_tokens = translation.get('total_tokens')
+
+                if cache and translation.get('finish_reason') == "stop":
+                    cache.Put(model, temperature, messages, translation)
+
+                # Return the response if the API call succeeds
+                return translation
+
+            except openai.error.RateLimitError as e:
+                headers = e.headers
+                retry_seconds = self._get_retry_after(e)
+                if retry_seconds:
+                    # Hold off every client in the process until the limit resets
+                    logging.warning(f"Rate limit hit, retrying in {retry_seconds} seconds...")
+                    limiter.Hold(retry_seconds)
+                    continue
+                else:
+                    logging.warning("Rate limit hit, quota exceeded. Please wait until the quota resets.")
+                    raise
+
+            except (openai.error.APIConnectionError, openai.error.Timeout, openai.error.ServiceUnavailableError) as e:
+                if isinstance(e, openai.error.APIConnectionError) and not e.should_retry:
+                    raise TranslationImpossibleError(str(e), None, e)
+                if retries == max_retries:
+                    logging.warning(f"OpenAI failure {str(e)}, aborting after {retries} retries...")
+                    raise
+                else:
+                    retries += 1
+                    sleep_time = backoff_time * 2.0**retries
+                    logging.warning(f"OpenAI error {str(e)}, retrying in {sleep_time}...")
+                    await asyncio.sleep(sleep_time)
+                    continue
+
+            except Exception as e:
+                raise TranslationImpossibleError(f"Unexpected error communicating with OpenAI", None, e)
+
+            finally:
+                limiter.Release(estimated_tokens, total_tokens, headers)
+
+        return None
+
+    async def _process_stream_async(self, response, stream_callback, start_time : float):
+        """
+        Assemble the translation from a streamed response, passing each chunk of text to the callback
+        """
+        chunks = []
+        finish_reason = None
+
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+
+            choice = chunk.choices[0]
+            text = choice.delta.get('content') if choice.delta else None
+            if text:
+                chunks.append(text)
+                stream_callback(text)
+
+            finish_reason = getattr(choice, 'finish_reason', None) or finish_reason
+
+        if not chunks and not finish_reason:
+            raise NoTranslationError("No choices returned in the response", response)
+
+        return {
+            'response_time': int((time.monotonic() - start_time) * 1000),
+            'finish_reason': finish_reason,
+            'text': ''.join(chunks)
+        }
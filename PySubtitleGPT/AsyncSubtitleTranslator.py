@@ -0,0 +1,301 @@
+import asyncio
+import logging
+
+from PySubtitleGPT.AsyncChatGPTClient import AsyncChatGPTClient
+from PySubtitleGPT.ChatGPTTranslation import ChatGPTTranslation
+from PySubtitleGPT.Helpers import ParseSubstitutions
+from PySubtitleGPT.Options import Options
+from PySubtitleGPT.SubtitleBatch import SubtitleBatch
+from PySubtitleGPT.SubtitleError import TranslationError
+from PySubtitleGPT.SubtitleScene import SubtitleScene
+from PySubtitleGPT.SubtitleTranslator import SubtitleTranslator
+
+class AsyncSubtitleTranslator(SubtitleTranslator):
+    """
+    Translates subtitles using asyncio rather than threads.
+
+    Scenes are translated concurrently as tasks on the running event loop, and the number of
+    requests in flight is capped by max_concurrent_requests. Results and notifications are
+    the same as for SubtitleTranslator.
+    """
+    async def TranslateSubtitles(self):
+        """
+        Translate a SubtitleFile
+        """
+        jobs = self.PrepareScenes()
+
+        semaphore = asyncio.Semaphore(self.options.get('max_concurrent_requests') or 1)
+
+        tasks = [ asyncio.create_task(self.TranslateScene(scene, batch_numbers, remaining_lines, semaphore=semaphore))
+                  for scene, batch_numbers, remaining_lines in jobs ]
+
+        try:
+            await asyncio.gather(*tasks)
+
+        except Exception:
+            # Cancel any scenes that are still being translated
+            self.aborted = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        self.FinaliseTranslation()
+
+    async def TranslateScene(self, scene : SubtitleScene, batch_numbers = None, remaining_lines=None, semaphore : asyncio.Semaphore = None):
+        """
+        Present a scene to ChatGPT for translation
+        """
+        options : Options = self.options
+
+        try:
+            batches = self._get_scene_batches(scene, batch_numbers)
+
+            context = scene.context.copy()
+
+            if options.get('batch_mode') == "parallel":
+                await self.TranslateBatchesInParallel(batches, context, remaining_lines, semaphore=semaphore)
+            else:
+                await self.TranslateBatches(batches, context, remaining_lines, semaphore=semaphore)
+
+            scene.summary = context['summary'] or scene.summary
+
+            # Notify observers the scene was translated
+            self.events.scene_translated(scene)
+
+        except Exception as e:
+            if options.get('stop_on_error'):
+                raise
+            else:
+                logging.warning(f"Failed to translate scene {scene.number} ({str(e)})... finishing")
+
+    async def TranslateBatches(self, batches : list[SubtitleBatch], context : dict, remaining_lines=None, semaphore : asyncio.Semaphore = None):
+        """
+        Pass batches of subtitles ChatGPT for translation, building up context.
+        """
+        options : Options = self.options
+
+        summaries = context.get('summaries', [])
+        substitutions = ParseSubstitutions(context.get('substitutions', {}))
+
+        # Initialise the ChatGPT client
+        client = AsyncChatGPTClient(options, context.get('instructions'), semaphore=semaphore)
+
+        # Batches may be split or merged as they are translated
+        pending = list(batches)
+
+        while pending:
+            batch = pending.pop(0)
+
+            if self.aborted:
+                logging.info(f"Translation aborted, skipping remaining batches in scene {batch.scene}")
+                break
+
+            if options.get('resume') and batch.all_translated:
+                logging.info(f"Scene {batch.scene} batch {batch.number} already translated {batch.size} lines...")
+                summaries = self.AddBatchToContext(context, batch, summaries)
+                continue
+
+            if options.get('preview'):
+                self.events.batch_translated(batch)
+                continue
+
+            if self.batch_sizer:
+                batch = self._fit_batch_size(batch, pending)
+
+            context, originals = self._prepare_batch(batch, context, substitutions, remaining_lines)
+
+            if not await self.TranslateBatch(batch, originals, context, client):
+                # The batch was too large, try again once it has been split
+                pending.insert(0, batch)
+                continue
+
+            if remaining_lines:
+                remaining_lines = max(0, remaining_lines - len(originals))
+                if not remaining_lines:
+                    break
+
+            summaries = self.AddBatchToContext(context, batch, summaries)
+
+            # Notify observers the batch was translated
+            self.events.batch_translated(batch)
+
+    async def TranslateBatchesInParallel(self, batches : list[SubtitleBatch], context : dict, remaining_lines=None, semaphore : asyncio.Semaphore = None):
+        """
+        Pass all the batches in a scene to ChatGPT at the same time, with only the scene-level context.
+        """
+        options : Options = self.options
+
+        substitutions = ParseSubstitutions(context.get('substitutions', {}))
+
+        client = AsyncChatGPTClient(options, context.get('instructions'), semaphore=semaphore)
+
+        jobs = self._prepare_parallel_batches(batches, context, substitutions, remaining_lines)
+
+        translated_batches = []
+
+        while jobs and not self.aborted:
+            split_batches = await self._translate_parallel_jobs_async(jobs, client)
+
+            translated_batches.extend(batch for batch, _, _ in jobs if batch not in split_batches)
+
+            # Only the lines that haven't been translated yet are left for the batches that were split
+            remaining_lines = self._remaining_lines_after(jobs, split_batches, remaining_lines)
+            if remaining_lines == 0:
+                break
+
+            # Translate any batches that were too large again once they have been split
+            jobs = self._prepare_parallel_batches(split_batches, context, substitutions, remaining_lines)
+
+        translated_batches.sort(key=lambda batch: batch.number)
+
+        summaries = self._collect_summaries(translated_batches, context)
+
+        if options.get('consistency_pass') and summaries and not self.aborted:
+            logging.info(f"Reviewing {len(translated_batches)} batches for consistency with the scene")
+            await asyncio.gather(*[ self.ReviewBatch(batch, summaries, client) for batch in translated_batches ])
+
+    async def TranslateBatch(self, batch : SubtitleBatch, originals : list, context : dict, client : AsyncChatGPTClient):
+        """
+        Request a translation for the lines in a batch and process the response.
+
+        Returns False if the batch was too large and should be split before trying again.
+        """
+        options : Options = self.options
+
+        if self.aborted:
+            return True
+
+        if not originals and self.memory:
+            # Every line was filled from the translation memory
+            self._fill_from_memory(batch, batch.untranslated)
+            return True
+
+        try:
+            if  options.get('reparse') and batch.translation:
+                logging.info(f"Reparsing scene {batch.scene} batch {batch.number} with {len(originals)} lines...")
+                translation = batch.translation
+            else:
+                logging.debug(f"Translating scene {batch.scene} batch {batch.number} with {len(originals)} lines...")
+
+                prompt = options.get('prompt')
+
+                # Ask OpenAI to do the translation
+                # Report each line as it arrives if the response is streamed
+                line_callback = lambda line: self.events.line_translated(batch, line)
+
+                translation : ChatGPTTranslation = await client.RequestTranslation(prompt, originals, context, line_callback)
+
+                if self._should_split_batch(batch, translation, len(originals)):
+                    return False
+
+                if self._should_retry_without_context(translation):
+                    translation = await client.RequestTranslation(prompt, originals, None)
+
+                    if translation.reached_token_limit:
+                        raise TranslationError(f"Too many tokens in translation", translation)
+
+            if translation:
+                batch.translation = translation
+
+                # Process the response
+                await self.ProcessTranslation(batch, context, client)
+
+            else:
+                logging.warning(f"No translation for scene {batch.scene} batch {batch.number}")
+
+        except TranslationError as e:
+            self._handle_batch_error(batch, e)
+
+        return True
+
+    async def ReviewBatch(self, batch : SubtitleBatch, summaries : list[str], client : AsyncChatGPTClient):
+        """
+        Ask ChatGPT to correct any lines that are inconsistent with the rest of the scene
+        """
+        if self.aborted or not batch.translation or not batch.translation.has_translation:
+            return
+
+        try:
+            response = await client.RequestReview(batch.translation, summaries)
+
+            self._process_review(batch, response)
+
+        except TranslationError as e:
+            logging.warning(f"Unable to review scene {batch.scene} batch {batch.number}: {str(e)}")
+
+    async def _translate_parallel_jobs_async(self, jobs : list, client : AsyncChatGPTClient):
+        """
+        Translate a set of prepared batches concurrently, returning any that need to be split and translated again
+        """
+        split_batches = []
+
+        async def translate(batch, originals, batch_context):
+            if not await self.TranslateBatch(batch, originals, batch_context, client):
+                split_batches.append(batch)
+                return
+
+            # Notify observers the batch was translated
+            self.events.batch_translated(batch)
+
+        tasks = [ asyncio.create_task(translate(batch, originals, batch_context)) for batch, originals, batch_context in jobs ]
+
+        try:
+            await asyncio.gather(*tasks)
+
+        except Exception:
+            self.aborted = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return sorted(split_batches, key=lambda batch: batch.number)
+
+    async def ProcessTranslation(self, batch : SubtitleBatch, context : dict, client : AsyncChatGPTClient):
+        """
+        Attempt to extract translation from the API response
+        """
+        options : Options = self.options
+
+        translation : ChatGPTTranslation = batch.translation
+
+        if not translation.has_translation:
+            raise ValueError("Translation contains no translated text")
+
+        logging.debug(f"Scene {batch.scene} batch {batch.number} translation:\n{translation.text}\n")
+
+        try:
+            self._parse_translation(batch, translation)
+
+            # Consider retrying if there were errors
+            if batch.errors and options.get('allow_retranslations'):
+                logging.warn(f"Scene {batch.scene} batch {batch.number} failed validation, requesting retranslation")
+                await self.RequestRetranslations(client, batch, translation)
+
+            self._apply_translation(batch, translation, context)
+
+            if self.memory:
+                self.memory.AddBatch(batch)
+
+        except TranslationError as te:
+            if options.get('stop_on_error'):
+                raise
+            else:
+                logging.warning(f"Error translating batch: {str(te)}")
+
+    async def RequestRetranslations(self, client : AsyncChatGPTClient, batch : SubtitleBatch, translation : ChatGPTTranslation):
+        """
+        Ask ChatGPT to retranslate any missing lines
+        """
+        if self.options.get('targeted_retranslation'):
+            lines, context_lines = self._get_retranslation_lines(batch)
+            if lines:
+                logging.info(f"Requesting retranslation of {len(lines)} lines in scene {batch.scene} batch {batch.number}")
+                retranslation = await client.RequestLineRetranslation(self.options.get('prompt'), lines, context_lines, batch.errors)
+                self._process_retranslation(batch, retranslation, lines)
+                return
+
+        retranslation = await client.RequestRetranslation(translation, batch.errors)
+
+        self._process_retranslation(batch, retranslation)
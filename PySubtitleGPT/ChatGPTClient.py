@@ -5,7 +5,11 @@ import openai.error
 
 from PySubtitleGPT.ChatGPTPrompt import ChatGPTPrompt
 from PySubtitleGPT.ChatGPTTranslation import ChatGPTTranslation
+from PySubtitleGPT.Helpers import EstimateMessageTokens, EstimateTokenCount
 from PySubtitleGPT.Options import Options
+from PySubtitleGPT.ResponseCache import GetResponseCache
+from PySubtitleGPT.RateLimiter import GetRateLimiter, ParseResetTime
+from PySubtitleGPT.StreamingTranslationParser import StreamingTranslationParser
 from PySubtitleGPT.SubtitleError import NoTranslationError, TranslationError, TranslationImpossibleError
 
 linesep = '\n'
@@ -21,64 +25,57 @@ class ChatGPTClient:
         if not self.instructions:
             raise TranslationError("No instructions provided for the translator")
 
-    def RequestTranslation(self, prompt : str, lines : list, context : dict):
+    def RequestTranslation(self, prompt : str, lines : list, context : dict, line_callback = None):
         """
-        Generate the messages to send to OpenAI to request a translation
-        """
-        options = self.options
+        Generate the messages to send to OpenAI to request a translation.
 
-        start_time = time.monotonic()
-
-        gpt_prompt = ChatGPTPrompt(self.instructions)
-
-        gpt_prompt.GenerateMessages(prompt, lines, context)
+        If responses are streamed, line_callback is called with each translated line as soon as it is received.
+        """
+        gpt_prompt = self._generate_prompt(prompt, lines, context)
 
-        logging.debug(f"Messages\n{linesep.join('{0}: {1}'.format(m['role'], m['content']) for m in gpt_prompt.messages)}")
+        stream_callback = self._get_stream_callback(lines, line_callback)
 
-        gpt_translation = self.SendMessages(gpt_prompt.messages)
+        gpt_translation = self.SendMessages(gpt_prompt.messages, stream_callback=stream_callback)
 
         translation = ChatGPTTranslation(gpt_translation, gpt_prompt)
 
-        # If a rate limit is replied ensure a minimum duration for each request
-        rate_limit = options.get('rate_limit')
-        if rate_limit:
-            minimum_duration = 60.0 / rate_limit
-
-            elapsed_time = time.monotonic() - start_time
-            if elapsed_time < minimum_duration:
-                sleep_time = minimum_duration - elapsed_time
-                time.sleep(sleep_time)
-
         return translation
 
     def RequestRetranslation(self, translation : ChatGPTTranslation, errors : list[TranslationError]):
         """
         Generate the messages to send to OpenAI to request a retranslation
         """
-        options = self.options
-        prompt = translation.prompt
+        prompt, temperature = self._generate_retry_prompt(translation, errors)
 
-        # Trim messages after the original translation to keep tokens down
-        messages = []
-        for message in prompt.messages:
-            messages.append(message)
-            if message['role'] == 'assistant':
-                break
-        prompt.messages = messages
+        retranslation = self.SendMessages(prompt.messages, temperature)
 
-        retry_instructions = options.get('retry_instructions')
+        return retranslation
 
-        prompt.GenerateRetryPrompt(translation.text, retry_instructions, errors)
+    def RequestLineRetranslation(self, prompt : str, lines : list, context_lines : list, errors : list[TranslationError]):
+        """
+        Generate the messages to send to OpenAI to retranslate specific lines
+        """
+        gpt_prompt = self._generate_line_retry_prompt(prompt, lines, context_lines, errors)
 
-        # Let's raise the temperature a little bit
-        temperature = min(options.get('temperature', 0.0) + 0.1, 1.0)
-        retranslation = self.SendMessages(prompt.messages, temperature)
+        retranslation = self.SendMessages(gpt_prompt.messages, self._get_retry_temperature())
 
         return retranslation
 
-    def SendMessages(self, messages : list[str], temperature : float = None):
+    def RequestReview(self, translation : ChatGPTTranslation, summaries : list[str]):
+        """
+        Generate the messages to send to OpenAI to review a translation for consistency
+        """
+        prompt = self._generate_review_prompt(translation, summaries)
+
+        review = self.SendMessages(prompt.messages)
+
+        return review
+
+    def SendMessages(self, messages : list[str], temperature : float = None, stream_callback = None):
         """
-        Make a request to the OpenAI API to provide a translation
+        Make a request to the OpenAI API to provide a translation.
+
+        If a stream_callback is provided the response is streamed, and the callback is called with each chunk of text.
         """
         options = self.options
         max_retries = options.get('max_retries', 3.0)
@@ -86,43 +83,55 @@ class ChatGPTClient:
         model = options.get('gpt_model')
         temperature = temperature or options.get('temperature', 0.0)
 
-        translation = {}
+        cache = GetResponseCache(options)
+        if cache and not options.get('bypass_cache'):
+            cached = cache.Get(model, temperature, messages)
+            if cached:
+                logging.debug("Using cached response")
+                if stream_callback:
+                    stream_callback(cached.get('text'))
+                return cached
+
+        limiter = GetRateLimiter(options)
+        estimated_tokens = EstimateMessageTokens(messages)
+
         retries = 0
 
         while retries <= max_retries:
+            limiter.Acquire(estimated_tokens)
+
+            total_tokens, headers = None, None
+
             try:
+                start_time = time.monotonic()
+
                 response = openai.ChatCompletion.create(
                     model=model,
                     messages=messages,
-                    temperature=temperature
+                    temperature=temperature,
+                    stream=bool(stream_callback)
                 )
 
-                translation['response_time'] = getattr(response, 'response_ms', 0)
-
-                if response.usage:
-                    translation['prompt_tokens'] = getattr(response.usage, 'prompt_tokens')
-                    translation['completion_tokens'] = getattr(response.usage, 'completion_tokens')
-                    translation['total_tokens'] = getattr(response.usage, 'total_tokens')
-
-                # We only expect one choice to be returned as we have 0 temperature
-                if response.choices:
-                    choice = response.choices[0]
-                    reply = response.choices[0].message
-
-                    translation['finish_reason'] = getattr(choice, 'finish_reason', None)
-                    translation['text'] = getattr(reply, 'content', None)
+                if stream_callback:
+                    translation = self._process_stream(response, stream_callback, start_time)
+                    total_tokens = estimated_tokens + EstimateTokenCount(translation.get('text'))
                 else:
-                    raise NoTranslationError("No choices returned in the response", response)
+                    translation = self._process_response(response)
+                    total_tokens = translation.get('total_tokens')
+
+                if cache and translation.get('finish_reason') == "stop":
+                    cache.Put(model, temperature, messages, translation)
 
                 # Return the response if the API call succeeds
                 return translation
             
             except openai.error.RateLimitError as e:
-                retry_after = e.headers.get('x-ratelimit-reset-requests') or e.headers.get('Retry-After')
-                if retry_after:
-                    retry_seconds = float(retry_after.rstrip("s"))
+                headers = e.headers
+                retry_seconds = self._get_retry_after(e)
+                if retry_seconds:
+                    # Hold off every client in the process until the limit resets
                     logging.warning(f"Rate limit hit, retrying in {retry_seconds} seconds...")
-                    time.sleep(retry_seconds)
+                    limiter.Hold(retry_seconds)
                     continue
                 else:
                     logging.warning("Rate limit hit, quota exceeded. Please wait until the quota resets.")
@@ -130,7 +139,7 @@ class ChatGPTClient:
 
             except (openai.error.APIConnectionError, openai.error.Timeout, openai.error.ServiceUnavailableError) as e:
                 if isinstance(e, openai.error.APIConnectionError) and not e.should_retry:
-                    raise TranslationImpossibleError(str(e))
+                    raise TranslationImpossibleError(str(e), None, e)
                 if retries == max_retries:
                     logging.warning(f"OpenAI failure {str(e)}, aborting after {retries} retries...")
                     raise
@@ -142,7 +151,146 @@ class ChatGPTClient:
                     continue
 
             except Exception as e:
-                raise TranslationImpossibleError(f"Unexpected error communicating with OpenAI", e)
+                raise TranslationImpossibleError(f"Unexpected error communicating with OpenAI", None, e)
+
+            finally:
+                limiter.Release(estimated_tokens, total_tokens, headers)
 
         return None
 
+    def _generate_prompt(self, prompt : str, lines : list, context : dict):
+        """
+        Build the ChatGPTPrompt for a translation request
+        """
+        gpt_prompt = ChatGPTPrompt(self.instructions)
+
+        gpt_prompt.GenerateMessages(prompt, lines, context)
+
+        logging.debug(f"Messages\n{linesep.join('{0}: {1}'.format(m['role'], m['content']) for m in gpt_prompt.messages)}")
+
+        return gpt_prompt
+
+    def _generate_retry_prompt(self, translation : ChatGPTTranslation, errors : list[TranslationError]):
+        """
+        Build the prompt and temperature for a retranslation request
+        """
+        options = self.options
+        prompt = translation.prompt
+
+        # Trim messages after the original translation to keep tokens down
+        messages = []
+        for message in prompt.messages:
+            messages.append(message)
+            if message['role'] == 'assistant':
+                break
+        prompt.messages = messages
+
+        retry_instructions = options.get('retry_instructions')
+
+        prompt.GenerateRetryPrompt(translation.text, retry_instructions, errors)
+
+        return prompt, self._get_retry_temperature()
+
+    def _generate_line_retry_prompt(self, prompt : str, lines : list, context_lines : list, errors : list[TranslationError]):
+        """
+        Build a minimal prompt to retranslate some lines, without the original conversation
+        """
+        gpt_prompt = ChatGPTPrompt(self.instructions)
+
+        gpt_prompt.GenerateLineRetryPrompt(prompt, lines, context_lines, self.options.get('retry_instructions'), errors)
+
+        logging.debug(f"Messages\n{linesep.join('{0}: {1}'.format(m['role'], m['content']) for m in gpt_prompt.messages)}")
+
+        return gpt_prompt
+
+    def _get_retry_temperature(self):
+        # Let's raise the temperature a little bit
+        return min(self.options.get('temperature', 0.0) + 0.1, 1.0)
+
+    def _generate_review_prompt(self, translation : ChatGPTTranslation, summaries : list[str]):
+        """
+        Build a prompt to review a translation, leaving out the context to keep tokens down
+        """
+        prompt = ChatGPTPrompt(self.instructions)
+
+        prompt.GenerateReviewPrompt(translation.prompt.user_prompt, translation.text, self.options.get('review_instructions'), summaries)
+
+        return prompt
+
+    def _get_retry_after(self, error : openai.error.RateLimitError):
+        """
+        Number of seconds OpenAI asked us to wait before retrying, if it said
+        """
+        headers = error.headers or {}
+        retry_after = headers.get('x-ratelimit-reset-requests') or headers.get('Retry-After')
+        return ParseResetTime(retry_after)
+
+    def _get_stream_callback(self, lines : list, line_callback):
+        """
+        Create a callback to parse a streamed translation and report each line as it is completed
+        """
+        if not line_callback or not self.options.get('stream_responses'):
+            return None
+
+        parser = StreamingTranslationParser(self.options, lines)
+
+        def on_stream_text(text : str):
+            for line in parser.Feed(text):
+                # Ignore anything that can't be matched to a line in the batch
+                if line.number:
+                    line_callback(line)
+
+        return on_stream_text
+
+    def _process_stream(self, response, stream_callback, start_time : float):
+        """
+        Assemble the translation from a streamed response, passing each chunk of text to the callback
+        """
+        chunks = []
+        finish_reason = None
+
+        for chunk in response:
+            if not chunk.choices:
+                continue
+
+            choice = chunk.choices[0]
+            text = choice.delta.get('content') if choice.delta else None
+            if text:
+                chunks.append(text)
+                stream_callback(text)
+
+            finish_reason = getattr(choice, 'finish_reason', None) or finish_reason
+
+        if not chunks and not finish_reason:
+            raise NoTranslationError("No choices returned in the response", response)
+
+        return {
+            'response_time': int((time.monotonic() - start_time) * 1000),
+            'finish_reason': finish_reason,
+            'text': ''.join(chunks)
+        }
+
+    def _process_response(self, response):
+        """
+        Extract the translation and metadata from an OpenAI response
+        """
+        translation = {}
+
+        translation['response_time'] = getattr(response, 'response_ms', 0)
+
+        if response.usage:
+            translation['prompt_tokens'] = getattr(response.usage, 'prompt_tokens')
+            translation['completion_tokens'] = getattr(response.usage, 'completion_tokens')
+            translation['total_tokens'] = getattr(response.usage, 'total_tokens')
+
+        # We only expect one choice to be returned as we have 0 temperature
+        if response.choices:
+            choice = response.choices[0]
+            reply = response.choices[0].message
+
+            translation['finish_reason'] = getattr(choice, 'finish_reason', None)
+            translation['text'] = getattr(reply, 'content', None)
+        else:
+            raise NoTranslationError("No choices returned in the response", response)
+
+        return translation
@@ -1,6 +1,6 @@
 import logging
 
-from PySubtitleGPT.Helpers import GenerateTag, GenerateTagLines, GenerateBatchPrompt
+from PySubtitleGPT.Helpers import GenerateTag, GenerateTagLines, GenerateBatchPrompt, GenerateTranslationTag
 from PySubtitleGPT.SubtitleError import TranslationError
 
 class ChatGPTPrompt:
@@ -45,10 +45,7 @@ class ChatGPTPrompt:
         Request retranslation of lines that were not translated originally
         """
         if errors:
-            unique_errors = set(( f"- {str(e).strip()}" for e in errors ))
-            error_list = list(unique_errors)
-            error_message = '\n'.join(error_list)
-            retry_prompt = f"There were some problems with the translation:\n{error_message}\n\nPlease correct them."
+            retry_prompt = f"{self._get_error_message(errors)}\n\nPlease correct them."
         else:
             # Maybe less is more?
             retry_prompt = 'Please try again'
@@ -59,4 +56,49 @@ class ChatGPTPrompt:
             { 'role': "user", 'content': retry_prompt }
         ])
 
+    def GenerateReviewPrompt(self, user_prompt : str, response : str, review_instructions : str, summaries : list[str]):
+        """
+        Ask for a translation to be checked against summaries of the whole scene
+        """
+        if self.instructions:
+            self.messages.append({'role': "system", 'content': self.instructions})
+
+        self.user_prompt = user_prompt
+
+        summary_tags = " ... ".join(GenerateTag('summary', summary) for summary in summaries)
+        review_prompt = f"These are summaries of every part of the scene: {summary_tags}\n\nPlease correct any lines that are inconsistent with the rest of the scene."
+
+        self.messages.extend([
+            { 'role': "user", 'content': user_prompt },
+            { 'role': "assistant", 'content': response },
+            { 'role': "system", 'content': review_instructions },
+            { 'role': "user", 'content': review_prompt }
+        ])
+
+    def GenerateLineRetryPrompt(self, prompt : str, lines : list, context_lines : list, retry_instructions : str, errors : list[TranslationError]):
+        """
+        Request retranslation of specific lines only, with some of the surrounding lines for context
+        """
+        if self.instructions:
+            self.messages.append({'role': "system", 'content': self.instructions})
+
+        if context_lines:
+            context_pairs = [ f"{line.prompt}\n{GenerateTranslationTag(line)}" for line in context_lines ]
+            context_text = '\n\n'.join(context_pairs)
+            self.messages.append({'role': "user", 'content': f"These are the surrounding lines and their translations, for context:\n\n{context_text}"})
+
+        self.user_prompt = GenerateBatchPrompt(prompt, lines)
+
+        if errors:
+            self.user_prompt = f"{self._get_error_message(errors)}\n\nPlease translate these lines again.\n\n{self.user_prompt}"
+
+        self.messages.extend([
+            { 'role': "system", 'content': retry_instructions },
+            { 'role': "user", 'content': self.user_prompt }
+        ])
 
+    def _get_error_message(self, errors : list[TranslationError]):
+        unique_errors = set(( f"- {str(e).strip()}" for e in errors ))
+        error_list = list(unique_errors)
+        error_message = '\n'.join(error_list)
+        return f"There were some problems with the translation:\n{error_message}"
@@ -1,5 +1,6 @@
 import logging
 import re
+from bisect import bisect_left, bisect_right
 
 from PySubtitleGPT.Options import Options
 from PySubtitleGPT.Helpers import MergeTranslations
@@ -31,6 +32,7 @@ class ChatGPTTranslationParser:
         self.text = None
         self.translations = {}
         self.translated = []
+        self.fuzzy_matches = []
 
     def ProcessChatGPTResponse(self, translation : ChatGPTTranslation):
         """
@@ -63,12 +65,18 @@ class ChatGPTTranslationParser:
         """
         re.findall has some very unhelpful behaviour, so we use finditer instead.
         """
-        return [{ 
+        return [ self.GetMatchValues(match) for match in template.finditer(text) ]
+
+    def GetMatchValues(self, match : re.Match):
+        """
+        Extract the named groups from a translation match
+        """
+        return { 
             'number': match.groupdict().get('number'),
             'start': match.group('start'), 
             'end': match.group('end'), 
             'body': match.group('body')
-            } for match in template.finditer(text)]
+            }
 
     def MatchTranslations(self, originals):
         """
@@ -78,6 +86,7 @@ class ChatGPTTranslationParser:
             raise ValueError("Original subtitles not provided")
         
         unmatched = []
+        self.fuzzy_matches = []
 
         for item in originals:
             translation = self.translations.get(item.key)
@@ -89,28 +98,77 @@ class ChatGPTTranslationParser:
                 unmatched.append(item)
 
         if unmatched:
-            self.TryFuzzyMatches(unmatched)
-
-        self.translated = MergeTranslations(self.translated, self.translations.values())
+            unmatched = self.TryFuzzyMatches(unmatched)
 
+        # The translations were merged into self.translated when the response was processed
         return self.translated, unmatched
 
     def TryFuzzyMatches(self, unmatched):
         """
-        Try to match translations to their source lines using heuristics
+        Try to match translations to their source lines using their timestamps, allowing for some drift.
+
+        Translations that start and end within match_tolerance seconds of an original are matched with it,
+        and retimed to the original. Translations that span an original are only suggested as #Fuzzy translations.
+
+        Returns the lines that are still unmatched.
         """
-        possible_matches = []
-        for item in unmatched:
-            for translation in self.translations.values():
-                # This is not very convincing logic but let's try it
-                if translation.start <= item.start and translation.end >= item.end:
-                    possible_matches.append((item, translation))
+        available = [ translation for translation in self.translations.values() if not translation.number ]
+        if not available:
+            return unmatched
+
+        tolerance = int((self.options.get('match_tolerance') or 0.0) * 1000)
 
-        if possible_matches:
-            for item, translation in possible_matches:
+        # Sort the translations by start time, so only those that could overlap a line need to be checked
+        index = sorted(available, key=lambda translation: translation.start_ms)
+        starts = [ translation.start_ms for translation in index ]
+        longest = max(translation.end_ms - translation.start_ms for translation in index)
+
+        candidates = []
+        for item in unmatched:
+            first = bisect_left(starts, item.start_ms - tolerance - longest)
+            last = bisect_right(starts, item.end_ms + tolerance)
+            for translation in index[first:last]:
+                confidence = self._match_confidence(item, translation)
+                drift = max(abs(translation.start_ms - item.start_ms), abs(translation.end_ms - item.end_ms))
+                if drift <= tolerance or (translation.start_ms <= item.start_ms and translation.end_ms >= item.end_ms):
+                    candidates.append((confidence, -drift, item, translation))
+
+        # Best matches first, each line and translation can only be matched once
+        candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+
+        matched = {}
+        retimed = []
+        for confidence, drift, item, translation in candidates:
+            if id(item) in matched or translation.number:
+                continue
+
+            if -drift <= tolerance:
+                translation.number = item.number
+                translation.start = item.start_ms
+                translation.end = item.end_ms
+                item.translation = translation.text
+                matched[id(item)] = item
+                retimed.append(translation)
+                self.fuzzy_matches.append((item, confidence))
+            elif not item.translation:
                 logging.warn(f"Only found fuzzy match for line {item.number} in translations")
                 item.translation = f"#Fuzzy: {translation.text}"
-                #unmatched.remove(item)
+
+        if retimed:
+            logging.info(f"Matched {len(retimed)} lines with translations that had different timestamps")
+            retimed_ids = set(id(translation) for translation in retimed)
+            self.translations = { translation.key : translation for translation in self.translations.values() }
+            self.translated = MergeTranslations([ line for line in self.translated if id(line) not in retimed_ids ], retimed)
+
+        return [ item for item in unmatched if id(item) not in matched ]
+
+    def _match_confidence(self, item : SubtitleLine, translation : SubtitleLine):
+        """
+        How closely the timing of a translation matches a line, as the proportion of their combined span that they share
+        """
+        overlap = min(item.end_ms, translation.end_ms) - max(item.start_ms, translation.start_ms)
+        span = max(item.end_ms, translation.end_ms) - min(item.start_ms, translation.start_ms)
+        return max(overlap, 0) / span if span > 0 else 1.0
 
     def ValidateTranslations(self):
         """
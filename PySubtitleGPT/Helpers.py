@@ -1,7 +1,10 @@
 import os
 import logging
 import re
+import tempfile
 import pysrt
+from bisect import bisect_left
+from contextlib import contextmanager
 
 def Linearise(lines):
     if not isinstance(lines, list):
@@ -42,6 +45,36 @@ def FixTime(time):
 
     raise ValueError("Unable to interpret time string '{time}'")
 
+@contextmanager
+def AtomicWrite(filename : str, mode : str = 'w', encoding : str = None, newline : str = None):
+    """
+    Open a temporary file alongside filename for writing, and replace filename with it once it has been
+    written and flushed to disk. If writing fails the original file is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    descriptor, temporary = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+
+    try:
+        with os.fdopen(descriptor, mode, encoding=encoding, newline=newline) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+
+        # mkstemp only gives the owner access, so use the permissions of the file being replaced or the default for a new file
+        if os.path.exists(filename):
+            os.chmod(temporary, os.stat(filename).st_mode & 0o777)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temporary, 0o666 & ~umask)
+
+        os.replace(temporary, filename)
+
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
 def GetInputFilename(filename):
     if not filename:
         return None
@@ -62,6 +95,26 @@ def GetOutputFilename(filename):
 
 
 
+def EstimateTokenCount(text):
+    """
+    Rough estimate of the number of tokens in some text, without needing a tokenizer.
+
+    English text averages around four characters per token, while other scripts
+    tend to use about one token per character.
+    """
+    if not text:
+        return 0
+
+    text = str(text)
+    ascii_count = sum(1 for c in text if ord(c) < 128)
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+def EstimateMessageTokens(messages):
+    """
+    Estimate the number of prompt tokens for a list of messages, including some overhead per message
+    """
+    return sum(EstimateTokenCount(message.get('content')) + 4 for message in messages) + 3
+
 def GenerateBatchPrompt(prompt, lines, tag_lines=None):
     """
     Create the user prompt for translating a set of lines
@@ -77,6 +130,16 @@ def GenerateBatchPrompt(prompt, lines, tag_lines=None):
     else:
         return f"<batch>\n{source_text}\n</batch>\n"
 
+def GenerateTranslationTag(line):
+    """
+    Format the translation of a line the way ChatGPT is asked to return it
+    """
+    return '\n'.join([
+        f"<translation start='{line.start}' end='{line.end}'>",
+        (line.translation or "").replace('\r\n', '\n'),
+        "</translation>"
+    ])
+
 def GenerateTagLines(context, tags):
     """
     Create a user message for specifying a set of tags
@@ -154,36 +217,29 @@ def ExtractTagList(tagname, text):
 
 def MergeTranslations(lines, translated):
     """
-    Replace lines with corresponding lines in translated
-    """
-    line_dict = {item.key: item for item in lines}
+    Replace lines with corresponding lines in translated, or insert them in order if there is no line with the same key.
 
-    for item in translated:
-        line_dict[item.key] = item
-
-    lines = sorted(line_dict.values(), key=lambda item: item.start)
-
-    return lines
-
-def UnbatchScenes(scenes):
+    The result is a new list ordered by key. The translations are sorted and merged with the lines in a single pass,
+    using a binary search to skip runs of lines that aren't replaced, so each merge is still linear in the number of lines.
     """
-    Reconstruct a sequential subtitle from multiple scenes
-    """
-    originals = []
-    translations = []
-    untranslated = []
-
-    for i_scene, scene in enumerate(scenes):
-        for i_batch, batch in enumerate(scene.batches):
-            batch_originals = batch.originals if batch.originals else []
-            batch_translations = batch.translated if batch.translated else []
-            batch_untranslated = batch.untranslated if batch.untranslated else []
-
-            originals.extend(batch_originals)
-            translations.extend(batch_translations)
-            untranslated.extend(batch_untranslated)
-    
-    return originals, translations, untranslated
+    lines = list(lines)
+    keys = [ item.key for item in lines ]
+
+    if any(keys[i] >= keys[i + 1] for i in range(len(keys) - 1)):
+        # Not in order (or has duplicate keys), so normalise it first
+        lines = sorted({ item.key : item for item in lines }.values(), key=lambda item: item.key)
+        keys = [ item.key for item in lines ]
+
+    merged = []
+    start = 0
+    for item in sorted({ item.key : item for item in translated }.values(), key=lambda item: item.key):
+        index = bisect_left(keys, item.key, start)
+        merged.extend(lines[start:index])
+        merged.append(item)
+        start = index + 1 if index < len(keys) and keys[index] == item.key else index
+
+    merged.extend(lines[start:])
+    return merged
 
 def ParseCharacters(character_list):
     if isinstance(character_list, str):
@@ -0,0 +1,342 @@
+import json
+import os
+import threading
+import zlib
+
+from PySubtitleGPT.ChatGPTPrompt import ChatGPTPrompt
+from PySubtitleGPT.Helpers import AtomicWrite
+from PySubtitleGPT.StringTable import StringTable
+from PySubtitleGPT.SubtitleBatch import SubtitleBatch
+from PySubtitleGPT.SubtitleFile import SubtitleFile
+from PySubtitleGPT.SubtitleScene import SubtitleScene
+from PySubtitleGPT.SubtitleSerialisation import SubtitleDecoder, SubtitleEncoder
+
+index_format = 'subtrans-indexed'
+index_version = 1
+
+# The header is padded to a fixed size so that it can be filled in once the index has been written
+header_size = 128
+
+compression_level = 6
+
+# Held while a project file is written, until batches copied from the file it replaces have been moved to it
+write_lock = threading.RLock()
+
+class StoredBatch:
+    """
+    The location of a batch in an indexed project file, which loads the batch when it is called
+    """
+    def __init__(self, projectfile, offset : int, length : int, lines : list[int] = None, strings : list[str] = None):
+        self._location = (projectfile, offset)
+        self.length = length
+        self.lines = lines
+        self.strings = strings
+
+    def __call__(self) -> SubtitleBatch:
+        projectfile, data = self._read_bytes()
+        return json.loads(projectfile._unpack(data), cls=SubtitleDecoder, strings=projectfile.strings)
+
+    @property
+    def projectfile(self):
+        return self._location[0]
+
+    @property
+    def offset(self) -> int:
+        return self._location[1]
+
+    def ReadBytes(self) -> bytes:
+        return self._read_bytes()[1]
+
+    def Move(self, projectfile, offset : int):
+        """
+        Read the batch from a new project file that it has been copied to
+        """
+        self._location = (projectfile, offset)
+
+    def _read_bytes(self):
+        projectfile, offset = self._location
+        try:
+            return projectfile, projectfile._read(offset, self.length)
+
+        except ValueError:
+            # The file may have been replaced by one the batch was copied to, so wait for the batch to be moved
+            with write_lock:
+                if self._location[0] is projectfile:
+                    raise
+
+                projectfile, offset = self._location
+
+            return projectfile, projectfile._read(offset, self.length)
+
+class IndexedProjectFile:
+    """
+    Reads and writes projects with an index, so that a project can be opened without decoding every batch.
+
+    The file starts with a fixed-size header giving the position of the index. It is followed by a line of
+    JSON for each batch, in the same form as the original project format, and then by the index itself,
+    which holds the project context and the scenes and batches with their line ranges and counts.
+
+    Batches read from the file are only decoded when their lines or translation are needed. Batches that
+    haven't been loaded are copied to the new file without decoding them when the project is written.
+
+    A compact project file compresses each batch and the index with zlib. The header records whether the file
+    is compact, so either kind can be read.
+
+    Long strings that appear in more than one prompt, such as the instructions, are written once after the
+    batches and referenced by their hash, and are only read when a batch that uses them is loaded.
+    """
+    def __init__(self, filename : str, compact : bool = False):
+        self.filename = filename
+        self.compact = compact
+        self.strings = StringTable(self._read_string)
+        self._snapshot = None
+
+    @classmethod
+    def IsIndexed(cls, filename : str) -> bool:
+        """
+        Check whether a project file has the indexed layout
+        """
+        try:
+            with open(filename, 'rb') as file:
+                return cls._read_header(file) is not None
+        except OSError:
+            return False
+
+    def Read(self) -> SubtitleFile:
+        """
+        Read the index and create scenes and batches that load their content on demand
+        """
+        with open(self.filename, 'rb') as file:
+            header = self._read_header(file)
+            if not header:
+                raise ValueError(f"{self.filename} is not an indexed project file")
+
+            self.compact = header.get('compression') == 'zlib'
+
+            offset, length = header['index']
+            file.seek(offset)
+            index = json.loads(self._unpack(file.read(length)))
+            self._snapshot = self._stat(file)
+
+        self.strings = StringTable(self._read_string)
+        self.strings.locations = { key: tuple(location) for key, location in (index.get('strings') or {}).items() }
+
+        subtitles = SubtitleFile(index.get('filename'))
+        subtitles.context = index.get('context') or {}
+
+        scenes = []
+        for scene_entry in index.get('scenes', []):
+            batches = []
+            for entry in scene_entry.get('batches', []):
+                batch = SubtitleBatch({
+                    'scene': scene_entry['scene'],
+                    'batch': entry['batch'],
+                    'summary': entry.get('summary')
+                })
+                batch._set_loader(StoredBatch(self, entry['offset'], entry['length'], entry.get('lines'), entry.get('strings')), entry['size'], entry['translated'], entry['errors'], entry['all_translated'])
+                batches.append(batch)
+
+            scenes.append(SubtitleScene({
+                'scene': scene_entry['scene'],
+                'context': scene_entry.get('context') or {},
+                'batches': batches
+            }))
+
+        subtitles._set_stored_scenes(scenes)
+        return subtitles
+
+    def Write(self, subtitles : SubtitleFile):
+        """
+        Write the subtitles to the project file, replacing it once it has been written
+        """
+        stored = []
+        strings, sources = self._count_strings(subtitles)
+        used = set()
+
+        with write_lock:
+            with AtomicWrite(self.filename, 'wb') as file:
+                file.write(b' ' * (header_size - 1) + b'\n')
+
+                scenes = []
+                for scene in subtitles.scenes:
+                    batches = []
+                    for batch in scene.batches:
+                        offset = file.tell()
+                        loader = batch._loader
+                        if self._can_copy(batch):
+                            # The batch hasn't changed since it was read, so it doesn't need to be encoded again
+                            data = loader.ReadBytes()
+                            stored.append((loader, offset))
+                            batch_strings = loader.strings
+                        else:
+                            strings.used = set()
+                            data = self._encode(batch, strings)
+                            batch_strings = sorted(strings.used) or None
+
+                        file.write(data)
+                        batches.append(self._batch_entry(batch, offset, len(data), batch_strings))
+                        used.update(batch_strings or [])
+
+                    scenes.append({
+                        'scene': scene.number,
+                        'context': {
+                            'summary': scene.context.get('summary'),
+                            'summaries': scene.context.get('summaries')
+                        },
+                        'batches': batches
+                    })
+
+                # Each string that is referenced is written once, after the batches
+                table = StringTable(self._read_string)
+                for key in sorted(used):
+                    text = strings.strings.get(key)
+                    if text is None:
+                        text = sources[key].Resolve(key)
+
+                    data = self._pack(json.dumps(text, ensure_ascii=False).encode('utf-8') + b'\n')
+                    table.strings[key] = text
+                    table.locations[key] = (file.tell(), len(data))
+                    file.write(data)
+
+                index = {
+                    'filename': subtitles.filename,
+                    'context': subtitles.context,
+                    'scenes': scenes
+                }
+
+                if table.locations:
+                    index['strings'] = { key: list(location) for key, location in table.locations.items() }
+
+                index = self._pack(json.dumps(index, cls=SubtitleEncoder, ensure_ascii=False).encode('utf-8') + b'\n')
+
+                index_offset = file.tell()
+                file.write(index)
+
+                header = { 'format': index_format, 'version': index_version, 'index': [ index_offset, len(index) ] }
+                if self.compact:
+                    header['compression'] = 'zlib'
+
+                header = json.dumps(header).encode('utf-8')
+                file.seek(0)
+                file.write(header.ljust(header_size - 1) + b'\n')
+
+            with open(self.filename, 'rb') as file:
+                self._snapshot = self._stat(file)
+
+            self.strings = table
+
+            # Batches that were copied from the file that has just been replaced have to be read from the new file
+            replaced = set()
+            for loader, offset in stored:
+                if os.path.abspath(loader.projectfile.filename) == os.path.abspath(self.filename):
+                    replaced.add(loader.projectfile)
+                    loader.Move(self, offset)
+
+            # Strings can no longer be read from the replaced file either
+            for projectfile in replaced:
+                if projectfile is not self:
+                    projectfile.strings.strings.update(table.strings)
+
+    def _can_copy(self, batch : SubtitleBatch) -> bool:
+        loader = batch._loader
+        return isinstance(loader, StoredBatch) and loader.projectfile.compact == self.compact
+
+    def _count_strings(self, subtitles : SubtitleFile):
+        """
+        Count the strings in every prompt, so that strings which are repeated can be stored once
+        """
+        strings = StringTable()
+        sources = {}
+        for scene in subtitles.scenes:
+            for batch in scene.batches:
+                if self._can_copy(batch):
+                    for key in batch._loader.strings or []:
+                        strings.CountReference(key)
+                        sources[key] = batch._loader.projectfile.strings
+                    continue
+
+                prompt : ChatGPTPrompt = batch.translation.prompt if batch.translation else None
+                if isinstance(prompt, ChatGPTPrompt):
+                    strings.Count(prompt.instructions)
+                    for message in prompt.messages or []:
+                        if isinstance(message, dict):
+                            strings.Count(message.get('content'))
+
+        return strings, sources
+
+    def _batch_entry(self, batch : SubtitleBatch, offset : int, length : int, strings : list[str] = None) -> dict:
+        entry = {
+            'batch': batch.number,
+            'size': batch.size,
+            'translated': batch.translatedcount,
+            'errors': batch.errorcount,
+            'all_translated': batch.all_translated,
+            'summary': batch.summary,
+            'offset': offset,
+            'length': length
+        }
+
+        if isinstance(batch._loader, StoredBatch):
+            entry['lines'] = batch._loader.lines
+        elif batch.originals:
+            entry['lines'] = [ batch.first_line.number, batch.last_line.number ]
+
+        if strings:
+            entry['strings'] = strings
+
+        return entry
+
+    def _read(self, offset : int, length : int) -> bytes:
+        """
+        Read part of the file, checking that it is the same file the index was read from
+        """
+        with open(self.filename, 'rb') as file:
+            if self._stat(file) != self._snapshot:
+                raise ValueError(f"{self.filename} has changed since it was opened")
+
+            file.seek(offset)
+            return file.read(length)
+
+    def _read_string(self, key : str) -> str:
+        offset, length = self.strings.locations[key]
+        try:
+            return json.loads(self._unpack(self._read(offset, length)))
+
+        except ValueError:
+            # If the file has been replaced the string will have been copied from the new file
+            with write_lock:
+                text = self.strings.strings.get(key)
+
+            if text is None:
+                raise
+            return text
+
+    def _encode(self, batch : SubtitleBatch, strings : StringTable = None) -> bytes:
+        return self._pack(json.dumps(batch, cls=SubtitleEncoder, strings=strings, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def _pack(self, data : bytes) -> bytes:
+        return zlib.compress(data, compression_level) if self.compact else data
+
+    def _unpack(self, data : bytes) -> bytes:
+        return zlib.decompress(data) if self.compact else data
+
+    @classmethod
+    def _read_header(cls, file):
+        data = file.read(header_size)
+        if not data.startswith(b'{"format"'):
+            return None
+
+        try:
+            header = json.loads(data)
+        except ValueError:
+            return None
+
+        if header.get('format') != index_format or header.get('version') != index_version:
+            return None
+
+        return header
+
+    @classmethod
+    def _stat(cls, file):
+        stat = os.fstat(file.fileno())
+        return (stat.st_size, stat.st_mtime_ns)
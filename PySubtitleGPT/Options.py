@@ -21,6 +21,19 @@ def env_bool(key, default=False):
     var = os.getenv(key, default)
     return var and str(var).lower() in ('true', 'yes', '1')
 
+def has_value(value) -> bool:
+    """
+    Check whether an option has been set. Numbers are values even if they are zero, unlike None, False or an empty string or list
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True
+    return bool(value)
+
+default_review_instructions = linesep.join([
+    'Check the translation for consistency with the rest of the scene, e.g. names, terms, gender and formality.',
+    'Only reply with lines that need to be corrected, in the same format as the translation.'
+])
+
 default_options = {
     'api_key': os.getenv('API_KEY', None),
     'gpt_model': os.getenv('GPT_MODEL', 'gpt-3.5-turbo'),
@@ -29,19 +42,39 @@ default_options = {
     'target_language': os.getenv('TARGET_LANGUAGE', 'English'),
     'temperature': float(os.getenv('TEMPERATURE', 0.0)),
     'allow_retranslations': env_bool('ALLOW_RETRANSLATIONS', True),
+    'targeted_retranslation': env_bool('TARGETED_RETRANSLATION'),
+    'retranslation_context_lines': int(os.getenv('RETRANSLATION_CONTEXT_LINES', 2)),
+    'translation_memory': env_bool('TRANSLATION_MEMORY'),
+    'exclude_remembered_lines': env_bool('EXCLUDE_REMEMBERED_LINES'),
+    'review_instructions': os.getenv('REVIEW_INSTRUCTIONS', default_review_instructions),
     'scene_threshold': float(os.getenv('SCENE_THRESHOLD', 30.0)),
     'batch_threshold': float(os.getenv('BATCH_THRESHOLD', 5.0)),
     'min_batch_size': int(os.getenv('MIN_BATCH_SIZE', 5)),
     'max_batch_size': int(os.getenv('MAX_BATCH_SIZE', 25)),
+    'batch_token_budget': int(os.getenv('BATCH_TOKEN_BUDGET')) if os.getenv('BATCH_TOKEN_BUDGET') else None,
+    'adaptive_batch_size': env_bool('ADAPTIVE_BATCH_SIZE'),
     'max_context_summaries': int(os.getenv('MAX_CONTEXT_SUMMARIES', 10)),
     'max_characters': int(os.getenv('MAX_CHARACTERS', 120)),
     'max_newlines': int(os.getenv('MAX_NEWLINES', 3)),
     'max_lines': int(os.getenv('MAX_LINES')) if os.getenv('MAX_LINES') else None, 
     'rate_limit': float(os.getenv('RATE_LIMIT')) if os.getenv('RATE_LIMIT') else None,
+    'token_rate_limit': float(os.getenv('TOKEN_RATE_LIMIT')) if os.getenv('TOKEN_RATE_LIMIT') else None,
     'max_threads': int(os.getenv('MAX_THREADS', 4)),
+    'batch_mode': os.getenv('BATCH_MODE', None),
+    'consistency_pass': env_bool('CONSISTENCY_PASS'),
+    'max_concurrent_requests': int(os.getenv('MAX_CONCURRENT_REQUESTS', 16)),
+    'stream_responses': env_bool('STREAM_RESPONSES'),
     'max_retries': int(os.getenv('MAX_RETRIES', 5)),
     'backoff_time': float(os.getenv('BACKOFF_TIME', 4.0)),
     'project' : os.getenv('PROJECT', None),
+    'project_format' : os.getenv('PROJECT_FORMAT', 'indexed'),
+    'autosave_interval' : float(os.getenv('AUTOSAVE_INTERVAL', 20.0)),
+    'autosave_max_latency' : float(os.getenv('AUTOSAVE_MAX_LATENCY', 60.0)),
+    'response_cache' : os.getenv('RESPONSE_CACHE', None),
+    'response_cache_max_entries' : int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 10000)),
+    'response_cache_max_age' : float(os.getenv('RESPONSE_CACHE_MAX_AGE', 30.0)),
+    'bypass_cache' : env_bool('BYPASS_CACHE'),
+    'match_tolerance': float(os.getenv('MATCH_TOLERANCE', 0.5)),
     'enforce_line_parity': env_bool('ENFORCE_LINE_PARITY', True),
     'stop_on_error' : env_bool('STOP_ON_ERROR'),
     'write_backup' : env_bool('WRITE_BACKUP_FILE', True),
@@ -53,8 +86,8 @@ class Options:
         if not options:
             options = default_options.copy()
         else:
-            # Remove None values from options and merge with default_options
-            options = {k: v for k, v in options.items() if v}
+            # Remove unset values from options and merge with default_options
+            options = {k: v for k, v in options.items() if has_value(v)}
             options = {**default_options, **options}
 
         self.options = options
@@ -88,7 +121,7 @@ class Options:
         self.options[option] = value
 
     def update(self, options: dict):
-        options = {k: v for k, v in options.items() if v}
+        options = {k: v for k, v in options.items() if has_value(v)}
         self.options.update(options)
 
     def api_key(self):
@@ -0,0 +1,113 @@
+import inspect
+import logging
+import threading
+import time
+import weakref
+
+class ProjectAutosave:
+    """
+    Saves a project in the background when it changes.
+
+    Changes are coalesced, so a burst of changes results in a single save once there have been no more changes
+    for the interval, or once the earliest unsaved change has waited for the maximum latency.
+
+    The autosave only holds a weak reference to a method it is given, so it doesn't keep the project alive.
+    """
+    def __init__(self, save, interval : float, max_latency : float = None):
+        self._save = weakref.WeakMethod(save) if inspect.ismethod(save) else lambda: save
+        self.interval = interval
+        self.max_latency = max(max_latency or interval, interval)
+        self._condition = threading.Condition()
+        self._first_change = None
+        self._last_change = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ProjectAutosave", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> bool:
+        """
+        True if there are changes that haven't been saved
+        """
+        return self._first_change is not None
+
+    def Notify(self):
+        """
+        Record that the project has changed
+        """
+        with self._condition:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._condition.notify()
+
+    def MarkSaved(self):
+        """
+        Record that the project has been saved some other way, so there is nothing to autosave
+        """
+        with self._condition:
+            self._first_change = self._last_change = None
+
+    def Flush(self):
+        """
+        Save any unsaved changes now, in the calling thread
+        """
+        with self._condition:
+            pending = self._first_change is not None
+            self._first_change = self._last_change = None
+
+        if pending:
+            self._call_save()
+
+    def Stop(self, flush : bool = True):
+        """
+        Stop the background thread, saving any unsaved changes first unless flush is False
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+        if flush:
+            self.Flush()
+
+    def _run(self):
+        while self._wait_for_changes():
+            self._call_save()
+
+    def _wait_for_changes(self) -> bool:
+        """
+        Wait until a save is due, returning False if the autosave is stopped first
+        """
+        with self._condition:
+            while not self._stopping:
+                if self._first_change is None:
+                    self._condition.wait()
+                    continue
+
+                due = min(self._last_change + self.interval, self._first_change + self.max_latency)
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    self._first_change = self._last_change = None
+                    return True
+
+                self._condition.wait(remaining)
+
+            return False
+
+    def _call_save(self):
+        save = self._save()
+        if save is None:
+            return
+
+        try:
+            save()
+
+        except Exception as e:
+            logging.error(f"Unable to save the project, will try again later: {str(e)}")
+            with self._condition:
+                if self._first_change is None:
+                    self._first_change = self._last_change = time.monotonic()
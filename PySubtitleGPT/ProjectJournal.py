@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import threading
+
+from PySubtitleGPT.Helpers import AtomicWrite
+from PySubtitleGPT.SubtitleBatch import SubtitleBatch
+from PySubtitleGPT.SubtitleFile import SubtitleFile
+from PySubtitleGPT.SubtitleScene import SubtitleScene
+from PySubtitleGPT.SubtitleSerialisation import SubtitleDecoder, SubtitleEncoder
+
+default_encoding = os.getenv('DEFAULT_ENCODING', 'utf-8')
+
+journal_version = 1
+
+# The journal is compacted into the project file once it is larger than the project file and at least this size
+min_compact_size = 256 * 1024
+
+class ProjectJournal:
+    """
+    An append-only record of the changes made to a project since its project file was last written.
+
+    Each translated batch and scene, merge, split and change of options is appended to the journal as a single
+    line of JSON, so saving progress costs the size of the change rather than the size of the project.
+    Reading the project file and replaying the journal restores the latest state.
+
+    The journal begins with a header identifying the project file it applies to, so a journal left behind
+    by an older version of the project file is ignored rather than applied twice.
+
+    Records can be appended from any thread while the project file is being written. Records appended after
+    the checkpoint the project file was written from are kept when the journal is reset.
+    """
+    def __init__(self, projectfile : str):
+        self.projectfile = projectfile
+        self.filename = f"{projectfile}.journal"
+        self.active = False
+        self._valid_size = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.filename)
+        except OSError:
+            return 0
+
+    def Checkpoint(self) -> int:
+        """
+        The position in the journal that the project matches, to be passed to Reset once the project has been written
+        """
+        with self._lock:
+            return self.size if self.active else None
+
+    def Reset(self, checkpoint : int = None):
+        """
+        Start a new journal for the project file as it is now, keeping any records appended after the checkpoint
+        """
+        with self._lock:
+            records = b''
+            if checkpoint is not None and os.path.exists(self.filename):
+                with open(self.filename, 'rb') as file:
+                    file.seek(checkpoint)
+                    records = file.read()
+
+            with AtomicWrite(self.filename, 'wb') as file:
+                file.write(self._encode(self._header()).encode(default_encoding))
+                file.write(records)
+
+            self._valid_size = None
+            self.active = True
+
+    def Resume(self):
+        """
+        Continue the journal that was replayed, discarding anything after the last complete record
+        """
+        if self._valid_size is None:
+            self.Reset()
+            return
+
+        with self._lock:
+            with open(self.filename, 'r+b') as file:
+                file.truncate(self._valid_size)
+
+            self._valid_size = None
+            self.active = True
+
+    def NeedsCompaction(self) -> bool:
+        """
+        Check whether the journal has grown large enough that the project file should be rewritten
+        """
+        size = self.size
+        if size < min_compact_size:
+            return False
+
+        try:
+            return size > os.path.getsize(self.projectfile)
+        except OSError:
+            return True
+
+    def AppendBatch(self, batch : SubtitleBatch):
+        self._append({
+            'record': 'batch',
+            'scene': batch.scene,
+            'batch': batch.number,
+            'first': batch.first_line.number if batch.originals else None,
+            'data': batch
+        })
+
+    def AppendScene(self, scene : SubtitleScene):
+        self._append({
+            'record': 'scene',
+            'scene': scene.number,
+            'summary': scene.context.get('summary'),
+            'summaries': scene.context.get('summaries')
+        })
+
+    def AppendMergeScenes(self, scene_numbers : list[int]):
+        self._append({ 'record': 'merge_scenes', 'scenes': scene_numbers })
+
+    def AppendMergeBatches(self, scene_number : int, batch_numbers : list[int]):
+        self._append({ 'record': 'merge_batches', 'scene': scene_number, 'batches': batch_numbers })
+
+    def AppendSplitBatch(self, scene_number : int, batch_number : int, size : int):
+        self._append({ 'record': 'split_batch', 'scene': scene_number, 'batch': batch_number, 'size': size })
+
+    def AppendContext(self, context : dict):
+        self._append({ 'record': 'context', 'context': context })
+
+    def Replay(self, subtitles : SubtitleFile) -> int:
+        """
+        Apply the journal to subtitles read from the project file, returning the number of records applied
+        """
+        self._valid_size = None
+
+        try:
+            file = open(self.filename, 'rb')
+        except FileNotFoundError:
+            return 0
+
+        count = 0
+        with file:
+            header = self._decode(file.readline())
+            if not header or header.get('record') != 'journal' or header.get('version') != journal_version:
+                logging.warning(f"{self.filename} is not a valid project journal, ignoring it")
+                return 0
+
+            if header.get('snapshot') != self._snapshot():
+                logging.warning(f"{self.filename} does not match the project file, ignoring it")
+                return 0
+
+            self._valid_size = file.tell()
+
+            for line in file:
+                if not line.endswith(b'\n'):
+                    logging.warning(f"Discarding incomplete record at the end of {self.filename}")
+                    break
+
+                try:
+                    record = self._decode(line)
+                    self._apply(subtitles, record)
+
+                except Exception as e:
+                    logging.warning(f"Unable to replay record {count + 1} of {self.filename}, discarding the rest of the journal: {str(e)}")
+                    break
+
+                self._valid_size += len(line)
+                count += 1
+
+        if count:
+            # Collect the translated lines again when they are needed
+            subtitles.translated = None
+
+        return count
+
+    def _append(self, record : dict):
+        if not self.active:
+            return
+
+        data = self._encode(record)
+        with self._lock:
+            with open(self.filename, 'a', encoding=default_encoding) as file:
+                file.write(data)
+
+    def _apply(self, subtitles : SubtitleFile, record : dict):
+        record_type = record.get('record')
+        if record_type == 'batch':
+            self._apply_batch(subtitles, record)
+        elif record_type == 'scene':
+            scene : SubtitleScene = subtitles.GetScene(record['scene'])
+            scene.context['summary'] = record.get('summary')
+            scene.context['summaries'] = record.get('summaries')
+        elif record_type == 'merge_scenes':
+            subtitles.MergeScenes(record['scenes'])
+        elif record_type == 'merge_batches':
+            subtitles.MergeBatches(record['scene'], record['batches'])
+        elif record_type == 'split_batch':
+            subtitles.SplitBatch(record['scene'], record['batch'], record['size'])
+        elif record_type == 'context':
+            subtitles.context = record['context']
+        else:
+            raise ValueError(f"Unknown record type {record_type}")
+
+    def _apply_batch(self, subtitles : SubtitleFile, record : dict):
+        """
+        Copy a translated batch onto the matching batch of the subtitles
+        """
+        scene : SubtitleScene = subtitles.GetScene(record['scene'])
+        batch : SubtitleBatch = scene.GetBatch(record['batch'])
+        saved : SubtitleBatch = record['data']
+
+        if not batch or batch.size != saved.size or (batch.first_line.number if batch.originals else None) != record.get('first'):
+            raise ValueError(f"Scene {record['scene']} batch {record['batch']} does not match the project")
+
+        for line, saved_line in zip(batch.originals, saved.originals):
+            # Input substitutions may have changed the text
+            line.item = saved_line
+            line.translation = saved_line.translation
+
+        batch.summary = saved.summary
+        batch.context = saved.context
+        batch.translation = saved.translation
+        batch.errors = saved.errors
+        batch.translated = saved.translated
+
+    def _header(self) -> dict:
+        return { 'record': 'journal', 'version': journal_version, 'snapshot': self._snapshot() }
+
+    def _snapshot(self) -> list:
+        """
+        Identify the project file the journal applies to by its size and modification time
+        """
+        try:
+            stat = os.stat(self.projectfile)
+            return [ stat.st_size, stat.st_mtime_ns ]
+        except OSError:
+            return None
+
+    def _encode(self, record : dict) -> str:
+        return json.dumps(record, cls=SubtitleEncoder, ensure_ascii=False) + '\n'
+
+    def _decode(self, line : bytes):
+        try:
+            return json.loads(line, cls=SubtitleDecoder)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+
+class RateLimiter:
+    """
+    Enforces requests-per-minute, tokens-per-minute and concurrent request limits
+    for every client in the process.
+
+    Rates are enforced with token buckets that refill continuously, holding at most one
+    second's worth of capacity, so requests are spread out rather than sent in bursts.
+    A request is allowed to overdraw the token bucket when it is full, so that requests
+    larger than one second's allowance can still be made.
+    """
+    def __init__(self, requests_per_minute : float = None, tokens_per_minute : float = None, max_concurrent : int = None):
+        self.condition = threading.Condition()
+        self.requests_per_minute = None
+        self.tokens_per_minute = None
+        self.max_concurrent = None
+        self.account_requests_per_minute = None
+        self.account_tokens_per_minute = None
+        self.available_requests = 0.0
+        self.available_tokens = 0.0
+        self.active = 0
+        self.blocked_until = 0.0
+        self.last_update = time.monotonic()
+
+        self.Configure(requests_per_minute, tokens_per_minute, max_concurrent)
+
+    def Configure(self, requests_per_minute : float = None, tokens_per_minute : float = None, max_concurrent : int = None):
+        """
+        Set the limits. A limit of None means unlimited.
+        """
+        with self.condition:
+            previous_capacity = (self.request_capacity, self.token_capacity)
+            self.requests_per_minute = float(requests_per_minute) if requests_per_minute else None
+            self.tokens_per_minute = float(tokens_per_minute) if tokens_per_minute else None
+            self.max_concurrent = int(max_concurrent) if max_concurrent else None
+            self._reset_capacity(*previous_capacity)
+            self.condition.notify_all()
+
+    @property
+    def request_rate(self):
+        """
+        Effective requests per minute, the lower of the configured and account limits
+        """
+        return _lowest(self.requests_per_minute, self.account_requests_per_minute)
+
+    @property
+    def token_rate(self):
+        """
+        Effective tokens per minute, the lower of the configured and account limits
+        """
+        return _lowest(self.tokens_per_minute, self.account_tokens_per_minute)
+
+    @property
+    def request_capacity(self):
+        return max(1.0, self.request_rate / 60.0) if self.request_rate else 0.0
+
+    @property
+    def token_capacity(self):
+        return self.token_rate / 60.0 if self.token_rate else 0.0
+
+    def Acquire(self, estimated_tokens : int = 0):
+        """
+        Block until there is capacity for a request using an estimated number of tokens
+        """
+        with self.condition:
+            delay = self._try_reserve(estimated_tokens)
+            while delay:
+                self.condition.wait(timeout=delay)
+                delay = self._try_reserve(estimated_tokens)
+
+    async def AcquireAsync(self, estimated_tokens : int = 0):
+        """
+        Wait without blocking the event loop until there is capacity for a request
+        """
+        delay = self.TryAcquire(estimated_tokens)
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self.TryAcquire(estimated_tokens)
+
+    def TryAcquire(self, estimated_tokens : int = 0):
+        """
+        Reserve capacity for a request if there is enough.
+
+        :return: 0 if the request can go ahead, otherwise the number of seconds to wait before trying again.
+        """
+        with self.condition:
+            return self._try_reserve(estimated_tokens)
+
+    def Release(self, estimated_tokens : int = 0, total_tokens : int = None, headers : dict = None):
+        """
+        Mark a request as complete, correcting the token estimate with the number of tokens actually used
+        """
+        with self.condition:
+            self.active = max(0, self.active - 1)
+
+            if self.token_rate and total_tokens is not None:
+                self.available_tokens -= total_tokens - estimated_tokens
+
+            if headers:
+                self._update_from_headers(headers)
+
+            self.condition.notify_all()
+
+    def Hold(self, seconds : float):
+        """
+        Hold off all requests for a number of seconds, e.g. when asked to retry later
+        """
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def UpdateFromHeaders(self, headers : dict):
+        """
+        Adjust limits and remaining capacity from x-ratelimit-* response headers
+        """
+        if headers:
+            with self.condition:
+                self._update_from_headers(headers)
+                self.condition.notify_all()
+
+    def _try_reserve(self, estimated_tokens : int):
+        """
+        Reserve capacity if available, otherwise return how long to wait. The lock must be held.
+        """
+        now = time.monotonic()
+        self._refill(now)
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        if self.max_concurrent and self.active >= self.max_concurrent:
+            # Blocking callers are notified when a request completes, this is a poll interval for async callers
+            return 0.1
+
+        request_rate = self.request_rate
+        if request_rate and self.available_requests < 1.0:
+            return (1.0 - self.available_requests) * 60.0 / request_rate
+
+        token_rate = self.token_rate
+        if token_rate and estimated_tokens:
+            needed = min(estimated_tokens, self.token_capacity)
+            if self.available_tokens < needed:
+                return (needed - self.available_tokens) * 60.0 / token_rate
+
+        self.active += 1
+
+        if request_rate:
+            self.available_requests -= 1.0
+
+        if token_rate:
+            self.available_tokens -= estimated_tokens
+
+        return 0
+
+    def _refill(self, now : float):
+        elapsed = now - self.last_update
+        self.last_update = now
+
+        if self.request_rate:
+            self.available_requests = min(self.request_capacity, self.available_requests + elapsed * self.request_rate / 60.0)
+
+        if self.token_rate:
+            self.available_tokens = min(self.token_capacity, self.available_tokens + elapsed * self.token_rate / 60.0)
+
+    def _reset_capacity(self, previous_request_capacity : float, previous_token_capacity : float):
+        """
+        Start with full buckets if there was no limit before, otherwise clamp them to the new capacity
+        """
+        self.available_requests = min(self.available_requests, self.request_capacity) if previous_request_capacity else self.request_capacity
+        self.available_tokens = min(self.available_tokens, self.token_capacity) if previous_token_capacity else self.token_capacity
+
+    def _update_from_headers(self, headers : dict):
+        limit_requests = _get_header_value(headers, 'x-ratelimit-limit-requests')
+        limit_tokens = _get_header_value(headers, 'x-ratelimit-limit-tokens')
+
+        if (limit_requests and limit_requests != self.account_requests_per_minute) or (limit_tokens and limit_tokens != self.account_tokens_per_minute):
+            logging.debug(f"Account rate limits are {limit_requests} requests and {limit_tokens} tokens per minute")
+            previous_capacity = (self.request_capacity, self.token_capacity)
+            self.account_requests_per_minute = limit_requests or self.account_requests_per_minute
+            self.account_tokens_per_minute = limit_tokens or self.account_tokens_per_minute
+            self._reset_capacity(*previous_capacity)
+
+        now = time.monotonic()
+
+        # If the account has run out of capacity hold off all requests until it resets
+        if _get_header_value(headers, 'x-ratelimit-remaining-requests') == 0:
+            reset = ParseResetTime(headers.get('x-ratelimit-reset-requests'))
+            if reset:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+        if _get_header_value(headers, 'x-ratelimit-remaining-tokens') == 0:
+            reset = ParseResetTime(headers.get('x-ratelimit-reset-tokens'))
+            if reset:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+def _lowest(*values):
+    values = [ value for value in values if value ]
+    return min(values) if values else None
+
+def _get_header_value(headers : dict, key : str):
+    value = headers.get(key)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def ParseResetTime(value : str):
+    """
+    Parse a reset duration from OpenAI, e.g. "1s", "6m0s" or "120ms", into seconds
+    """
+    if not value:
+        return None
+
+    units = { 'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001 }
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", str(value))
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+_shared_limiter : RateLimiter = None
+_shared_lock = threading.Lock()
+
+def GetRateLimiter(options) -> RateLimiter:
+    """
+    Get the process-wide rate limiter, configured from the options
+    """
+    global _shared_limiter
+
+    requests_per_minute = options.get('rate_limit')
+    tokens_per_minute = options.get('token_rate_limit')
+    max_concurrent = options.get('max_concurrent_requests')
+
+    with _shared_lock:
+        if not _shared_limiter:
+            _shared_limiter = RateLimiter(requests_per_minute, tokens_per_minute, max_concurrent)
+
+        elif (_shared_limiter.requests_per_minute, _shared_limiter.tokens_per_minute, _shared_limiter.max_concurrent) != (requests_per_minute or None, tokens_per_minute or None, max_concurrent or None):
+            _shared_limiter.Configure(requests_per_minute, tokens_per_minute, max_concurrent)
+
+    return _shared_limiter
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+class ResponseCache:
+    """
+    On-disk cache of OpenAI responses, keyed by a hash of the model, temperature and messages.
+
+    Entries older than max_age seconds are discarded, and the least recently used entries
+    are evicted when there are more than max_entries.
+    """
+    def __init__(self, path : str, max_entries : int = None, max_age : float = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+        self.Evict()
+
+    def __str__(self) -> str:
+        return f"ResponseCache {self.path} with {self.hits} hits and {self.misses} misses"
+
+    @property
+    def size(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @classmethod
+    def GetKey(cls, model : str, temperature : float, messages : list):
+        """
+        Hash the parameters of a request
+        """
+        request = json.dumps([model, temperature, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def Get(self, model : str, temperature : float, messages : list):
+        """
+        Look up a cached response for the request
+        """
+        key = self.GetKey(model, temperature, messages)
+        now = time.time()
+
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row and self.max_age and now - row[1] > self.max_age:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+
+            if not row:
+                self.misses += 1
+                return None
+
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def Put(self, model : str, temperature : float, messages : list, response : dict):
+        """
+        Store the response to a request
+        """
+        key = self.GetKey(model, temperature, messages)
+        now = time.time()
+
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                                    (key, json.dumps(response, ensure_ascii=False), now, now))
+
+            if self.max_entries:
+                self._evict_excess()
+
+    def Evict(self):
+        """
+        Remove expired entries and any excess over max_entries
+        """
+        with self.lock, self.connection:
+            if self.max_age:
+                self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+
+            if self.max_entries:
+                self._evict_excess()
+
+    def Clear(self):
+        """
+        Remove all cached responses
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+
+    def Close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _evict_excess(self):
+        """
+        Remove the least recently used entries over max_entries. The lock must be held.
+        """
+        self.connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+_shared_caches : dict[str, ResponseCache] = {}
+_shared_lock = threading.Lock()
+
+def GetResponseCache(options) -> ResponseCache:
+    """
+    Get the shared response cache for the path in the options, or None if caching is disabled
+    """
+    path = options.get('response_cache')
+    if not path:
+        return None
+
+    path = os.path.abspath(path)
+
+    with _shared_lock:
+        cache = _shared_caches.get(path)
+        if not cache:
+            max_age_days = options.get('response_cache_max_age')
+            max_age = max_age_days * 24 * 60 * 60 if max_age_days else None
+            cache = ResponseCache(path, options.get('response_cache_max_entries'), max_age)
+            logging.debug(f"Using response cache {path} with {cache.size} entries")
+            _shared_caches[path] = cache
+
+    return cache
@@ -0,0 +1,69 @@
+import logging
+
+from PySubtitleGPT.ChatGPTTranslationParser import ChatGPTTranslationParser, template
+from PySubtitleGPT.SubtitleLine import SubtitleLine
+
+closing_tag = "</translation>"
+
+class StreamingTranslationParser(ChatGPTTranslationParser):
+    """
+    Extract translated subtitles from a ChatGPT completion while it is being streamed,
+    so that each line can be reported as soon as its translation element is closed.
+
+    The complete response should still be processed with ProcessChatGPTResponse once it has been received.
+    """
+    def __init__(self, options, originals : list[SubtitleLine] = None):
+        super().__init__(options)
+        self.originals = { line.key : line for line in originals } if originals else {}
+        self.buffer = ""
+        self.position = 0
+        self.scanned = 0
+
+    def Feed(self, delta : str) -> list[SubtitleLine]:
+        """
+        Add a chunk of the completion and return any lines that are now complete
+        """
+        if not delta:
+            return []
+
+        self.buffer += delta
+
+        lines = []
+        while True:
+            # Only search text that could contain a closing tag we haven't seen yet
+            close = self.buffer.find(closing_tag, max(self.position, self.scanned - len(closing_tag)))
+            if close < 0:
+                break
+
+            end = close + len(closing_tag)
+
+            match = template.search(self.buffer, self.position, end)
+            if match:
+                line = self._create_line(match)
+                if line:
+                    lines.append(line)
+
+            self.position = end
+
+        self.scanned = len(self.buffer)
+
+        return lines
+
+    def _create_line(self, match):
+        """
+        Construct a translated line from a match and number it from the original, if there is one
+        """
+        try:
+            line = SubtitleLine.FromDictionary(self.GetMatchValues(match))
+
+        except Exception as e:
+            logging.debug(f"Unable to parse streamed translation: {str(e)}")
+            return None
+
+        original = self.originals.get(line.key)
+        if original:
+            line.number = original.number
+
+        self.translations[line.key] = line
+
+        return line
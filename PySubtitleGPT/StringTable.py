@@ -0,0 +1,79 @@
+import hashlib
+import threading
+
+# Strings shorter than this are cheaper to store than to reference
+min_string_length = 100
+
+class StringTable:
+    """
+    Large strings that are repeated throughout a project, such as the instructions and context sent with every
+    batch, stored once and referenced by the hash of their content.
+
+    When a project is written each candidate string is counted, and strings that occur more than once are
+    replaced with a reference. When a project is read the strings are only loaded when a batch that refers
+    to them is decoded.
+    """
+    def __init__(self, loader = None):
+        self.loader = loader
+        self.strings = {}
+        self.locations = {}
+        self.used = set()
+        self._hashes = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def Hash(cls, text : str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def Count(self, text : str):
+        """
+        Count an occurrence of a string that could be stored in the table
+        """
+        if isinstance(text, str) and len(text) >= min_string_length:
+            key = self._hash(text)
+            self.strings[key] = text
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def CountReference(self, key : str):
+        """
+        Count an existing reference to a string in the table
+        """
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def Reference(self, text : str):
+        """
+        Replace a repeated string with a reference to it
+        """
+        if not isinstance(text, str) or len(text) < min_string_length:
+            return text
+
+        key = self._hash(text)
+        if self._counts.get(key, 0) < 2:
+            return text
+
+        self.used.add(key)
+        return { "$string": key }
+
+    def Resolve(self, key : str) -> str:
+        """
+        Get the string for a reference, loading it if necessary
+        """
+        text = self.strings.get(key)
+        if text is None:
+            if key not in self.locations:
+                raise ValueError(f"Unknown string reference {key}")
+
+            with self._lock:
+                text = self.strings.get(key)
+                if text is None:
+                    text = self.loader(key)
+                    self.strings[key] = text
+
+        return text
+
+    def _hash(self, text : str) -> str:
+        key = self._hashes.get(text)
+        if key is None:
+            key = self._hashes[text] = self.Hash(text)
+        return key
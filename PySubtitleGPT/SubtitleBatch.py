@@ -1,18 +1,44 @@
+import copy
+import threading
 from pysrt import SubRipTime
 from PySubtitleGPT.Helpers import PerformSubstitutions
 from PySubtitleGPT.SubtitleLine import SubtitleLine
 
+# Batches, scenes and files keep running totals that are updated from several threads, so they share a lock
+counter_lock = threading.RLock()
+
 class SubtitleBatch:
+    """
+    A group of sequential lines that are translated together.
+
+    Once the batch is part of a SubtitleFile its originals are a range of the file's lines,
+    rather than a separate list, so batches can be split and merged without copying lines.
+
+    The batch keeps count of its translated lines and errors, and passes any changes on to its scene.
+
+    A batch read from an indexed project file only knows its size and counts until its lines,
+    context or translation are needed, at which point they are loaded from the file.
+    """
     def __init__(self, dct = None):
         dct = dct or {}
         self.scene = dct.get('scene', None)
         self.number = dct.get('batch') or dct.get('number')
         self.summary = dct.get('summary')
-        self.context = dct.get('context', {})
-        self.translation = dct.get('translation')
-        self.errors = dct.get('errors', [])
-        self._originals = dct.get('originals', []) or dct.get('subtitles', []) 
+        self._context = dct.get('context', {})
+        self._translation = dct.get('translation')
+        self._errors = dct.get('errors') or []
+        self._originals = dct.get('originals', []) or dct.get('subtitles', [])
         self._translated = dct.get('translated', [])
+        self._lines = None
+        self._first = 0
+        self._stop = 0
+        self._parent = None
+        self._translatedcount = 0
+        self._complete = False
+        self._loader = None
+        self._size = 0
+        self._errorcount = 0
+        self._count_lines()
 
     def __str__(self) -> str:
         return f"SubtitleBatch: {str(self.number)} in scene {str(self.scene)} with {self.size} lines"
@@ -22,31 +48,103 @@ class SubtitleBatch:
 
     @property
     def originals(self) -> list[SubtitleLine]:
+        if self._lines is not None:
+            return self._lines[self._first:self._stop]
+        if self._loader is not None:
+            self._load()
         return self._originals
-    
+
     @property
     def size(self):
+        if self._lines is not None:
+            return self._stop - self._first
+        if self._loader is not None:
+            return self._size
         return len(self._originals)
+
+    @property
+    def loaded(self) -> bool:
+        """
+        False if the batch's lines and translation are still waiting to be read from a project file
+        """
+        return self._loader is None
+
+    @property
+    def line_range(self):
+        """
+        (first, stop) indexes of the batch in the lines it is bound to, or None if it isn't bound
+        """
+        return (self._first, self._stop) if self._lines is not None else None
     
     @property
     def translated(self) -> list[SubtitleLine]:
+        if self._loader is not None:
+            self._load()
         return self._translated
 
+    @property
+    def context(self) -> dict:
+        if self._loader is not None:
+            self._load()
+        return self._context
+
+    @property
+    def translation(self):
+        if self._loader is not None:
+            self._load()
+        return self._translation
+
     @property
     def untranslated(self):
-        return [sub for sub in self.originals if not sub.translated]
+        return [sub for sub in self.originals if not sub.translation]
+
+    @property
+    def translatedcount(self):
+        return self._translatedcount
+
+    @property
+    def untranslatedcount(self):
+        return self.size - self._translatedcount
+
+    @property
+    def errors(self):
+        if self._loader is not None:
+            self._load()
+        return self._errors
+
+    @property
+    def errorcount(self):
+        if self._loader is not None:
+            return self._errorcount
+        return len(self._errors) if self._errors else 0
 
     @property
     def all_translated(self):
-        return self.translated and (len(self.translated) == len(self.originals))
-    
+        return self._complete
+
+    @property
+    def first_line(self) -> SubtitleLine:
+        if self._lines is not None:
+            return self._lines[self._first] if self._stop > self._first else None
+        originals = self.originals
+        return originals[0] if originals else None
+
+    @property
+    def last_line(self) -> SubtitleLine:
+        if self._lines is not None:
+            return self._lines[self._stop - 1] if self._stop > self._first else None
+        originals = self.originals
+        return originals[-1] if originals else None
+
     @property
     def start(self) -> SubRipTime:
-        return self.originals[0].start if self.originals else None
-        
+        line = self.first_line
+        return line.start if line else None
+
     @property
     def end(self) -> SubRipTime:
-        return self.originals[-1].end if self.originals else None
+        line = self.last_line
+        return line.end if line else None
     
     @property
     def duration(self):
@@ -54,17 +152,104 @@ class SubtitleBatch:
     
     @originals.setter
     def originals(self, value):
-        self._originals = [ SubtitleLine(line) for line in value ] if value else None
+        if self._loader is not None:
+            self._load()
+        self._lines = None
+        self._originals = list(value) if value else []
+        self._count_lines()
 
     @translated.setter
     def translated(self, value):
-        self._translated = [ SubtitleLine(line) for line in value ] if value else None
+        if self._loader is not None:
+            self._load()
+        self._translated = list(value) if value else None
+        self._update_complete()
+
+    @context.setter
+    def context(self, context : dict):
+        if self._loader is not None:
+            self._load()
+        self._context = context
+
+    @translation.setter
+    def translation(self, translation):
+        if self._loader is not None:
+            self._load()
+        self._translation = translation
+
+    @errors.setter
+    def errors(self, errors):
+        if self._loader is not None:
+            self._load()
+        with counter_lock:
+            delta = (len(errors) if errors else 0) - self.errorcount
+            self._errors = errors
+            if delta and self._parent:
+                self._parent._adjust_counts(errors=delta)
+
+    def Bind(self, lines : list[SubtitleLine], first : int, stop : int):
+        """
+        Make the batch a view of lines[first:stop] instead of keeping its own list of lines
+        """
+        self._lines = lines
+        self._first = first
+        self._stop = stop
+        self._originals = None
+        self._count_lines()
+
+    def Snapshot(self):
+        """
+        A copy of the batch for saving, which keeps its lines and context if the batch is split, merged or retranslated.
+        The lines themselves are shared with the batch.
+        """
+        with counter_lock:
+            snapshot = copy.copy(self)
+            snapshot._parent = None
+            if self._lines is not None:
+                snapshot._lines = None
+                snapshot._originals = self._lines[self._first:self._stop]
+            elif self._originals:
+                snapshot._originals = list(self._originals)
+
+            snapshot._translated = list(self._translated) if self._translated else self._translated
+            snapshot._context = dict(self._context) if self._context else self._context
+            snapshot._errors = list(self._errors) if self._errors else self._errors
+            return snapshot
 
     def AddLine(self, line):
-        self._originals.append(SubtitleLine(line))
+        self.AddLines([line])
+
+    def AddLines(self, lines : list[SubtitleLine]):
+        if self._lines is not None:
+            raise ValueError("Cannot add lines to a batch that is part of a subtitle file")
+
+        if self._loader is not None:
+            self._load()
+
+        with counter_lock:
+            translated = 0
+            for line in lines:
+                line._batch = self
+                if line.translation:
+                    translated += 1
+
+            self._originals.extend(lines)
+            self._translatedcount += translated
+            if self._parent:
+                self._parent._adjust_counts(lines=len(lines), translated=translated)
+            self._update_complete()
 
     def AddTranslatedLine(self, line):
-        self._translated.append(SubtitleLine(line))
+        self.translated.append(line)
+        self._update_complete()
+
+    def AddError(self, error):
+        if self._loader is not None:
+            self._load()
+        with counter_lock:
+            self._errors.append(error)
+            if self._parent:
+                self._parent._adjust_counts(errors=1)
 
     def AddContext(self, key, value):
         self.context[key] = value
@@ -107,3 +292,72 @@ class SubtitleBatch:
 
             return replacements
 
+    def _line_translated(self, delta : int):
+        """
+        Called by a line in the batch when it gains (+1) or loses (-1) a translation
+        """
+        with counter_lock:
+            self._translatedcount += delta
+            if self._parent:
+                self._parent._adjust_counts(translated=delta)
+
+    def _count_lines(self):
+        """
+        Take ownership of the batch's lines and count how many of them are translated.
+        The scene recounts its totals after changing its batches, so it isn't told about the difference.
+        """
+        with counter_lock:
+            translated = 0
+            for line in self.originals or []:
+                line._batch = self
+                if line.translation:
+                    translated += 1
+
+            self._translatedcount = translated
+            self._update_complete()
+
+    def _set_loader(self, loader, size : int, translatedcount : int, errorcount : int, complete : bool):
+        """
+        Defer reading the batch's lines and translation until they are needed, using the size and counts from the index.
+        The loader returns a SubtitleBatch with the stored content.
+        """
+        self._loader = loader
+        self._originals = []
+        self._translated = None
+        self._size = size
+        self._translatedcount = translatedcount
+        self._errorcount = errorcount
+        self._complete = complete
+
+    def _load(self):
+        """
+        Read the batch's content with the loader. If another thread loads it first, its result is used instead.
+        """
+        loader = self._loader
+        if loader is None:
+            return
+
+        stored : SubtitleBatch = loader()
+
+        with counter_lock:
+            if self._loader is not loader:
+                return
+
+            self._loader = None
+            self._originals = stored._originals
+            self._translated = stored._translated
+            self._context = stored._context or {}
+            self._translation = stored._translation
+            self._errors = stored._errors
+            self._count_lines()
+
+    def _update_complete(self):
+        """
+        Check whether every line has a translation and tell the scene if that has changed
+        """
+        with counter_lock:
+            complete = bool(self._translated) and len(self._translated) == self.size
+            if complete != self._complete:
+                self._complete = complete
+                if self._parent:
+                    self._parent._adjust_counts(completed=1 if complete else -1)
@@ -1,4 +1,5 @@
 from pysrt import SubRipTime
+from PySubtitleGPT.Helpers import EstimateTokenCount
 from PySubtitleGPT.SubtitleScene import SubtitleScene
 from PySubtitleGPT.SubtitleLine import SubtitleLine
 
@@ -8,36 +9,131 @@ class SubtitleBatcher:
 
     def BatchSubtitles(self, lines : list[SubtitleLine]):
         options = self.options
+
+        scene_threshold = options.get('scene_threshold', 30.0) * SubRipTime.SECONDS_RATIO
+
+        scenes = []
+
+        for scene_lines in self._split_by_gap(lines, scene_threshold):
+            scene = SubtitleScene()
+            scenes.append(scene)
+            scene.number = len(scenes)
+
+            if options.get('batch_token_budget'):
+                batches = self._batch_by_tokens(scene_lines)
+            else:
+                batches = self._batch_by_size(scene_lines)
+
+            for batch_lines in batches:
+                batch = scene.AddNewBatch()
+                batch.AddContext('summary', "New Scene")
+                batch.AddLines(batch_lines)
+
+        return scenes
+
+    def _split_by_gap(self, lines : list[SubtitleLine], threshold : float):
+        """
+        Divide lines into groups wherever the gap between them exceeds the threshold (in milliseconds)
+        """
+        groups = []
+        last_endtime = None
+
+        for line in lines:
+            gap = line.start_ms - last_endtime if last_endtime is not None else None
+
+            if gap is None or gap > threshold:
+                group = []
+                groups.append(group)
+
+            group.append(line)
+
+            last_endtime = line.end_ms
+
+        return groups
+
+    def _batch_by_size(self, lines : list[SubtitleLine]):
+        """
+        Start a new batch at max_batch_size lines, or at a time gap once there are min_batch_size lines
+        """
+        options = self.options
         max_batch_size = options.get('max_batch_size')
         min_batch_size = options.get('min_batch_size')
 
-        scene_threshold_us = options.get('scene_threshold', 30.0) * SubRipTime.SECONDS_RATIO
-        scene_threshold = SubRipTime.from_ordinal(scene_threshold_us)
+        if options.get('adaptive_batch_size') and options.get('tuned_batch_size'):
+            max_batch_size = options.get('tuned_batch_size')
 
-        batch_threshold_us = options.get('batch_threshold', 2.0) * SubRipTime.SECONDS_RATIO
-        batch_threshold = SubRipTime.from_ordinal(batch_threshold_us)
+        batch_threshold = options.get('batch_threshold', 2.0) * SubRipTime.SECONDS_RATIO
 
-        scenes = []
+        batches = []
+        batch = None
         last_endtime = None
 
         for line in lines:
-            gap = line.start - last_endtime if last_endtime else None 
+            gap = line.start_ms - last_endtime if last_endtime is not None else None
 
-            if gap is None or gap > scene_threshold:
-                scene = SubtitleScene()
-                scenes.append(scene)
-                scene.number = len(scenes)
-                batch = None
+            if batch is None or (len(batch) >= max_batch_size) or (len(batch) >= min_batch_size and gap > batch_threshold):
+                batch = []
+                batches.append(batch)
 
-            if batch is None or (batch.size >= max_batch_size) or (batch.size >= min_batch_size and gap > batch_threshold):
-                batch = scene.AddNewBatch()
-                batch.AddContext('summary', "New Scene")
+            batch.append(line)
 
-            batch.AddLine(line)
+            last_endtime = line.end_ms
 
-            last_endtime = line.end
+        return batches
 
-        return scenes
+    def _batch_by_tokens(self, lines : list[SubtitleLine]):
+        """
+        Pack lines into batches up to the token budget, splitting each batch at the largest time gap
+        in its second half so that batches still tend to end at a natural break.
+        """
+        options = self.options
+        budget = options.get('batch_token_budget')
+        min_batch_size = options.get('min_batch_size') or 1
+
+        batches = []
+        batch = []
+        tokens = 0
+
+        for line in lines:
+            line_tokens = self.EstimateLineTokens(line)
+
+            if batch and tokens + line_tokens > budget:
+                split = self._find_split(batch, min_batch_size)
+                batches.append(batch[:split])
+                batch = batch[split:]
+                tokens = sum(self.EstimateLineTokens(item) for item in batch)
+
+            batch.append(line)
+            tokens += line_tokens
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def EstimateLineTokens(self, line : SubtitleLine):
+        """
+        Estimate the tokens a line will use, including the expected translation in the completion
+        """
+        prompt_tokens = EstimateTokenCount(line.prompt)
+
+        # The translation is returned in the same format as the original
+        return prompt_tokens * 2
 
+    def _find_split(self, batch : list[SubtitleLine], min_batch_size : int):
+        """
+        Find the index to split the batch at, preferring the largest gap between lines
+        """
+        first = max(min_batch_size, len(batch) // 2, 1)
+        if first >= len(batch):
+            return len(batch)
 
+        best_split = len(batch)
+        best_gap = None
+        for index in range(first, len(batch)):
+            gap = batch[index].start_ms - batch[index - 1].end_ms
+            if best_gap is None or gap >= best_gap:
+                best_gap = gap
+                best_split = index
 
+        return best_split
@@ -1,37 +1,92 @@
+import copy
 import os
 import logging
 import threading
-import pysrt
-from pysrt import SubRipFile
-from PySubtitleGPT.Helpers import GetInputFilename, GetOutputFilename, ParseCharacters, ParseSubstitutions, UnbatchScenes
+from PySubtitleGPT.Helpers import GetInputFilename, GetOutputFilename, ParseCharacters, ParseSubstitutions
+from PySubtitleGPT.SubtitleBatch import counter_lock
 from PySubtitleGPT.SubtitleScene import SubtitleScene
 from PySubtitleGPT.SubtitleLine import SubtitleLine
+from PySubtitleGPT.SubtitleReader import SubtitleReader
+from PySubtitleGPT.SubtitleWriter import SubtitleWriter
 from PySubtitleGPT.SubtitleBatcher import SubtitleBatcher
-from PySubtitleGPT.SubtitleError import TranslationError
-
-default_encoding = os.getenv('DEFAULT_ENCODING', 'utf-8')
-fallback_encoding = os.getenv('DEFAULT_ENCODING', 'iso-8859-1')
 
 # High level class for manipulating subtitle files
 class SubtitleFile:
     def __init__(self, filename = None):
         self.sourcefile = GetInputFilename(filename)
         self.filename = GetOutputFilename(filename)
-        self.originals : list[SubtitleLine] = None
-        self.translated : list[SubtitleLine] = None
         self.context = {}
+        self._originals : list[SubtitleLine] = None
+        self._translated : list[SubtitleLine] = None
+        self._bound = True
         self._scenes : list[SubtitleScene] = []
+        self._scene_index : dict[int, SubtitleScene] = {}
+        self._translatedcount = 0
+        self._errorcount = 0
         self.lock = threading.RLock()
 
     @property
     def has_subtitles(self):
         return self.linecount > 0 or self.scenecount > 0
     
+    @property
+    def originals(self) -> list[SubtitleLine]:
+        """
+        Every line in the file. If the scenes were read from an indexed project file this loads every batch.
+        """
+        if not self._bound:
+            self._bind()
+        return self._originals
+
+    @originals.setter
+    def originals(self, originals : list[SubtitleLine]):
+        self._originals = originals
+
+    @property
+    def translated(self) -> list[SubtitleLine]:
+        """
+        The translated lines, which are collected from the batches if they have been reset
+        """
+        if not self._bound:
+            self._bind()
+        if self._translated is None and self._scenes:
+            self._translated = self.CollectTranslated()
+        return self._translated
+
+    @translated.setter
+    def translated(self, translated : list[SubtitleLine]):
+        self._translated = translated
+
     @property
     def linecount(self):
         with self.lock:
-            return len(self.originals) if self.originals else 0
+            if not self._bound:
+                return sum(scene.linecount for scene in self._scenes)
+            return len(self._originals) if self._originals else 0
     
+    @property
+    def translatedcount(self):
+        """
+        Number of lines in the scenes that have a translation
+        """
+        return self._translatedcount
+
+    @property
+    def untranslatedcount(self):
+        return self.linecount - self._translatedcount
+
+    @property
+    def errorcount(self):
+        return self._errorcount
+
+    @property
+    def progress(self) -> float:
+        """
+        Proportion of the lines that have been translated, from 0.0 to 1.0
+        """
+        linecount = self.linecount
+        return min(self._translatedcount / linecount, 1.0) if linecount else 0.0
+
     @property
     def scenecount(self):
         with self.lock:
@@ -45,23 +100,43 @@ class SubtitleFile:
     def scenes(self, scenes : list[SubtitleScene]):
         with self.lock:
             self._scenes = scenes
-            self.originals, self.translated, _ = UnbatchScenes(scenes)
+            self._bound = True
+            self._originals = self._bind_batches(scenes)
+            self._translated = self.CollectTranslated()
             self.Renumber()
+            self._recount()
+
+    def CollectTranslated(self) -> list[SubtitleLine]:
+        """
+        Gather the translated lines from every batch, in order
+        """
+        with self.lock:
+            return [ line for scene in self.scenes for batch in scene.batches for line in batch.translated or [] ]
+
+    def Snapshot(self):
+        """
+        A copy of the scenes and batches for saving, which isn't affected by later changes to them, so that it can be
+        written without holding the lock. The lines are shared with the subtitles, so changes to them may be included.
+        """
+        with self.lock:
+            snapshot = copy.copy(self)
+            snapshot.lock = threading.RLock()
+            snapshot.context = dict(self.context) if self.context else self.context
+            snapshot._scenes = [ scene.Snapshot() for scene in self._scenes ]
+            snapshot._scene_index = { scene.number : scene for scene in snapshot._scenes }
+            return snapshot
 
     def GetScene(self, scene_number : int) -> SubtitleScene:
         if not self.scenes:
             raise ValueError("Subtitles have not been batched")
-        
+
         with self.lock:
-            matches = [scene for scene in self.scenes if scene.number == scene_number ]
-    
-        if not matches:
+            scene = self._scene_index.get(scene_number)
+
+        if not scene:
             raise ValueError(f"Scene {scene_number} does not exist")
-        
-        if len(matches) > 1:
-            raise TranslationError(f"There is more than one scene {scene_number}!")
-        
-        return matches[0]
+
+        return scene
 
     def LoadSubtitles(self, filename : str):
         """
@@ -69,15 +144,13 @@ class SubtitleFile:
         """
         self.sourcefile = GetInputFilename(filename)
 
-        try:
-            srt = pysrt.open(self.sourcefile)
-            
-        except UnicodeDecodeError as e:
-            srt = pysrt.open(filename, encoding=fallback_encoding)
+        # Read the source file from the same directory as the file we were given
+        reader = SubtitleReader(os.path.join(os.path.dirname(filename), self.sourcefile))
+        originals = list(reader.ReadLines())
 
         with self.lock:
             self.filename = GetOutputFilename(filename)
-            self.originals = [ SubtitleLine(item) for item in srt ]
+            self.originals = originals
         
     # Write original subtitles to an SRT file
     def SaveOriginals(self, filename : str = None):
@@ -86,8 +159,7 @@ class SubtitleFile:
             raise ValueError("No filename set")
 
         with self.lock:
-            srtfile = SubRipFile(items=self.originals)
-            srtfile.save(filename)
+            SubtitleWriter(self.filename).WriteLines(self.originals)
 
     def SaveTranslation(self, filename : str = None):
         """
@@ -104,8 +176,7 @@ class SubtitleFile:
         logging.info(f"Saving translation to {str(filename)}")
 
         with self.lock:
-            srtfile = SubRipFile(items=self.translated)
-            srtfile.save(filename)
+            SubtitleWriter(filename).WriteLines(self.translated)
 
     def UpdateContext(self, options):
         """
@@ -125,8 +196,12 @@ class SubtitleFile:
             'substitutions': None,
             'min_batch_size' : None,
             'max_batch_size' : None,
+            'tuned_batch_size' : None,
+            'batch_token_budget' : None,
             'batch_threshold' : None,
             'scene_threshold' : None,
+            'batch_mode' : None,
+            'consistency_pass' : None,
         }
 
         with self.lock:
@@ -162,6 +237,10 @@ class SubtitleFile:
     def AddScene(self, scene):
         with self.lock:
             self.scenes.append(scene)
+            self._scene_index[scene.number] = scene
+            scene._parent = self
+            with counter_lock:
+                self._adjust_counts(0, scene.translatedcount, scene.errorcount)
             logging.debug("Added a new scene")
 
     def MergeScenes(self, scene_numbers: list[int]):
@@ -176,20 +255,24 @@ class SubtitleFile:
             raise ValueError("Scene numbers to be merged are not sequential")
 
         with self.lock:
-            scenes = [scene for scene in self.scenes if scene.number in scene_numbers]
-            if len(scenes) != len(scene_numbers):
-                raise ValueError(f"Could not find scenes {','.join(scene_numbers)}")
+            scenes = [ self._scene_index.get(scene_number) for scene_number in scene_numbers ]
+            if None in scenes:
+                raise ValueError(f"Could not find scenes {','.join(str(number) for number in scene_numbers)}")
+
+            # Merge all scenes into the first. The file's totals are unchanged, so the scene doesn't need to report them.
+            for scene in scenes:
+                scene._parent = None
 
-            # Merge all scenes into the first
             scenes[0].MergeScenes(scenes[1:])
 
-            # Slice out the merged scenes
-            start_index = self.scenes.index(scenes[0])
-            end_index = self.scenes.index(scenes[-1])
-            self.scenes = self.scenes[:start_index + 1] + self.scenes[end_index+1:]
+            # Slice out the merged scenes. The lines are unchanged, so the batches are still bound to them.
+            start_index = self._scene_position(scenes[0])
+            end_index = self._scene_position(scenes[-1])
+            self._scenes = self.scenes[:start_index + 1] + self.scenes[end_index+1:]
 
-            for number, scene in enumerate(self.scenes, start = 1):
-                scene.number = number
+            # Only the scenes after the merged scene need to be renumbered
+            scenes[0]._parent = self
+            self._renumber_scenes(start_index + 1)
 
     def MergeBatches(self, scene_number : int, batch_numbers: list[int]):
         """
@@ -199,22 +282,29 @@ class SubtitleFile:
             raise ValueError("No batch numbers supplied to MergeBatches")
 
         with self.lock:
-            scene : SubtitleScene = next((scene for scene in self.scenes if scene.number == scene_number), None)
+            scene : SubtitleScene = self._scene_index.get(scene_number)
             if not scene:
                 raise ValueError(f"Scene {str(scene_number)} not found")
 
             scene.MergeBatches(batch_numbers)
 
+    def SplitBatch(self, scene_number : int, batch_number : int, size : int):
+        """
+        Split a batch after a number of lines, returning the new batch
+        """
+        with self.lock:
+            scene : SubtitleScene = self._scene_index.get(scene_number)
+            if not scene:
+                raise ValueError(f"Scene {str(scene_number)} not found")
+
+            return scene.SplitBatch(batch_number, size)
+
     def Renumber(self):
         """
         Force monotonic numbering of scenes, batches, lines and translated lines
         """
         with self.lock:
-            for scene_number, scene in enumerate(self.scenes, start=1):
-                scene.number = scene_number
-                for batch_number, batch in enumerate(scene.batches, start=1):
-                    batch.number = batch_number
-                    batch.scene = scene.number
+            self._renumber_scenes()
 
             # Renumber lines sequentially and remap translated indexes
             translated_map = { translated.number: translated for translated in self.translated } if self.translated else None
@@ -227,3 +317,87 @@ class SubtitleFile:
                     del translated_map[line.number]
 
                 line.number = number
+
+    def _renumber_scenes(self, first : int = 0):
+        """
+        Number scenes and batches sequentially from a position and update the scene index. The lock must be held.
+        """
+        if not first:
+            self._scene_index = {}
+
+        for position in range(first, len(self.scenes)):
+            scene = self.scenes[position]
+            scene.number = position + 1
+            scene._parent = self
+            self._scene_index[scene.number] = scene
+
+            if first:
+                # Only the scene number has changed
+                for batch in scene.batches:
+                    batch.scene = scene.number
+            else:
+                scene.RenumberBatches()
+
+        # Remove numbers that are no longer used
+        for scene_number in range(len(self.scenes) + 1, len(self._scene_index) + 1):
+            del self._scene_index[scene_number]
+
+    def _adjust_counts(self, lines : int = 0, translated : int = 0, errors : int = 0):
+        """
+        Update the totals when a scene changes. The counter lock must be held.
+        """
+        self._translatedcount += translated
+        self._errorcount += errors
+
+    def _recount(self):
+        """
+        Recalculate the totals from the scenes, after scenes have been replaced or merged
+        """
+        with counter_lock:
+            self._translatedcount = sum(scene.translatedcount for scene in self.scenes)
+            self._errorcount = sum(scene.errorcount for scene in self.scenes)
+
+    def _scene_position(self, scene : SubtitleScene):
+        """
+        Position of the scene in the list, which matches its number unless the scenes haven't been renumbered
+        """
+        position = scene.number - 1
+        if 0 <= position < len(self.scenes) and self.scenes[position] is scene:
+            return position
+        return self.scenes.index(scene)
+
+    def _set_stored_scenes(self, scenes : list[SubtitleScene]):
+        """
+        Use scenes read from a project index, whose batches are loaded when they are needed.
+        The batches are not bound to the file's lines until something needs all of the lines.
+        """
+        with self.lock:
+            self._scenes = scenes
+            self._bound = False
+            self._originals = None
+            self._translated = None
+            self._renumber_scenes()
+            self._recount()
+
+    def _bind(self):
+        """
+        Load every batch and bind them to a single list of lines
+        """
+        with self.lock:
+            if not self._bound:
+                self._originals = self._bind_batches(self._scenes)
+                self._translated = None
+                self._bound = True
+
+    def _bind_batches(self, scenes : list[SubtitleScene]):
+        """
+        Collect the lines of every batch into a single list, and make each batch a view of its range of the list
+        """
+        lines = []
+        for scene in scenes or []:
+            for batch in scene.batches:
+                first = len(lines)
+                lines.extend(batch.originals)
+                batch.Bind(lines, first, len(lines))
+
+        return lines
@@ -1,90 +1,151 @@
+import re
 from os import linesep
 from pysrt import SubRipItem, SubRipTime
 
 from PySubtitleGPT.Helpers import FixTime
 
+tag_pattern = re.compile(r'<[^>]*?>')
+time_pattern = re.compile(r'^\s*(\d+):(\d+):(\d+)[,.](\d+)\s*$')
+timestamp_separator = '-->'
+
 class SubtitleLine:
     """
-    Represents a single line, with a number and start and end times plus original text 
+    Represents a single line, with a number and start and end times plus original text
     and (optionally) an associated translation.
+
+    Times are stored as integer milliseconds and the text is stored as it appears in the
+    subtitle file. A pysrt SubRipItem is only created if one is asked for.
+
+    A line that belongs to a batch tells the batch when it gains or loses a translation,
+    so that the batch can keep count of its translated lines.
+
+    The line in SubRip format is cached until the number, times, position or text change,
+    so that saving the same subtitles again only formats the lines that have changed.
     """
+    __slots__ = ('_number', '_start', '_end', '_text', '_position', '_translation', '_batch', '_cue')
+
     def __init__(self, line, translation=None):
+        self._batch = None
+        self._translation = translation
         self.item = line
-        self.translation = translation
-    
+
     def __str__(self):
-        return str(self.item)
+        if self._cue is None:
+            position = f" {self._position}" if self._position else ''
+            self._cue = f"{self._number}\n{self._format_time(self._start)} --> {self._format_time(self._end)}{position}\n{self._text}\n"
+        return self._cue
 
     def __repr__(self):
-        return f"Line({str(self.key)}, {repr(self.text)})"
+        return f"Line({self._format_time(self._start)}, {repr(self.text)})"
 
     @property
-    def key(self):
-        return str(self.start) if self.start else self.number
+    def key(self) -> int:
+        """
+        The start time in milliseconds, which identifies the line within a subtitle file
+        """
+        return self._start
 
     @property
     def number(self):
-        return self._item.index if self._item else None
+        return self._number
+
+    @property
+    def position(self):
+        return self._position
 
     @property
     def text(self):
-        return self._item.text_without_tags if self._item else None
+        if self._text is None or '<' not in self._text:
+            return self._text
+        return tag_pattern.sub('', self._text)
+
+    @property
+    def start_ms(self) -> int:
+        return self._start
+
+    @property
+    def end_ms(self) -> int:
+        return self._end
 
     @property
     def start(self) -> SubRipTime:
-        return self._item.start if self._item else None
-    
+        return SubRipTime.from_ordinal(self._start)
+
     @property
     def end(self) -> SubRipTime:
-        return self._item.end if self._item else None
-    
+        return SubRipTime.from_ordinal(self._end)
+
     @property
     def duration(self) -> SubRipTime:
-        return self.end - self.start if self.start and self.end else SubRipTime()
+        return SubRipTime.from_ordinal(self._end - self._start)
 
     @property
     def line(self):
-        return str(self._item) if self._item else None
+        return str(self)
+
+    @property
+    def translation(self):
+        return self._translation
 
     @property
     def translated(self):
-        if not self._item:
-            return None 
-        line = SubtitleLine(self._item)
+        line = SubtitleLine(self)
         line.text = self.translation
         return line
-    
+
     @property
     def prompt(self):
-        if not self._item:
-            return None
-        
         return '\n'.join([
-            f"<original start='{self.start}' end='{self.end}'>",
+            f"<original start='{self._format_time(self._start)}' end='{self._format_time(self._end)}'>",
             self.text.replace(linesep, '\n'),
             f"</original>"
         ])
 
     @property
-    def item(self):
-        return self._item
+    def item(self) -> SubRipItem:
+        """
+        A pysrt SubRipItem for the line
+        """
+        return SubRipItem(self._number, self._start, self._end, self._text, self._position)
 
     @classmethod
-    def Construct(cls, number, start, end, text):
-        start = FixTime(start)
-        end = FixTime(end)
-        item = SubRipItem(number, start, end, text)
-        return SubtitleLine(item) 
-    
+    def Construct(cls, number, start, end, text, position = ''):
+        line = SubtitleLine.__new__(SubtitleLine)
+        line.number = number
+        line._start = cls._fix_time(start)
+        line._end = cls._fix_time(end)
+        line._text = text
+        line._position = position
+        line._translation = None
+        line._batch = None
+        line._cue = None
+        return line
+
+    @classmethod
+    def FromFields(cls, number, start, end, text : str, position : str = '', translation : str = None):
+        """
+        Construct a SubtitleLine from the fields stored in a project file, with the times in milliseconds
+        """
+        line = SubtitleLine.__new__(SubtitleLine)
+        line._number = number
+        line._start = start if type(start) is int else cls._fix_time(start)
+        line._end = end if type(end) is int else cls._fix_time(end)
+        line._text = text
+        line._position = position
+        line._translation = translation
+        line._batch = None
+        line._cue = None
+        return line
+
     @classmethod
     def FromDictionary(cls, values):
         """
         Construct a SubtitleLine from a dictionary.
         """
         return SubtitleLine.Construct(
-            values.get('number') or values.get('index'), 
-            values['start'].strip(), 
-            values['end'].strip(), 
+            values.get('number') or values.get('index'),
+            values['start'].strip(),
+            values['end'].strip(),
             values['body'].strip())
 
     @classmethod
@@ -92,44 +153,130 @@ class SubtitleLine:
         """
         Construct a SubtitleLine from a regex match.
 
-        Really should use named groups, but findall doesn't seem to preserve the names. 
+        Really should use named groups, but findall doesn't seem to preserve the names.
         """
         if len(match) > 3:
             number, start, end, body = match
         else:
             start, end, body = match
             number = None
-            
+
         return SubtitleLine.Construct(number, start.strip(), end.strip(), body.strip())
 
     @item.setter
     def item(self, item):
-        self._item = SubRipItem.from_lines(str(item).strip().split('\n'))
+        if isinstance(item, SubtitleLine):
+            self._number = item._number
+            self._start = item._start
+            self._end = item._end
+            self._text = item._text
+            self._position = item._position
+            self._cue = item._cue
+        elif isinstance(item, SubRipItem):
+            self._number = item.index
+            self._start = item.start.ordinal
+            self._end = item.end.ordinal
+            self._text = item.text
+            self._position = item.position
+            self._cue = None
+        else:
+            self._parse(str(item))
+
+    @translation.setter
+    def translation(self, translation):
+        if self._batch is not None and bool(translation) != bool(self._translation):
+            self._batch._line_translated(1 if translation else -1)
+        self._translation = translation
 
     @number.setter
     def number(self, value):
-        if self._item:
-            self._item.index = value
+        try:
+            self._number = int(value)
+        except (TypeError, ValueError):
+            self._number = value
+        self._cue = None
+
+    @position.setter
+    def position(self, position):
+        self._position = position
+        self._cue = None
 
     @text.setter
     def text(self, text):
-        if self._item:
-            self._item.text = text
+        self._text = str(text) if text is not None else ''
+        self._cue = None
 
     @start.setter
     def start(self, time):
-        if self._item:
-            self._item.start = SubRipItem.coerce(time)
+        self._start = self._to_ms(time)
+        self._cue = None
 
     @end.setter
     def end(self, time):
-        if self._item:
-            self._item.end = SubRipItem.coerce(time)
+        self._end = self._to_ms(time)
+        self._cue = None
+
+    def _parse(self, block : str):
+        """
+        Read the number, times and text from a line in SubRip format
+        """
+        lines = [ line.rstrip() for line in block.strip().split('\n') ]
+        if len(lines) < 2:
+            raise ValueError(f"Not a valid subtitle line: {block}")
+
+        self.number = lines.pop(0) if timestamp_separator not in lines[0] else None
+
+        timestamps = lines[0].split(timestamp_separator)
+        if len(timestamps) != 2:
+            raise ValueError(f"Not a valid subtitle timestamp: {lines[0]}")
+
+        end_and_position = timestamps[1].strip().split(' ', 1)
+        self.start = timestamps[0].strip()
+        self.end = end_and_position[0]
+        self.position = end_and_position[1].strip() if len(end_and_position) > 1 else ''
+        self._text = '\n'.join(lines[1:])
+
+    @classmethod
+    def _to_ms(cls, time) -> int:
+        """
+        Convert a time in any form pysrt understands to integer milliseconds
+        """
+        if isinstance(time, int):
+            return time
+        if isinstance(time, SubRipTime):
+            return time.ordinal
+        if isinstance(time, str):
+            match = time_pattern.match(time)
+            if match:
+                hours, minutes, seconds, milliseconds = match.groups()
+                return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(milliseconds)
+        return SubRipTime.coerce(time).ordinal
+
+    @classmethod
+    def _fix_time(cls, time) -> int:
+        """
+        Convert a time to integer milliseconds, repairing it first if it is malformed
+        """
+        if isinstance(time, int):
+            return time
+        if isinstance(time, str) and time_pattern.match(time):
+            return cls._to_ms(time)
+        return cls._to_ms(FixTime(time))
+
+    @classmethod
+    def _format_time(cls, ms : int) -> str:
+        """
+        Format integer milliseconds in SubRip format (HH:MM:SS,mmm)
+        """
+        seconds, ms = divmod(ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02}:{minutes:02}:{seconds:02},{ms:03}"
 
     @classmethod
     def GetLines(lines):
         """
-        (re)parse the lines, assuming SubRip format 
+        (re)parse the lines, assuming SubRip format
         """
         if all(isinstance(line, SubtitleLine) for line in lines):
             return lines
@@ -151,4 +298,3 @@ class SubtitleLine:
         """
         line = f"<{tag} line={line.number}>{line.text}</{tag}>"
         return line
-
@@ -2,8 +2,13 @@ import json
 import os
 import logging
 import threading
+from PySubtitleGPT.AsyncSubtitleTranslator import AsyncSubtitleTranslator
 from PySubtitleGPT.SubtitleTranslator import SubtitleTranslator
+from PySubtitleGPT.Helpers import AtomicWrite
+from PySubtitleGPT.IndexedProjectFile import IndexedProjectFile
 from PySubtitleGPT.Options import Options
+from PySubtitleGPT.ProjectAutosave import ProjectAutosave
+from PySubtitleGPT.ProjectJournal import ProjectJournal
 from PySubtitleGPT.SubtitleFile import SubtitleFile
 
 from PySubtitleGPT.SubtitleSerialisation import SubtitleDecoder, SubtitleEncoder
@@ -11,13 +16,17 @@ from PySubtitleGPT.TranslationEvents import TranslationEvents
 
 default_encoding = os.getenv('DEFAULT_ENCODING', 'utf-8')
 
+# Project files can be written as a single JSON document, with an index (the default) or with an index and compressed batches
+project_formats = [ 'json', 'indexed', 'compact' ]
+
 class SubtitleProject:
     def __init__(self, options : Options):
         self.options = options.GetNonProjectSpecificOptions() if options else Options()
         self.subtitles : SubtitleFile = None
         self.events = TranslationEvents()
         self.projectfile = None
-        self.needsupdate = False
+        self.journal : ProjectJournal = None
+        self.autosave : ProjectAutosave = None
         self.lock = threading.Lock()
         
         project_mode = options.get('project', '')
@@ -38,12 +47,20 @@ class SubtitleProject:
         options.add('retranslate', project_mode in ["retranslate"])
 
         if self.update_project:
-            self._start_autosave_thread
+            self._start_autosave_thread()
 
     def __del__(self):
-        if self.update_project:
-            self.stop_event.set()
-            self.periodic_update_thread.join()
+        autosave = getattr(self, 'autosave', None)
+        if autosave:
+            autosave.Stop(flush=False)
+
+    def Close(self):
+        """
+        Save any changes that are waiting to be autosaved and stop autosaving
+        """
+        if self.autosave:
+            self.autosave.Stop()
+            self.autosave = None
 
     def Initialise(self, filename, outfilename = None):
         """
@@ -53,6 +70,7 @@ class SubtitleProject:
         :param filename: the path to the source subtitle file (in .srt format) to be translated
         """ 
         self.projectfile = self.GetProjectFilename(filename or "subtitles")
+        self.journal = ProjectJournal(self.projectfile)
 
         options : Options = self.options
 
@@ -95,10 +113,50 @@ class SubtitleProject:
             translator : SubtitleTranslator = SubtitleTranslator(self.subtitles, self.options)
 
             translator.events.preprocessed += self._on_preprocessed
+            translator.events.line_translated += self._on_line_translated
             translator.events.batch_translated += self._on_batch_translated
+            translator.events.batch_split += self._on_batch_split
+            translator.events.batches_merged += self._on_batches_merged
+            translator.events.scene_translated += self._on_scene_summarised
 
             translator.TranslateSubtitles()
 
+            self._journal_context()
+
+            self.subtitles.SaveTranslation()
+
+        except Exception as e:
+            if self.subtitles and self.options.get('stop_on_error'):
+                self.subtitles.SaveTranslation()
+
+            logging.error(f"Failed to translate subtitles")
+            raise
+
+    async def TranslateSubtitlesAsync(self):
+        """
+        Pass the subtitles to the asynchronous translation engine, for use from an event loop.
+        """
+        if not self.subtitles:
+            raise Exception("No subtitles to translate")
+
+        # Prime new project files
+        if self.write_project:
+            self.WriteProjectFile()
+
+        try:
+            translator : AsyncSubtitleTranslator = AsyncSubtitleTranslator(self.subtitles, self.options)
+
+            translator.events.preprocessed += self._on_preprocessed
+            translator.events.line_translated += self._on_line_translated
+            translator.events.batch_translated += self._on_batch_translated
+            translator.events.batch_split += self._on_batch_split
+            translator.events.batches_merged += self._on_batches_merged
+            translator.events.scene_translated += self._on_scene_summarised
+
+            await translator.TranslateSubtitles()
+
+            self._journal_context()
+
             self.subtitles.SaveTranslation()
 
         except Exception as e:
@@ -119,12 +177,18 @@ class SubtitleProject:
             translator : SubtitleTranslator = SubtitleTranslator(self.subtitles, self.options)
 
             translator.events.preprocessed += self._on_preprocessed
+            translator.events.line_translated += self._on_line_translated
             translator.events.batch_translated += self._on_batch_translated
+            translator.events.batch_split += self._on_batch_split
+            translator.events.batches_merged += self._on_batches_merged
+            translator.events.scene_translated += self._on_scene_summarised
 
             scene = self.subtitles.GetScene(scene_number)
 
             translator.TranslateScene(scene, batch_numbers=batch_numbers)
 
+            self._journal_context()
+
             self.subtitles.SaveTranslation()
 
             return scene
@@ -155,25 +219,54 @@ class SubtitleProject:
 
     def WriteProjectFile(self, projectfile = None):
         """
-        Write a set of subtitles to a project file
+        Write a set of subtitles to a project file.
+
+        The scenes and batches are copied while the subtitles are locked, and the copy is written to a temporary file
+        that replaces the project file, so translation can continue while the project is being written.
         """
         with self.lock:
-            if not self.subtitles:
+            subtitles : SubtitleFile = self.subtitles
+            if not subtitles:
                 raise ValueError("Can't write project file, no subtitles")
 
-            if not isinstance(self.subtitles, SubtitleFile):
+            if not isinstance(subtitles, SubtitleFile):
                 raise ValueError("Asked to write a project file with the wrong content type")
 
-            if not self.subtitles.scenes:
+            if not subtitles.scenes:
                 raise ValueError("Asked to write a project file with no scenes")
 
             projectfile = projectfile or self.projectfile
 
+            project_format = self.options.get('project_format') or 'indexed'
+            if project_format not in project_formats:
+                raise ValueError(f"Unknown project format '{project_format}', expected one of {', '.join(project_formats)}")
+
             logging.info(f"Writing project data to {str(projectfile)}")
 
-            with open(projectfile, 'w', encoding=default_encoding) as f:
-                project_json = json.dumps(self.subtitles, cls=SubtitleEncoder, ensure_ascii=False, indent=4)
-                f.write(project_json)
+            if project_format == 'json':
+                # Batches can't be read from an indexed project file after it has been replaced, so load them first
+                subtitles.originals
+
+            update_journal = self.journal is not None and projectfile == self.projectfile
+
+            # Changes recorded in the journal before the checkpoint are included in the snapshot
+            with subtitles.lock:
+                checkpoint = self.journal.Checkpoint() if update_journal else None
+                snapshot = subtitles.Snapshot()
+
+                if self.autosave and projectfile == self.projectfile:
+                    self.autosave.MarkSaved()
+
+            if project_format == 'json':
+                # The project is encoded a piece at a time and written as it goes, rather than building the whole document first
+                with AtomicWrite(projectfile, 'w', encoding=default_encoding) as f:
+                    json.dump(snapshot, f, cls=SubtitleEncoder, line_blocks=True, ensure_ascii=False, indent=4)
+            else:
+                IndexedProjectFile(projectfile, compact=(project_format == 'compact')).Write(snapshot)
+
+            # The project file now includes everything in the journal up to the checkpoint
+            if update_journal:
+                self.journal.Reset(checkpoint)
 
     def WriteBackupFile(self):
         """
@@ -190,8 +283,19 @@ class SubtitleProject:
             with self.lock:
                 logging.info(f"Reading project data from {str(self.projectfile)}")
 
-                with open(self.projectfile, 'r', encoding=default_encoding) as f:
-                    subtitles: SubtitleFile = json.load(f, cls=SubtitleDecoder)
+                if IndexedProjectFile.IsIndexed(self.projectfile):
+                    subtitles : SubtitleFile = IndexedProjectFile(self.projectfile).Read()
+                else:
+                    with open(self.projectfile, 'r', encoding=default_encoding) as f:
+                        subtitles: SubtitleFile = json.load(f, cls=SubtitleDecoder)
+
+                if self.journal:
+                    replayed = self.journal.Replay(subtitles)
+                    if replayed:
+                        logging.info(f"Replayed {replayed} changes from {self.journal.filename}")
+
+                    if self.update_project:
+                        self.journal.Resume()
 
                 subtitles.project = self
                 self.subtitles = subtitles
@@ -208,14 +312,16 @@ class SubtitleProject:
 
     def UpdateProjectFile(self):
         """
-        Write current state of scenes to the project file
+        Write current state of scenes to the project file, in the background if autosave is enabled
         """
         if self.update_project:
             if not self.subtitles:
                 raise Exception("Unable to update project file, no subtitles")
-            
-            self.needsupdate = True
-            # self.WriteProjectFile()
+
+            if self.autosave:
+                self.autosave.Notify()
+            else:
+                self.WriteProjectFile()
 
     def UpdateProjectOptions(self, options: dict):
         """
@@ -229,41 +335,106 @@ class SubtitleProject:
         if all(options.get(key) == self.options.get(key) for key in options.keys()):
             return
 
-        with self.lock:
-            # Update "self.options"
-            self.options.update(options)
+        # Update "self.options"
+        self.options.update(options)
 
-            if self.subtitles:
+        if self.subtitles:
+            with self.subtitles.lock:
                 self.subtitles.UpdateContext(self.options)
 
+                if self._journal_ready():
+                    self.journal.AppendContext(self.subtitles.context)
+                    return
+
         self.WriteProjectFile()
 
+    def MergeScenes(self, scene_numbers : list[int]):
+        """
+        Merge several (sequential) scenes into one scene and record the change in the project
+        """
+        with self.subtitles.lock:
+            self.subtitles.MergeScenes(scene_numbers)
+
+            if self._journal_ready():
+                self.journal.AppendMergeScenes(scene_numbers)
+
+    def MergeBatches(self, scene_number : int, batch_numbers : list[int]):
+        """
+        Merge several (sequential) batches from a scene into one batch and record the change in the project
+        """
+        with self.subtitles.lock:
+            self.subtitles.MergeBatches(scene_number, batch_numbers)
+
+            if self._journal_ready():
+                self.journal.AppendMergeBatches(scene_number, batch_numbers)
+
+    def _journal_ready(self) -> bool:
+        return self.update_project and self.journal is not None and self.journal.active
+
+    def _journal_context(self):
+        """
+        Record changes the translator has made to the project context, such as the tuned batch size
+        """
+        if self._journal_ready():
+            with self.subtitles.lock:
+                self.journal.AppendContext(self.subtitles.context)
+
     def _start_autosave_thread(self):
-        self.stop_event = threading.Event()
-        self.periodic_update_thread = threading.Thread(target=self._background_autosave)
-        self.periodic_update_thread.daemon = True
-        self.periodic_update_interval = 20  # Autosave interval in seconds
-        self.periodic_update_thread.start()
-
-    def _background_autosave(self):
-        while not self.stop_event.is_set():
-            if self.needsupdate:
-                self.needsupdate = False
-                self.WriteProjectFile()
-            self.stop_event.wait(self.periodic_update_interval)
+        interval = self.options.get('autosave_interval')
+        if interval and interval > 0:
+            self.autosave = ProjectAutosave(self._autosave, interval, self.options.get('autosave_max_latency'))
+
+    def _autosave(self):
+        if self.subtitles and self.subtitles.scenes:
+            self.WriteProjectFile()
+
+    def _project_changed(self):
+        """
+        Schedule an autosave when changes that aren't in the journal have been made
+        """
+        if self.update_project and self.autosave:
+            self.autosave.Notify()
 
     def _on_preprocessed(self, scenes):
         logging.debug("Pre-processing finished")
-        self.needsupdate = self.update_project
+        self._project_changed()
         self.events.preprocessed(scenes)
 
+    def _on_line_translated(self, batch, line):
+        logging.debug(f"Line {line.number} translated")
+        self.events.line_translated(batch, line)
+
     def _on_batch_translated(self, batch):
         logging.debug("Batch translated")
-        self.needsupdate = self.update_project
+        if self._journal_ready():
+            self.journal.AppendBatch(batch)
+
+            # Fold the journal into the project file once it has grown too large
+            if self.journal.NeedsCompaction():
+                self.UpdateProjectFile()
+        else:
+            self._project_changed()
+
         self.events.batch_translated(batch)
 
+    def _on_scene_summarised(self, scene):
+        if self._journal_ready():
+            self.journal.AppendScene(scene)
+
+    def _on_batch_split(self, scene_number, batch_number, size):
+        if self._journal_ready():
+            self.journal.AppendSplitBatch(scene_number, batch_number, size)
+
+        self.events.batch_split(scene_number, batch_number, size)
+
+    def _on_batches_merged(self, scene_number, batch_numbers):
+        if self._journal_ready():
+            self.journal.AppendMergeBatches(scene_number, batch_numbers)
+
+        self.events.batches_merged(scene_number, batch_numbers)
+
     def _on_scene_translated(self, scene):
         logging.debug("Scene translated")
         self.subtitles.SaveTranslation()
-        self.needsupdate = self.update_project
+        self._project_changed()
         self.events.scene_translated(scene)
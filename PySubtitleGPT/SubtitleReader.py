@@ -0,0 +1,226 @@
+import codecs
+import logging
+import mmap
+import os
+import re
+
+from PySubtitleGPT.SubtitleLine import SubtitleLine
+
+default_encoding = os.getenv('DEFAULT_ENCODING', 'utf-8')
+fallback_encoding = os.getenv('FALLBACK_ENCODING', 'iso-8859-1')
+
+# Files at least this large are memory-mapped rather than read in chunks
+mmap_threshold = int(os.getenv('MMAP_THRESHOLD', 32 * 1024 * 1024))
+
+chunk_size = 1024 * 1024
+sample_size = 64 * 1024
+
+boms = [
+    (codecs.BOM_UTF32_LE, 'utf_32_le'),
+    (codecs.BOM_UTF32_BE, 'utf_32_be'),
+    (codecs.BOM_UTF8, 'utf_8'),
+    (codecs.BOM_UTF16_LE, 'utf_16_le'),
+    (codecs.BOM_UTF16_BE, 'utf_16_be'),
+]
+
+newline_pattern = re.compile(r'\r\n|\r|\n')
+# Well-formed timings can be converted directly, anything else goes through FixTime
+standard_timing_pattern = re.compile(r'^(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)\s*(.*)$')
+timing_pattern = re.compile(r'^\s*(?P<start>[^\s-]+)\s*-+>\s*(?P<end>[^\s]+)\s*(?P<position>.*?)\s*$')
+
+class SubtitleReader:
+    """
+    Reads subtitles from a SubRip file in a single pass, yielding each line as soon as it has been parsed.
+
+    The encoding is detected from a byte order mark or by checking whether a sample of the file is valid
+    in the default encoding. Common problems are tolerated: missing or non-numeric line numbers, missing
+    blank lines between cues, blank lines inside a cue and '.' as the millisecond separator.
+    """
+    def __init__(self, filename : str, encoding : str = None):
+        self.filename = filename
+        self.encoding = encoding
+        self.skipped = 0
+
+    def ReadLines(self):
+        """
+        Generate a SubtitleLine for each cue in the file
+        """
+        with open(self.filename, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size >= mmap_threshold:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    yield from self._parse(self._decode(self._buffer_chunks(buffer)))
+            else:
+                yield from self._parse(self._decode(self._file_chunks(file)))
+
+        if self.skipped:
+            logging.warning(f"Skipped {self.skipped} malformed subtitles in {self.filename}")
+
+    def _file_chunks(self, file):
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def _buffer_chunks(self, buffer):
+        for offset in range(0, len(buffer), chunk_size):
+            yield buffer[offset:offset + chunk_size]
+
+    def _decode(self, chunks):
+        """
+        Detect the encoding from the start of the file, then decode the chunks incrementally
+        """
+        chunks = iter(chunks)
+        head = b''
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= sample_size:
+                break
+
+        if not self.encoding:
+            self.encoding = self._detect_encoding(head)
+
+        for bom, encoding in boms:
+            if head.startswith(bom) and codecs.lookup(encoding).name == codecs.lookup(self.encoding).name:
+                head = head[len(bom):]
+                break
+
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='strict')
+        for chunk in self._chain(head, chunks):
+            try:
+                yield decoder.decode(chunk)
+
+            except UnicodeDecodeError:
+                # The sample looked valid, so only part of the file is affected
+                logging.warning(f"{self.filename} is not entirely valid {self.encoding}, replacing characters that cannot be decoded")
+                decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+                yield decoder.decode(chunk)
+
+        yield decoder.decode(b'', final=True)
+
+    def _chain(self, head : bytes, chunks):
+        yield head
+        yield from chunks
+
+    def _detect_encoding(self, sample : bytes):
+        """
+        Use the byte order mark if there is one, otherwise check whether the sample is valid in the default encoding
+        """
+        for bom, encoding in boms:
+            if sample.startswith(bom):
+                return encoding
+
+        try:
+            # The sample may end part way through a character, so don't treat it as the end of the input
+            codecs.getincrementaldecoder(default_encoding)().decode(sample, final=False)
+            return default_encoding
+
+        except UnicodeDecodeError:
+            logging.info(f"{self.filename} is not valid {default_encoding}, reading it as {fallback_encoding}")
+            return fallback_encoding
+
+    def _read_text_lines(self, text_chunks):
+        """
+        Split decoded text into lines, whatever line endings it uses
+        """
+        remainder = ''
+        for text in text_chunks:
+            if not text:
+                continue
+
+            text = remainder + text
+
+            # The last line may continue in the next chunk, and so may a \r\n pair
+            carriage_return = text.endswith('\r')
+            lines = newline_pattern.split(text[:-1] if carriage_return else text)
+            remainder = lines.pop() + ('\r' if carriage_return else '')
+            yield from lines
+
+        if remainder:
+            yield remainder
+
+    def _parse(self, text_chunks):
+        """
+        Group lines of text into cues. A cue is emitted when the next cue begins, so that text after a stray
+        blank line can still be attached to it.
+        """
+        cue = None          # [number, start, end, position, text lines]
+        candidate = None    # A line that could be the number of the next cue
+        malformed = False
+        last_number = 0
+
+        for line in self._read_text_lines(text_chunks):
+            line = line.rstrip()
+            stripped = line.strip()
+
+            if '->' in stripped:
+                timing = self._parse_timing(stripped)
+                if timing:
+                    if cue:
+                        yield self._create_line(cue)
+
+                    number = int(candidate) if candidate else last_number + 1
+                    last_number = number
+                    cue = [ number, *timing, [] ]
+                    candidate = None
+                    malformed = False
+                    continue
+
+                if '-->' in stripped:
+                    # Looks like a timing line but can't be understood, so drop the cue
+                    logging.debug(f"Unable to parse subtitle timing '{stripped}'")
+                    if cue:
+                        yield self._create_line(cue)
+                    cue = None
+                    candidate = None
+                    malformed = True
+                    self.skipped += 1
+                    continue
+
+            if candidate is not None:
+                # The number wasn't followed by a timing line, so it was part of the text
+                if cue and not malformed:
+                    cue[4].append(candidate)
+                candidate = None
+
+            if not stripped:
+                continue
+
+            if stripped.isdecimal():
+                candidate = stripped
+            elif cue and not malformed:
+                cue[4].append(line)
+
+        if candidate is not None and cue and not malformed:
+            cue[4].append(candidate)
+
+        if cue:
+            yield self._create_line(cue)
+
+    def _parse_timing(self, line : str):
+        """
+        Read the start and end times (in milliseconds) and position from a timing line, or None if it isn't one
+        """
+        match = standard_timing_pattern.match(line)
+        if match:
+            h1, m1, s1, ms1, h2, m2, s2, ms2, position = match.groups()
+            start = ((int(h1) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(ms1)
+            end = ((int(h2) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(ms2)
+            return start, end, position
+
+        match = timing_pattern.match(line)
+        if not match:
+            return None
+
+        try:
+            start = SubtitleLine._fix_time(match.group('start'))
+            end = SubtitleLine._fix_time(match.group('end'))
+            return start, end, match.group('position')
+
+        except ValueError:
+            return None
+
+    def _create_line(self, cue : list):
+        number, start, end, position, text = cue
+        return SubtitleLine.Construct(number, start, end, '\n'.join(text), position)
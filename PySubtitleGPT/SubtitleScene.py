@@ -1,13 +1,27 @@
+import copy
 from os import linesep
 
-from PySubtitleGPT.SubtitleBatch import SubtitleBatch
+from PySubtitleGPT.SubtitleBatch import SubtitleBatch, counter_lock
 
 class SubtitleScene:
+    """
+    A group of batches that are translated in sequence, with a shared summary.
+
+    The scene keeps running totals of the lines, translated lines and errors in its batches,
+    which are passed on to the subtitle file that contains it.
+    """
     def __init__(self, dct = None):
         dct = dct or {}
         self.number = dct.get('scene') or dct.get('number')
         self.context = dct.get('context', {})
         self._batches = dct.get('batches', [])
+        self._batch_index = { batch.number : batch for batch in self._batches }
+        self._parent = None
+        self._linecount = 0
+        self._translatedcount = 0
+        self._errorcount = 0
+        self._completecount = 0
+        self._recount()
 
     def __str__(self) -> str:
         return f"SubtitleScene {self.number} with {self.size} batches and {self.linecount} lines"
@@ -25,11 +39,23 @@ class SubtitleScene:
 
     @property
     def linecount(self):
-        return sum(batch.size for batch in self.batches)
+        return self._linecount
+
+    @property
+    def translatedcount(self):
+        return self._translatedcount
+
+    @property
+    def untranslatedcount(self):
+        return self._linecount - self._translatedcount
+
+    @property
+    def errorcount(self):
+        return self._errorcount
 
     @property
     def all_translated(self):
-        return all(batch.all_translated for batch in self.batches)
+        return self._completecount == len(self._batches)
 
     @property
     def summary(self):
@@ -40,22 +66,41 @@ class SubtitleScene:
         self.AddContext('summary', value)
 
     def GetBatch(self, batch_number) -> SubtitleBatch:
-        for batch in self.batches:
-            if batch.number == batch_number:
-                return batch
+        return self._batch_index.get(batch_number)
 
-        return None
+    def GetBatches(self, batch_numbers : list[int]) -> list[SubtitleBatch]:
+        """
+        Get the batches with the specified numbers, in order, ignoring any that don't exist
+        """
+        batches = [ self._batch_index.get(batch_number) for batch_number in sorted(set(batch_numbers)) ]
+        return [ batch for batch in batches if batch ]
 
     def AddBatch(self, batch):
-        self._batches.append(batch)
+        with counter_lock:
+            self._batches.append(batch)
+            self._batch_index[batch.number] = batch
+            batch._parent = self
+            self._adjust_counts(batch.size, batch.translatedcount, batch.errorcount, 1 if batch.all_translated else 0)
 
     def AddNewBatch(self):
         batch = SubtitleBatch({
             'scene': self.number,
             'number': len(self.batches) + 1
         })
-        self._batches.append(batch)
-        return self._batches[-1]
+        self.AddBatch(batch)
+        return batch
+
+    def Snapshot(self):
+        """
+        A copy of the scene and its batches for saving, which isn't affected by later changes to them
+        """
+        with counter_lock:
+            snapshot = copy.copy(self)
+            snapshot._parent = None
+            snapshot.context = dict(self.context) if self.context else self.context
+            snapshot._batches = [ batch.Snapshot() for batch in self._batches ]
+            snapshot._batch_index = { batch.number : batch for batch in snapshot._batches }
+            return snapshot
 
     def AddContext(self, key, value):
         if not self.context:
@@ -73,7 +118,7 @@ class SubtitleScene:
         self.summary = "\n".join(scene.summary for scene in scenes if scene.summary)
         self._batches = [ batch for scene in scenes for batch in scene.batches ]
 
-        self._renumber_batches() 
+        self.RenumberBatches()
 
     def MergeBatches(self, batch_numbers : list[int]):
         """
@@ -83,24 +128,113 @@ class SubtitleScene:
         if batch_numbers != list(range(batch_numbers[0], batch_numbers[0] + len(batch_numbers))):
             raise ValueError("Batch numbers to be merged are not sequential")
 
-        batches = [ batch for batch in self.batches if batch.number in batch_numbers]
+        batches = self.GetBatches(batch_numbers)
         if len(batches) != len(batch_numbers):
-            raise ValueError(f"Could not find batches {','.join(batch_numbers)} in scene {self.number}")
+            raise ValueError(f"Could not find batches {','.join(str(number) for number in batch_numbers)} in scene {self.number}")
         
         merged_batch = SubtitleBatch()
+        merged_batch.scene = self.number
         merged_batch.number = batches[0].number
         merged_batch.summary = "\n".join(batch.summary for batch in batches if batch.summary)
-        merged_batch.originals = [ line for batch in batches for line in batch.originals ]
-        merged_batch.translated = [ line for batch in batches for line in batch.translated ]
+        if all(batch.line_range for batch in batches):
+            # The batches are sequential ranges of the same lines
+            merged_batch.Bind(batches[0]._lines, batches[0].line_range[0], batches[-1].line_range[1])
+        else:
+            merged_batch.originals = [ line for batch in batches for line in batch.originals ]
+
+        merged_batch.translated = [ line for batch in batches for line in batch.translated or [] ]
 
-        start_index = self._batches.index(batches[0])
-        end_index = self._batches.index(batches[-1])
+        start_index = self._batch_position(batches[0])
+        end_index = self._batch_position(batches[-1])
 
         self._batches = self._batches[:start_index] + [merged_batch] + self._batches[end_index+1:]
 
-        self._renumber_batches() 
+        for batch in batches:
+            batch._parent = None
+
+        self.RenumberBatches()
+
+    def SplitBatch(self, batch_number : int, size : int):
+        """
+        Split a batch in the scene after a number of lines, returning the new batch
+        """
+        batch = self.GetBatch(batch_number)
+        if not batch:
+            raise ValueError(f"Could not find batch {batch_number} in scene {self.number}")
+
+        if size < 1 or size >= batch.size:
+            raise ValueError(f"Cannot split batch {batch_number} with {batch.size} lines after {size} lines")
+
+        split_batch = SubtitleBatch({
+            'scene': self.number,
+            'number': batch.number + 1,
+            'context': batch.context.copy()
+        })
+
+        if batch.line_range:
+            first, stop = batch.line_range
+            split_batch.Bind(batch._lines, first + size, stop)
+            batch.Bind(batch._lines, first, first + size)
+        else:
+            split_batch.originals = batch.originals[size:]
+            batch.originals = batch.originals[:size]
+
+        if batch.translated:
+            split_numbers = set(line.number for line in split_batch.originals)
+            split_batch.translated = [ line for line in batch.translated if line.number in split_numbers ]
+            batch.translated = [ line for line in batch.translated if line.number not in split_numbers ]
+
+        index = self._batch_position(batch)
+        self._batches.insert(index + 1, split_batch)
 
-    def _renumber_batches(self):
+        self.RenumberBatches()
+
+        return split_batch
+
+    def RenumberBatches(self):
+        """
+        Number the batches sequentially and rebuild the batch index and totals
+        """
         for number, batch in enumerate(self._batches, start = 1):
             batch.number = number
+            batch.scene = self.number
+
+        self._batch_index = { batch.number : batch for batch in self._batches }
+        self._recount()
+
+    def _adjust_counts(self, lines : int = 0, translated : int = 0, errors : int = 0, completed : int = 0):
+        """
+        Update the totals when a batch changes, and pass the change on to the subtitle file. The counter lock must be held.
+        """
+        self._linecount += lines
+        self._translatedcount += translated
+        self._errorcount += errors
+        self._completecount += completed
+
+        if self._parent and (lines or translated or errors):
+            self._parent._adjust_counts(lines, translated, errors)
+
+    def _recount(self):
+        """
+        Recalculate the totals from the batches, after batches have been added, merged or split
+        """
+        with counter_lock:
+            for batch in self._batches:
+                batch._parent = self
+
+            self._adjust_counts(
+                sum(batch.size for batch in self._batches) - self._linecount,
+                sum(batch.translatedcount for batch in self._batches) - self._translatedcount,
+                sum(batch.errorcount for batch in self._batches) - self._errorcount,
+                sum(1 for batch in self._batches if batch.all_translated) - self._completecount
+            )
+
+    def _batch_position(self, batch : SubtitleBatch):
+        """
+        Position of the batch in the list, which matches its number unless the scene hasn't been renumbered
+        """
+        position = batch.number - 1
+        if 0 <= position < len(self._batches) and self._batches[position] is batch:
+            return position
+        return self._batches.index(batch)
 
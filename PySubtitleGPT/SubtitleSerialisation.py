@@ -16,6 +16,13 @@ def classname(obj):
 
 # Convert our custom types to JSON
 class SubtitleEncoder(json.JSONEncoder):
+    def __init__(self, *args, strings = None, line_blocks = False, **kwargs):
+        # Repeated strings in prompts are replaced with references to a string table if one is provided
+        self.strings = strings
+        # Lines are stored as SRT blocks if line_blocks is set, so that earlier versions can read the project
+        self.line_blocks = line_blocks
+        super().__init__(*args, **kwargs)
+
     def default(self, obj):
         if isinstance(obj, TranslationError):
             # Don't bother trying to serialise all the error types (why not?)
@@ -64,17 +71,26 @@ class SubtitleEncoder(json.JSONEncoder):
                 "all_translated": obj.all_translated,
                 "errors": obj.errors if obj.errors else None,
                 "summary": getattr(obj, 'summary'),
-                "originals": obj._originals,
-                "translated": obj._translated,
-                "context": {
-                    "summary": obj.context.get('summary')
-                },
+                "originals": obj.originals,
+                "translated": obj.translated,
+                "context": _batch_context(obj),
                 "translation": obj.translation
             }
         elif isinstance(obj, SubtitleLine):
+            if self.line_blocks:
+                return {
+                    "line": obj.line,
+                    "translation": obj.translation,
+                }
+
+            # Lines are stored as separate fields so they can be restored without parsing them
             return {
-                "line": obj.line,
-                "translation": getattr(obj, 'translation'),
+                "number": obj.number,
+                "start": obj.start_ms,
+                "end": obj.end_ms,
+                "text": obj._text,
+                "position": obj.position or None,
+                "translation": obj.translation,
             }
         elif isinstance(obj, ChatGPTTranslation):
             return {
@@ -90,59 +106,101 @@ class SubtitleEncoder(json.JSONEncoder):
                 "prompt": obj.prompt,
             }
         elif isinstance(obj, ChatGPTPrompt):
+            if self.strings is None:
+                return {
+                    "instructions": obj.instructions,
+                    "messages": obj.messages
+                }
+
             return {
-                "instructions": obj.instructions,
-                "messages": obj.messages
+                "instructions": self.strings.Reference(obj.instructions),
+                "messages": [ self._message(message) for message in obj.messages ] if obj.messages else obj.messages
             }
 
         return super().default(obj)
 
+    def _message(self, message):
+        if isinstance(message, dict) and 'content' in message:
+            return { **message, 'content': self.strings.Reference(message['content']) }
+        return message
+
 # Reconstruct our custom types from JSON
 class SubtitleDecoder(json.JSONDecoder):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, strings = None, **kwargs):
+        # References to a string table are resolved if one is provided
+        self.strings = strings
         super().__init__(object_hook=self.object_hook, *args, **kwargs)
 
     def object_hook(self, dct):
-        if '_class' in dct:
-            class_name = dct.pop('_class')
-            if class_name == classname(SubtitleFile):
-                obj = SubtitleFile(dct.get('filename'))
-                obj.context = dct.get('context')
-                obj.scenes = dct.get('scenes', [])
-                return obj
-            elif class_name == classname(SubtitleScene):
-                obj = SubtitleScene(dct)
-                return obj
-            elif class_name == classname(SubtitleBatch):
-                return SubtitleBatch(dct)
-            elif class_name == classname(SubtitleLine) or class_name == "Subtitle": # TEMP backward compatibility
-                return SubtitleLine(dct['line'], dct.get('translation'))
-            elif class_name == classname(ChatGPTTranslation):
-                response = {
-                    'text' : dct.get('text'),
-                    'finish_reason' : dct.get('finish_reason'),
-                    'response_time' : dct.get('response_time'),
-                    'prompt_tokens' : dct.get('prompt_tokens'),
-                    'completion_tokens' : dct.get('completion_tokens'),
-                    'total_tokens' : dct.get('total_tokens'),
-                    }
-                
-                if isinstance(response['text'], list):
-                    # This shouldn't happen, but try to recover if it does
-                    response['text'] = '\n'.join(response['text'])
-
-                obj = ChatGPTTranslation(response, dct.get('prompt'))
-                obj.summary = dct.get('summary', None)
-                obj.synopsis = dct.get('synopsis', None)
-                obj.characters = dct.get('characters', None)
-                return obj
-            elif class_name == classname(ChatGPTPrompt):
-                obj = ChatGPTPrompt(dct.get('instructions'))
-                obj.user_prompt = dct.get('user_prompt')
-                obj.messages = dct.get('messages')
-                return obj
-            elif class_name == classname(TranslationError):
-                return TranslationError(dct.get('message'))
-            
+        class_name = dct.pop('_class', None)
+        if class_name is not None:
+            decoder = _decoders.get(class_name)
+            return decoder(dct) if decoder else dct
+
+        if self.strings is not None and '$string' in dct and len(dct) == 1:
+            return self.strings.Resolve(dct['$string'])
+
         return dct
 
+def _decode_file(dct):
+    obj = SubtitleFile(dct.get('filename'))
+    obj.context = dct.get('context')
+    obj.scenes = dct.get('scenes', [])
+    return obj
+
+def _decode_line(dct):
+    if 'line' in dct:
+        # Earlier project files store each line as an SRT block
+        return SubtitleLine(dct['line'], dct.get('translation'))
+
+    return SubtitleLine.FromFields(dct.get('number'), dct['start'], dct['end'], dct.get('text') or '', dct.get('position') or '', dct.get('translation'))
+
+def _decode_translation(dct):
+    response = {
+        'text' : dct.get('text'),
+        'finish_reason' : dct.get('finish_reason'),
+        'response_time' : dct.get('response_time'),
+        'prompt_tokens' : dct.get('prompt_tokens'),
+        'completion_tokens' : dct.get('completion_tokens'),
+        'total_tokens' : dct.get('total_tokens'),
+        }
+
+    if isinstance(response['text'], list):
+        # This shouldn't happen, but try to recover if it does
+        response['text'] = '\n'.join(response['text'])
+
+    obj = ChatGPTTranslation(response, dct.get('prompt'))
+    obj.summary = dct.get('summary', None)
+    obj.synopsis = dct.get('synopsis', None)
+    obj.characters = dct.get('characters', None)
+    return obj
+
+def _decode_prompt(dct):
+    obj = ChatGPTPrompt(dct.get('instructions'))
+    obj.user_prompt = dct.get('user_prompt')
+    obj.messages = dct.get('messages')
+    return obj
+
+# How to reconstruct each class, by the name stored with it
+_decoders = {
+    classname(SubtitleFile): _decode_file,
+    classname(SubtitleScene): SubtitleScene,
+    classname(SubtitleBatch): SubtitleBatch,
+    classname(SubtitleLine): _decode_line,
+    "Subtitle": _decode_line,   # TEMP backward compatibility
+    classname(ChatGPTTranslation): _decode_translation,
+    classname(ChatGPTPrompt): _decode_prompt,
+    classname(TranslationError): lambda dct: TranslationError(dct.get('message')),
+}
+
+def _batch_context(batch : SubtitleBatch):
+    """
+    The batch context to persist, leaving out optional fields that were never set
+    """
+    context = { "summary": batch.context.get('summary') }
+
+    for key in [ 'batch_mode', 'reviewed_lines', 'remembered_lines', 'fuzzy_matches' ]:
+        if batch.context.get(key):
+            context[key] = batch.context[key]
+
+    return context
@@ -1,18 +1,23 @@
 import logging
 import openai
 from os import linesep
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PySubtitleGPT.AdaptiveBatchSizer import AdaptiveBatchSizer
 from PySubtitleGPT.ChatGPTClient import ChatGPTClient
 from PySubtitleGPT.ChatGPTTranslation import ChatGPTTranslation
 from PySubtitleGPT.ChatGPTTranslationParser import ChatGPTTranslationParser
 from PySubtitleGPT.Options import Options
+from PySubtitleGPT.ResponseCache import GetResponseCache
 from PySubtitleGPT.SubtitleBatch import SubtitleBatch
 from PySubtitleGPT.SubtitleBatcher import SubtitleBatcher
 
-from PySubtitleGPT.SubtitleError import TranslationError, TranslationFailedError, TranslationImpossibleError, UntranslatedLinesError
-from PySubtitleGPT.Helpers import BuildPrompt, Linearise, MergeTranslations, ParseSubstitutions, UnbatchScenes
+from PySubtitleGPT.SubtitleError import LineTooLongError, TooManyNewlinesError, TranslationError, TranslationFailedError, TranslationImpossibleError, UntranslatedLinesError
+from PySubtitleGPT.Helpers import BuildPrompt, Linearise, MergeTranslations, ParseSubstitutions
 from PySubtitleGPT.SubtitleFile import SubtitleFile
+from PySubtitleGPT.SubtitleLine import SubtitleLine
 from PySubtitleGPT.SubtitleScene import SubtitleScene
 from PySubtitleGPT.TranslationEvents import TranslationEvents
+from PySubtitleGPT.TranslationMemory import TranslationMemory
 
 class SubtitleTranslator:
     """
@@ -35,6 +40,7 @@ class SubtitleTranslator:
         self.subtitles = subtitles
         self.options = options
         self.events = TranslationEvents()
+        self.aborted = False
 
         if not options.get('reparse') or not options.get('prompt'):
             options.add('prompt', BuildPrompt(options))
@@ -47,12 +53,48 @@ class SubtitleTranslator:
         context_values = [f"{key}: {Linearise(value)}" for key, value in self.context.items()]
         logging.debug(f"Translation context:\n{linesep.join(context_values)}")
 
+        # Tune the batch size from the responses, starting from the last tuned size for the project
+        if options.get('adaptive_batch_size'):
+            max_batch_size = options.get('max_batch_size')
+            self.batch_sizer = AdaptiveBatchSizer(options.get('tuned_batch_size') or max_batch_size, options.get('min_batch_size'), max_batch_size * 2)
+        else:
+            self.batch_sizer = None
+
+        # Fill in repeated lines from translations earlier in the file
+        if options.get('translation_memory'):
+            self.memory = TranslationMemory()
+            for scene in subtitles.scenes or []:
+                for batch in scene.batches:
+                    self.memory.AddBatch(batch)
+        else:
+            self.memory = None
 
     def TranslateSubtitles(self):
         """
         Translate a SubtitleFile
         """
         options : Options = self.options
+
+        jobs = self.PrepareScenes()
+
+        max_threads = options.get('max_threads') or 1
+
+        if max_threads > 1 and len(jobs) > 1:
+            self.TranslateScenesInParallel(jobs, max_threads)
+        else:
+            for scene, batch_numbers, scene_lines in jobs:
+                logging.debug(f"Translating scene {scene.number} of {self.subtitles.scenecount}")
+                self.TranslateScene(scene, batch_numbers=batch_numbers, remaining_lines=scene_lines)
+
+        self.FinaliseTranslation()
+
+    def PrepareScenes(self):
+        """
+        Batch the subtitles if necessary and work out which scenes need translating.
+
+        Returns a list of (scene, batch_numbers, remaining_lines) tuples, dividing any max_lines budget between the scenes in order.
+        """
+        options : Options = self.options
         subtitles : SubtitleFile = self.subtitles 
 
         if not subtitles:
@@ -77,16 +119,15 @@ class SubtitleTranslator:
         max_lines = options.get('max_lines')
         remaining_lines = max_lines
 
-        # Iterate over each subtitle scene and request translation
+        jobs = []
         for scene in subtitles.scenes:
             if options.get('resume') and scene.all_translated:
                     logging.info(f"Scene {scene.number} already translated {scene.linecount} lines...")
                     continue
 
-            logging.debug(f"Translating scene {scene.number} of {subtitles.scenecount}")
             batch_numbers = [ batch.number for batch in scene.batches if not batch.translated ] if options.get('resume') else None
 
-            self.TranslateScene(scene, batch_numbers=batch_numbers, remaining_lines=remaining_lines)
+            jobs.append((scene, batch_numbers, remaining_lines))
 
             if remaining_lines:
                 remaining_lines = max(0, remaining_lines - scene.linecount)
@@ -94,8 +135,19 @@ class SubtitleTranslator:
                     logging.info(f"Reached max_lines limit of ({max_lines} lines)... finishing")
                     break
 
+        return jobs
+
+    def FinaliseTranslation(self):
+        """
+        Reassemble the translated scenes into a sequential list of subtitles
+        """
+        subtitles : SubtitleFile = self.subtitles
+        max_lines = self.options.get('max_lines')
+
         # Linearise the translated scenes
-        originals, translations, untranslated = UnbatchScenes(subtitles.scenes)
+        with subtitles.lock:
+            translations = subtitles.CollectTranslated()
+            untranslated = [ line for line in subtitles.originals if not line.translation ]
 
         if translations and not max_lines:
             logging.info(f"Successfully translated {len(translations)} lines!")
@@ -105,28 +157,57 @@ class SubtitleTranslator:
             for line in untranslated:
                 logging.info(f"Untranslated > {line.number}. {line.text}")
 
-        subtitles.originals = originals
         subtitles.translated = translations
 
+        if self.batch_sizer:
+            self.RecordTunedBatchSize()
+
+        if self.memory:
+            logging.info(self.memory.GetReport())
+
+        cache = GetResponseCache(self.options)
+        if cache:
+            logging.info(f"Response cache: {cache.hits} hits, {cache.misses} misses")
+
+    def TranslateScenesInParallel(self, jobs : list, max_threads : int):
+        """
+        Translate independent scenes concurrently, using up to max_threads worker threads.
+
+        Each job is a (scene, batch_numbers, remaining_lines) tuple. Scenes build their own context chain,
+        so they can be translated in any order and reassembled afterwards.
+        """
+        logging.info(f"Translating {len(jobs)} scenes with up to {max_threads} threads")
+
+        with ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="SubtitleTranslator") as executor:
+            futures = [ executor.submit(self.TranslateScene, scene, batch_numbers, remaining_lines) for scene, batch_numbers, remaining_lines in jobs ]
+
+            try:
+                for future in as_completed(futures):
+                    future.result()
+
+            except Exception:
+                # Abandon any scenes that haven't started and stop the others after their current batch
+                self.aborted = True
+                for future in futures:
+                    future.cancel()
+                raise
+
     def TranslateScene(self, scene : SubtitleScene, batch_numbers = None, remaining_lines=None):
         """
         Present a scene to ChatGPT for translation
         """
         options : Options = self.options
-        
-        if not scene.context:
-            scene.context = self.context.copy()
-        else:
-            scene.context = {**scene.context, **self.context}
 
         try:
-            if batch_numbers:
-                batches = [ batch for batch in scene.batches if batch.number in batch_numbers ]
-            else:
-                batches = scene.batches
+            batches = self._get_scene_batches(scene, batch_numbers)
 
             context = scene.context.copy()
-            self.TranslateBatches(batches, context, remaining_lines)
+
+            if options.get('batch_mode') == "parallel":
+                self.TranslateBatchesInParallel(batches, context, remaining_lines)
+            else:
+                self.TranslateBatches(batches, context, remaining_lines)
+
             scene.summary = context['summary'] or scene.summary
 
             # Notify observers the scene was translated
@@ -151,84 +232,171 @@ class SubtitleTranslator:
         # Initialise the ChatGPT client
         client = ChatGPTClient(options, context.get('instructions'))
 
-        prompt = options.get('prompt')
+        # Batches may be split or merged as they are translated
+        pending = list(batches)
+
+        while pending:
+            batch = pending.pop(0)
+
+            if self.aborted:
+                logging.info(f"Translation aborted, skipping remaining batches in scene {batch.scene}")
+                break
 
-        for batch in batches:
             if options.get('resume') and batch.all_translated:
                 logging.info(f"Scene {batch.scene} batch {batch.number} already translated {batch.size} lines...")
                 summaries = self.AddBatchToContext(context, batch, summaries)
                 continue
 
-            if batch.context and (options.get('retranslate') or options.get('reparse')):
-                # If it's a retranslation, restore context from the batch
-                context = {**context, **batch.context}
+            if options.get('preview'):
+                self.events.batch_translated(batch)
+                continue
 
-            # Apply any substitutions to the input
-            replacements = batch.PerformInputSubstitutions(substitutions)
+            if self.batch_sizer:
+                batch = self._fit_batch_size(batch, pending)
 
-            # Filter out empty lines
-            originals = [line for line in batch.originals if line.text.strip()]
+            context, originals = self._prepare_batch(batch, context, substitutions, remaining_lines)
 
-            if remaining_lines and len(originals) > remaining_lines:
-                logging.info("Truncating batch to remain within max_lines")
-                originals = originals[:remaining_lines]
+            if not self.TranslateBatch(batch, originals, context, client):
+                # The batch was too large, try again once it has been split
+                pending.insert(0, batch)
+                continue
 
-            try:
-                if  options.get('reparse') and batch.translation:
-                    logging.info(f"Reparsing scene {batch.scene} batch {batch.number} with {len(originals)} lines...")
-                    translation = batch.translation
-                else:
-                    logging.debug(f"Translating scene {batch.scene} batch {batch.number} with {len(originals)} lines...")
-
-                    if replacements:
-                        replaced = [f"{Linearise(k)} -> {Linearise(v)}" for k,v in replacements.items()]
-                        logging.info(f"Made substitutions in input:\n{linesep.join(replaced)}")
-
-                    if options.get('preview'):
-                        self.events.batch_translated(batch)
-                        continue
+            if remaining_lines:
+                remaining_lines = max(0, remaining_lines - len(originals))
+                if not remaining_lines:
+                    break
+
+            summaries = self.AddBatchToContext(context, batch, summaries)
+
+            # Notify observers the batch was translated
+            self.events.batch_translated(batch)
+
+    def TranslateBatchesInParallel(self, batches : list[SubtitleBatch], context : dict, remaining_lines=None):
+        """
+        Pass all the batches in a scene to ChatGPT at the same time, with only the scene-level context.
+
+        Batch summaries are collected afterwards, and can be used to review the translations for consistency.
+        """
+        options : Options = self.options
+
+        substitutions = ParseSubstitutions(context.get('substitutions', {}))
+
+        client = ChatGPTClient(options, context.get('instructions'))
+
+        max_threads = options.get('max_threads') or 1
+
+        jobs = self._prepare_parallel_batches(batches, context, substitutions, remaining_lines)
+
+        translated_batches = []
+
+        while jobs and not self.aborted:
+            split_batches = self._translate_parallel_jobs(jobs, client, max_threads)
+
+            translated_batches.extend(batch for batch, _, _ in jobs if batch not in split_batches)
+
+            # Only the lines that haven't been translated yet are left for the batches that were split
+            remaining_lines = self._remaining_lines_after(jobs, split_batches, remaining_lines)
+            if remaining_lines == 0:
+                break
+
+            # Translate any batches that were too large again once they have been split
+            jobs = self._prepare_parallel_batches(split_batches, context, substitutions, remaining_lines)
+
+        translated_batches.sort(key=lambda batch: batch.number)
+
+        summaries = self._collect_summaries(translated_batches, context)
+
+        if options.get('consistency_pass') and summaries and not self.aborted:
+            logging.info(f"Reviewing {len(translated_batches)} batches for consistency with the scene")
+
+            with ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="SubtitleTranslator") as executor:
+                futures = { executor.submit(self.ReviewBatch, batch, summaries, client) : batch for batch in translated_batches }
+
+                for future in as_completed(futures):
+                    future.result()
 
-                    # Ask OpenAI to do the translation
-                    translation : ChatGPTTranslation = client.RequestTranslation(prompt, originals, context)
+    def TranslateBatch(self, batch : SubtitleBatch, originals : list, context : dict, client : ChatGPTClient):
+        """
+        Request a translation for the lines in a batch and process the response.
+
+        Returns False if the batch was too large and should be split before trying again.
+        """
+        options : Options = self.options
+
+        if self.aborted:
+            return True
+
+        if not originals and self.memory:
+            # Every line was filled from the translation memory
+            self._fill_from_memory(batch, batch.untranslated)
+            return True
+
+        try:
+            if  options.get('reparse') and batch.translation:
+                logging.info(f"Reparsing scene {batch.scene} batch {batch.number} with {len(originals)} lines...")
+                translation = batch.translation
+            else:
+                logging.debug(f"Translating scene {batch.scene} batch {batch.number} with {len(originals)} lines...")
 
-                    if translation.quota_reached:
-                        raise TranslationImpossibleError("OpenAI account quota reached, please upgrade your plan or wait until it renews")
+                prompt = options.get('prompt')
 
-                    if translation.quota_reached:
-                        raise TranslationImpossibleError("OpenAI account quota reached, please upgrade your plan or wait until it renews")
+                # Ask OpenAI to do the translation
+                # Report each line as it arrives if the response is streamed
+                line_callback = lambda line: self.events.line_translated(batch, line)
+
+                translation : ChatGPTTranslation = client.RequestTranslation(prompt, originals, context, line_callback)
+
+                if self._should_split_batch(batch, translation, len(originals)):
+                    return False
+
+                if self._should_retry_without_context(translation):
+                    translation = client.RequestTranslation(prompt, originals, None)
 
                     if translation.reached_token_limit:
-                        # Try again without the context to keep the tokens down
-                        logging.warning("Hit API token limit, retrying batch without context...")
-                        translation = client.RequestTranslation(prompt, originals, None)
+                        raise TranslationError(f"Too many tokens in translation", translation)
 
-                        if translation.reached_token_limit:
-                            raise TranslationError(f"Too many tokens in translation", translation)
+            if translation:
+                batch.translation = translation
 
-                if translation:
-                    batch.translation = translation
+                # Process the response
+                self.ProcessTranslation(batch, context, client)
 
-                    # Process the response
-                    self.ProcessTranslation(batch, context, client)
+            else:
+                logging.warning(f"No translation for scene {batch.scene} batch {batch.number}")
 
-                else:
-                    logging.warning(f"No translation for scene {batch.scene} batch {batch.number}")
+        except TranslationError as e:
+            self._handle_batch_error(batch, e)
 
-            except TranslationError as e:
-                if options.get('stop_on_error') or isinstance(e, TranslationImpossibleError):
-                    raise TranslationFailedError(f"Failed to translate a batch... terminating", batch.translation, e)
-                else:
-                    logging.warning(f"Error translating batch: {str(e)}")
+        return True
 
-            if remaining_lines:
-                remaining_lines = max(0, remaining_lines - len(originals))
-                if not remaining_lines:
-                    break
+    def ReviewBatch(self, batch : SubtitleBatch, summaries : list[str], client : ChatGPTClient):
+        """
+        Ask ChatGPT to correct any lines that are inconsistent with the rest of the scene
+        """
+        if self.aborted or not batch.translation or not batch.translation.has_translation:
+            return
 
-            summaries = self.AddBatchToContext(context, batch, summaries)
+        try:
+            response = client.RequestReview(batch.translation, summaries)
 
-            # Notify observers the batch was translated
-            self.events.batch_translated(batch)
+            self._process_review(batch, response)
+
+        except TranslationError as e:
+            logging.warning(f"Unable to review scene {batch.scene} batch {batch.number}: {str(e)}")
+
+    def RecordTunedBatchSize(self):
+        """
+        Store the tuned batch size in the project, so that the next run can start from it
+        """
+        batch_size = self.batch_sizer.batch_size
+        for previous_size, new_size, reason in self.batch_sizer.adjustments:
+            logging.debug(f"Batch size {previous_size} -> {new_size}: {reason}")
+
+        self.options.add('tuned_batch_size', batch_size)
+
+        with self.subtitles.lock:
+            if self.subtitles.context is not None:
+                self.subtitles.context['tuned_batch_size'] = batch_size
 
     def AddBatchToContext(self, context, batch : SubtitleBatch, summaries : list = None):
         """
@@ -252,7 +420,6 @@ class SubtitleTranslator:
         Attempt to extract translation from the API response
         """
         options : Options = self.options
-        substitutions = options.get('substitutions')
 
         translation : ChatGPTTranslation = batch.translation
 
@@ -262,98 +429,475 @@ class SubtitleTranslator:
         logging.debug(f"Scene {batch.scene} batch {batch.number} translation:\n{translation.text}\n")
 
         try:
-            # Apply the translation to the subtitles
-            parser = ChatGPTTranslationParser(options)
-            
-            # Reset error list, hopefully they're obsolete
-            batch.errors = []
+            self._parse_translation(batch, translation)
+
+            # Consider retrying if there were errors
+            if batch.errors and options.get('allow_retranslations'):
+                logging.warn(f"Scene {batch.scene} batch {batch.number} failed validation, requesting retranslation")
+                self.RequestRetranslations(client, batch, translation)
+
+            self._apply_translation(batch, translation, context)
+
+            if self.memory:
+                self.memory.AddBatch(batch)
+
+        except TranslationError as te:
+            if options.get('stop_on_error'):
+                raise
+            else:
+                logging.warning(f"Error translating batch: {str(te)}")
+
+    def RequestRetranslations(self, client : ChatGPTClient, batch : SubtitleBatch, translation : str):
+        """
+        Ask ChatGPT to retranslate any missing lines
+        """
+        if self.options.get('targeted_retranslation'):
+            lines, context_lines = self._get_retranslation_lines(batch)
+            if lines:
+                logging.info(f"Requesting retranslation of {len(lines)} lines in scene {batch.scene} batch {batch.number}")
+                retranslation = client.RequestLineRetranslation(self.options.get('prompt'), lines, context_lines, batch.errors)
+                self._process_retranslation(batch, retranslation, lines)
+                return
+
+        retranslation = client.RequestRetranslation(translation, batch.errors)
+
+        self._process_retranslation(batch, retranslation)
+
+    def _get_scene_batches(self, scene : SubtitleScene, batch_numbers = None):
+        """
+        Merge the translation context into the scene and select the batches to translate
+        """
+        if not scene.context:
+            scene.context = self.context.copy()
+        else:
+            scene.context = {**scene.context, **self.context}
+
+        if batch_numbers:
+            return scene.GetBatches(batch_numbers)
+
+        return scene.batches
+
+    def _prepare_batch(self, batch : SubtitleBatch, context : dict, substitutions : dict, remaining_lines = None):
+        """
+        Apply input substitutions to a batch and select the lines to be translated.
+
+        Returns the (possibly updated) context and the list of lines to translate.
+        """
+        options : Options = self.options
+
+        if batch.context and (options.get('retranslate') or options.get('reparse')):
+            # If it's a retranslation, restore context from the batch
+            context = {**context, **batch.context}
+
+        # Apply any substitutions to the input
+        replacements = batch.PerformInputSubstitutions(substitutions)
+
+        if replacements:
+            replaced = [f"{Linearise(k)} -> {Linearise(v)}" for k,v in replacements.items()]
+            logging.info(f"Made substitutions in input:\n{linesep.join(replaced)}")
+
+        # Filter out empty lines
+        originals = [line for line in batch.originals if line.text.strip()]
+
+        if remaining_lines and len(originals) > remaining_lines:
+            logging.info("Truncating batch to remain within max_lines")
+            originals = originals[:remaining_lines]
+
+        if self.memory and options.get('exclude_remembered_lines'):
+            # Lines with a remembered translation are filled in when the response is processed
+            originals = self.memory.ExcludeLines(originals)
+
+        return context, originals
+
+    def _prepare_parallel_batches(self, batches : list[SubtitleBatch], context : dict, substitutions : dict, remaining_lines = None):
+        """
+        Select the batches to translate in parallel, each with its own copy of the scene context.
+
+        Returns a list of (batch, originals, context) tuples.
+        """
+        options : Options = self.options
+
+        jobs = []
+        pending = list(batches)
+
+        while pending:
+            batch = pending.pop(0)
+
+            if options.get('resume') and batch.all_translated:
+                logging.info(f"Scene {batch.scene} batch {batch.number} already translated {batch.size} lines...")
+                continue
+
+            if options.get('preview'):
+                self.events.batch_translated(batch)
+                continue
+
+            if self.batch_sizer:
+                batch = self._fit_batch_size(batch, pending)
+
+            batch_context, originals = self._prepare_batch(batch, context.copy(), substitutions, remaining_lines)
+            batch.AddContext('batch_mode', "parallel")
+
+            jobs.append((batch, originals, batch_context))
+
+            if remaining_lines:
+                remaining_lines = max(0, remaining_lines - len(originals))
+                if not remaining_lines:
+                    break
+
+        return jobs
+
+    def _translate_parallel_jobs(self, jobs : list, client : ChatGPTClient, max_threads : int):
+        """
+        Translate a set of prepared batches concurrently, returning any that need to be split and translated again
+        """
+        split_batches = []
+
+        with ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="SubtitleTranslator") as executor:
+            futures = { executor.submit(self.TranslateBatch, batch, originals, batch_context, client) : batch for batch, originals, batch_context in jobs }
 
             try:
-                parser.ProcessChatGPTResponse(translation)
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    if not future.result():
+                        split_batches.append(batch)
+                        continue
 
-                # Try to match the translations with the original lines
-                batch.translated, unmatched = parser.MatchTranslations(batch.originals)
+                    # Notify observers the batch was translated
+                    self.events.batch_translated(batch)
 
-                if unmatched:
-                    logging.warning(f"Unable to match {len(unmatched)} lines with a source line")
-                    if options.get('enforce_line_parity'):
-                        raise UntranslatedLinesError(f"No translation found for {len(unmatched)} lines", unmatched)
+            except Exception:
+                self.aborted = True
+                for future in futures:
+                    future.cancel()
+                raise
 
-                # Sanity check the results
-                parser.ValidateTranslations()
+        return sorted(split_batches, key=lambda batch: batch.number)
 
-            except TranslationError as e:
-                if not options.get('allow_retranslations'):
-                    raise
-                else:
-                    batch.errors.append(e)
+    def _remaining_lines_after(self, jobs : list, split_batches : list, remaining_lines = None):
+        """
+        Deduct the lines in batches that were translated rather than split from the max_lines budget, if there is one
+        """
+        if not remaining_lines:
+            return None
 
-            # Consider retrying if there were errors
-            if batch.errors and options.get('allow_retranslations'):
-                logging.warn(f"Scene {batch.scene} batch {batch.number} failed validation, requesting retranslation")
-                self.RequestRetranslations(client, batch, translation)
+        translated_lines = sum(len(originals) for batch, originals, _ in jobs if batch not in split_batches)
+        return max(0, remaining_lines - translated_lines)
 
-            if batch.untranslated:
-                batch.AddContext('untranslated_lines', [f"{item.number}. {item.text}" for item in batch.untranslated])
+    def _fit_batch_size(self, batch : SubtitleBatch, pending : list[SubtitleBatch]):
+        """
+        Split a batch that is larger than the tuned batch size, adding the remainder to the pending batches,
+        or merge it with following batches that are untranslated if they would fit.
 
-            # Apply any word/phrase substitutions to the translation 
-            replacements = batch.PerformOutputSubstitutions(substitutions)
+        Returns the batch to translate.
+        """
+        options : Options = self.options
 
-            if replacements:
-                replaced = [f"{k} -> {v}" for k,v in replacements.items()]
-                logging.info(f"Made substitutions in output:\n{linesep.join(replaced)}")
+        if batch.translated or options.get('reparse') or options.get('retranslate'):
+            return batch
+
+        # The change is reported while the lock is held, so that it is recorded in the same order it is made
+        split_size = self.batch_sizer.GetSplitSize(batch.size)
+        if split_size:
+            with self.subtitles.lock:
+                split_batch = self.subtitles.SplitBatch(batch.scene, batch.number, split_size)
+                self.events.batch_split(batch.scene, batch.number, split_size)
+            logging.info(f"Split scene {batch.scene} batch {batch.number} after {split_size} lines")
+            pending.insert(0, split_batch)
+            return batch
+
+        batch_size = self.batch_sizer.batch_size
+        while pending and self._can_merge_batches(batch, pending[0], batch_size):
+            next_batch = pending.pop(0)
+            with self.subtitles.lock:
+                self.subtitles.MergeBatches(batch.scene, [batch.number, next_batch.number])
+                self.events.batches_merged(batch.scene, [batch.number, next_batch.number])
+            batch = self.subtitles.GetScene(batch.scene).GetBatch(batch.number)
+            logging.info(f"Merged scene {batch.scene} batch {batch.number} with the following batch, {batch.size} lines")
+
+        return batch
+
+    def _can_merge_batches(self, batch : SubtitleBatch, next_batch : SubtitleBatch, batch_size : int):
+        return next_batch.scene == batch.scene and next_batch.number == batch.number + 1 \
+            and not next_batch.translated and not next_batch.translation \
+            and batch.size + next_batch.size <= batch_size
+
+    def _should_split_batch(self, batch : SubtitleBatch, translation : ChatGPTTranslation, line_count : int):
+        """
+        Update the batch sizer with the response, and check whether the batch should be split and translated again
+        """
+        if not self.batch_sizer or not translation:
+            return False
 
-            # Perform substitutions on the output
-            translation.PerformSubstitutions(substitutions)
+        self.batch_sizer.AddResponse(translation, line_count)
 
-            # Update the context, unless it's a retranslation pass
-            if not options.get('retranslate'):
-                batch.summary = translation.summary or batch.summary
-                context['summary'] = batch.summary or context.get('summary')
-                context['synopsis'] = translation.synopsis or context.get('synopsis', "") or options.get('synopsis')
-                #context['characters'] = translation.characters or context.get('characters', []) or options.get('characters')
+        if translation.reached_token_limit and self.batch_sizer.GetSplitSize(batch.size):
+            logging.warning(f"Hit API token limit, splitting scene {batch.scene} batch {batch.number}...")
+            return True
 
-            logging.info(f"Scene {batch.scene} batch {batch.number}: {len(batch.translated)} lines and {len(batch.untranslated)} untranslated.")
+        return False
 
-            if batch.summary and batch.summary.strip():
-                logging.info(f"Summary: {batch.summary}")
+    def _collect_summaries(self, batches : list[SubtitleBatch], context : dict):
+        """
+        Update the scene context with the batch summaries after a parallel translation
+        """
+        summaries = [ batch.summary for batch in batches if batch.summary and batch.summary.strip() ]
 
-        except TranslationError as te:
-            if options.get('stop_on_error'):
+        if summaries:
+            context['summary'] = summaries[-1]
+
+        return summaries
+
+    def _should_retry_without_context(self, translation : ChatGPTTranslation):
+        """
+        Check the response for fatal errors, and whether the request should be retried without context
+        """
+        if translation.quota_reached:
+            raise TranslationImpossibleError("OpenAI account quota reached, please upgrade your plan or wait until it renews", translation)
+
+        if translation.reached_token_limit:
+            # Try again without the context to keep the tokens down
+            logging.warning("Hit API token limit, retrying batch without context...")
+            return True
+
+        return False
+
+    def _handle_batch_error(self, batch : SubtitleBatch, error : TranslationError):
+        """
+        Stop the translation or log the error and carry on, depending on options
+        """
+        if self.options.get('stop_on_error') or isinstance(error, TranslationImpossibleError):
+            raise TranslationFailedError(f"Failed to translate a batch... terminating", batch.translation, error)
+        else:
+            logging.warning(f"Error translating batch: {str(error)}")
+
+    def _parse_translation(self, batch : SubtitleBatch, translation : ChatGPTTranslation):
+        """
+        Extract translated lines from the response and match them with the batch originals.
+
+        Validation errors are added to the batch if retranslations are allowed, otherwise raised.
+        """
+        options : Options = self.options
+
+        # Apply the translation to the subtitles
+        parser = ChatGPTTranslationParser(options)
+        
+        # Reset error list, hopefully they're obsolete
+        batch.errors = []
+
+        try:
+            parser.ProcessChatGPTResponse(translation)
+
+            # Try to match the translations with the original lines
+            batch.translated, unmatched = parser.MatchTranslations(batch.originals)
+
+            if parser.fuzzy_matches:
+                batch.AddContext('fuzzy_matches', [f"{item.number}. {confidence:.0%}" for item, confidence in parser.fuzzy_matches])
+            else:
+                batch.context.pop('fuzzy_matches', None)
+
+            if unmatched and self.memory:
+                unmatched = self._fill_from_memory(batch, unmatched)
+
+            if unmatched:
+                logging.warning(f"Unable to match {len(unmatched)} lines with a source line")
+                if options.get('enforce_line_parity'):
+                    raise UntranslatedLinesError(f"No translation found for {len(unmatched)} lines", unmatched)
+
+            # Sanity check the results
+            parser.ValidateTranslations()
+
+        except TranslationError as e:
+            if not options.get('allow_retranslations'):
                 raise
             else:
-                logging.warning(f"Error translating batch: {str(e)}")
+                batch.AddError(e)
 
+    def _apply_translation(self, batch : SubtitleBatch, translation : ChatGPTTranslation, context : dict):
+        """
+        Apply output substitutions and update the batch and context with the results of the translation
+        """
+        options : Options = self.options
+        substitutions = options.get('substitutions')
 
-    def RequestRetranslations(self, client : ChatGPTClient, batch : SubtitleBatch, translation : str):
+        if batch.untranslatedcount:
+            batch.AddContext('untranslated_lines', [f"{item.number}. {item.text}" for item in batch.untranslated])
+
+        # Apply any word/phrase substitutions to the translation 
+        replacements = batch.PerformOutputSubstitutions(substitutions)
+
+        if replacements:
+            replaced = [f"{k} -> {v}" for k,v in replacements.items()]
+            logging.info(f"Made substitutions in output:\n{linesep.join(replaced)}")
+
+        # Perform substitutions on the output
+        translation.PerformSubstitutions(substitutions)
+
+        # Update the context, unless it's a retranslation pass
+        if not options.get('retranslate'):
+            batch.summary = translation.summary or batch.summary
+            context['summary'] = batch.summary or context.get('summary')
+            context['synopsis'] = translation.synopsis or context.get('synopsis', "") or options.get('synopsis')
+            #context['characters'] = translation.characters or context.get('characters', []) or options.get('characters')
+
+        logging.info(f"Scene {batch.scene} batch {batch.number}: {len(batch.translated)} lines and {batch.untranslatedcount} untranslated ({self.subtitles.progress:.0%} of the file translated).")
+
+        if batch.summary and batch.summary.strip():
+            logging.info(f"Summary: {batch.summary}")
+
+    def _get_retranslation_lines(self, batch : SubtitleBatch):
         """
-        Ask ChatGPT to retranslate any missing lines
+        Find the lines that need to be retranslated, plus some of their neighbours for context.
+
+        Returns (lines, context_lines), both in the order they appear in the batch.
         """
-        retranslation = client.RequestRetranslation(translation, batch.errors)
+        numbers = set(line.number for line in batch.untranslated)
 
-        logging.debug(f"Scene {batch.scene} batch {batch.number} retranslation:\n{retranslation.get('text')}\n")
+        for error in batch.errors:
+            if isinstance(error, (UntranslatedLinesError, LineTooLongError, TooManyNewlinesError)):
+                numbers.update(line.number for line in error.lines if line.number)
+
+        context_size = self.options.get('retranslation_context_lines') or 0
+
+        lines = []
+        context_indexes = set()
+        for index, line in enumerate(batch.originals):
+            if line.number in numbers:
+                lines.append(line)
+                context_indexes.update(range(max(0, index - context_size), index + context_size + 1))
+
+        context_lines = [ line for index, line in enumerate(batch.originals)
+                          if index in context_indexes and line.number not in numbers and line.translation ]
+
+        return lines, context_lines
+
+    def _process_retranslation(self, batch : SubtitleBatch, retranslation : dict, lines : list = None):
+        """
+        Merge the results of a retranslation request into the batch if they pass validation.
+
+        If lines are specified only translations of those lines are used.
+        """
+        logging.debug(f"Scene {batch.scene} batch {batch.number} retranslation:\n{retranslation.get('text') if retranslation else None}\n")
+
+        response = ChatGPTTranslation(retranslation, None)
+        if not response.has_translation:
+            logging.error("Retranslation request did not produce a useful result")
+            return
 
         parser = ChatGPTTranslationParser(self.options)
 
-        retranslated = parser.ProcessChatGPTResponse(retranslation)
+        if not parser.ProcessChatGPTResponse(response):
+            logging.error("Retranslation request did not produce a useful result")
+            return
+
+        originals = { line.number : line for line in (lines or batch.originals) }
+
+        # Match against copies of the lines, so that the batch is only updated if the retranslation passes validation.
+        # Translations with drifted timestamps are matched and retimed to the original line.
+        parser.MatchTranslations([ SubtitleLine(line) for line in originals.values() ])
+
+        retranslated = [ line for line in parser.translated if line.number in originals and line.key == originals[line.number].key ]
 
         if not retranslated:
             logging.error("Retranslation request did not produce a useful result")
             return
-        
-        batch.AddContext('retranslated_lines', [f"{item.key}. {item.text}" for item in retranslated])
-        logging.info(f"Retranslated {len(retranslated)} of {len(retranslated) + len(batch.untranslated)} lines")
+
+        batch.AddContext('retranslated_lines', [f"{item.number}. {item.text}" for item in retranslated])
+        logging.info(f"Retranslated {len(retranslated)} of {len(lines or batch.untranslated)} lines")
 
         try:
+            # Let's NOT assume the results were an improvement
+            parser.translated = retranslated
             parser.ValidateTranslations()
 
             logging.info("Retranslation passed validation")
 
-            # Let's NOT assume the results were an improvement            
-            parser.MatchTranslations(batch.originals)
+            for line in retranslated:
+                originals[line.number].translation = line.text
 
-            MergeTranslations(batch.translated, retranslated)
+            batch.translated = MergeTranslations(batch.translated or [], retranslated)
+
+            batch.errors = self._validate_batch(batch)
 
         except TranslationError as e:
             logging.warn(f"Retranslation request did not fix problems:\n{retranslation.get('text')}\n")
 
+    def _fill_from_memory(self, batch : SubtitleBatch, lines : list):
+        """
+        Translate any of the lines that have a remembered translation, returning the lines that are still untranslated
+        """
+        filled = self.memory.FillLines(lines)
+        if not filled:
+            return lines
+
+        batch.translated = MergeTranslations(batch.translated or [], filled)
+        batch.AddContext('remembered_lines', [f"{item.number}. {item.text}" for item in filled])
+        logging.debug(f"Filled {len(filled)} lines in scene {batch.scene} batch {batch.number} from the translation memory")
+
+        numbers = set(item.number for item in filled)
+        return [ line for line in lines if line.number not in numbers ]
+
+    def _validate_batch(self, batch : SubtitleBatch):
+        """
+        Check the translations in the batch, returning a list of any errors
+        """
+        errors = []
+
+        if batch.untranslatedcount:
+            untranslated = batch.untranslated
+            errors.append(UntranslatedLinesError(f"No translation found for {len(untranslated)} lines", untranslated))
+
+        try:
+            parser = ChatGPTTranslationParser(self.options)
+            parser.translated = batch.translated
+            parser.ValidateTranslations()
+
+        except TranslationError as e:
+            errors.append(e)
+
+        return errors
+
+    def _process_review(self, batch : SubtitleBatch, response : dict):
+        """
+        Apply any corrections from a consistency review to the batch, if they pass validation
+        """
+        review = ChatGPTTranslation(response, None) if response else None
+        if not review or not review.text:
+            logging.info(f"No corrections for scene {batch.scene} batch {batch.number}")
+            return
+
+        logging.debug(f"Scene {batch.scene} batch {batch.number} review:\n{review.text}\n")
+
+        parser = ChatGPTTranslationParser(self.options)
+
+        corrected = parser.ProcessChatGPTResponse(review)
+
+        if not corrected:
+            logging.info(f"No corrections for scene {batch.scene} batch {batch.number}")
+            return
+
+        originals = { line.key : line for line in batch.originals }
+
+        changed = []
+        for line in corrected:
+            original = originals.get(line.key)
+            if original and line.text and original.translation != line.text:
+                line.number = original.number
+                changed.append(line)
+
+        try:
+            parser.translated = changed
+            if changed:
+                parser.ValidateTranslations()
+
+        except TranslationError as e:
+            logging.warning(f"Corrections for scene {batch.scene} batch {batch.number} failed validation ({str(e)}), ignoring them")
+            return
+
+        for line in changed:
+            originals[line.key].translation = line.text
+
+        if changed:
+            batch.translated = MergeTranslations(batch.translated or [], changed)
+            batch.AddContext('reviewed_lines', [f"{line.number}. {line.text}" for line in changed])
+
+        logging.info(f"Scene {batch.scene} batch {batch.number}: corrected {len(changed)} lines for consistency")
@@ -0,0 +1,51 @@
+import logging
+import os
+
+from PySubtitleGPT.Helpers import AtomicWrite
+from PySubtitleGPT.SubtitleLine import SubtitleLine
+
+default_encoding = os.getenv('DEFAULT_ENCODING', 'utf-8')
+
+# Number of lines to format before writing them to the file
+block_size = 1000
+
+class SubtitleWriter:
+    """
+    Writes subtitles to a SubRip file in the same format as pysrt, without building a SubRipFile.
+
+    The lines are formatted and written a block at a time to a temporary file, which replaces the
+    target file once it is complete. Lines cache their formatted text, so saving the same subtitles
+    again only formats the lines that changed since the last save.
+    """
+    def __init__(self, filename : str, encoding : str = None, eol : str = None):
+        self.filename = filename
+        self.encoding = encoding or default_encoding
+        self.eol = eol or os.linesep
+
+    def WriteLines(self, lines : list[SubtitleLine]):
+        """
+        Write the lines to the file, replacing it if it already exists
+        """
+        eol = self.eol
+        count = 0
+
+        with AtomicWrite(self.filename, encoding=self.encoding, newline='') as file:
+            block = []
+            for line in lines:
+                cue = str(line)
+                if eol != '\n':
+                    cue = cue.replace('\n', eol)
+
+                block.append(cue)
+                if not cue.endswith(eol * 2):
+                    block.append(eol)
+
+                count += 1
+                if len(block) >= block_size:
+                    file.write(''.join(block))
+                    block = []
+
+            file.write(''.join(block))
+
+        logging.debug(f"Wrote {count} lines to {self.filename}")
+        return count
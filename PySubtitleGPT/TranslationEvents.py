@@ -1,5 +1,5 @@
 from events import Events
 
 class TranslationEvents(Events):
-    __events__ = ( "preprocessed", "batch_translated", "scene_translated", "translation_complete" )
+    __events__ = ( "preprocessed", "line_translated", "batch_translated", "scene_translated", "translation_complete", "batch_split", "batches_merged" )
 
@@ -0,0 +1,136 @@
+import re
+import threading
+
+from PySubtitleGPT.Helpers import EstimateTokenCount
+from PySubtitleGPT.SubtitleBatch import SubtitleBatch
+from PySubtitleGPT.SubtitleLine import SubtitleLine
+
+tag_pattern = re.compile(r"<[^>]+>")
+whitespace_pattern = re.compile(r"\s+")
+
+class TranslationMemory:
+    """
+    Remembers the translations of lines in a subtitle file, so that lines which are repeated
+    (e.g. "Yes.", "What?", song refrains) can be filled in without asking ChatGPT again.
+
+    Lines are matched exactly first, then by a normalised form that ignores case, formatting tags,
+    whitespace, leading dashes and trailing full stops or commas. It is shared by every scene
+    in a translation, so it can be updated from several threads at once.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.exact = {}
+        self.normalised = {}
+        self.lines_filled = 0
+        self.lines_excluded = 0
+        self.tokens_saved = 0
+
+    def __str__(self) -> str:
+        return f"TranslationMemory: {len(self.exact)} lines, filled {self.lines_filled}"
+
+    @classmethod
+    def Normalise(cls, text : str):
+        """
+        Reduce a line to a form that ignores differences that don't affect the translation
+        """
+        if not text:
+            return None
+
+        text = tag_pattern.sub('', text)
+        text = whitespace_pattern.sub(' ', text).strip().casefold()
+        text = text.lstrip('- ').rstrip('., ')
+        return text or None
+
+    def AddBatch(self, batch : SubtitleBatch):
+        """
+        Remember the translations of the lines in a batch, except any that failed validation.
+        Lines that are already known keep their first translation.
+        """
+        translations = { line.key : line.text for line in batch.translated or [] }
+
+        for error in batch.errors or []:
+            if not getattr(error, 'lines', None):
+                # The problem isn't with specific lines, so none of them can be trusted
+                return
+
+            for line in error.lines:
+                translations.pop(line.key, None)
+
+        with self.lock:
+            for line in batch.originals or []:
+                translation = translations.get(line.key)
+                if not line.text or not translation or translation.startswith('#Fuzzy'):
+                    continue
+
+                self.exact.setdefault(line.text, translation)
+
+                key = self.Normalise(line.text)
+                if key:
+                    self.normalised.setdefault(key, translation)
+
+    def Lookup(self, text : str):
+        """
+        Find a remembered translation for a line, or None if there isn't one
+        """
+        with self.lock:
+            return self._lookup(text)
+
+    def FillLines(self, lines : list[SubtitleLine]):
+        """
+        Set the translation of any lines that have a remembered translation.
+
+        Returns a list of translated lines for the lines that were filled.
+        """
+        filled = []
+        with self.lock:
+            for line in lines:
+                translation = self._lookup(line.text)
+                if translation:
+                    line.translation = translation
+                    filled.append(line.translated)
+
+            self.lines_filled += len(filled)
+
+        return filled
+
+    def ExcludeLines(self, lines : list[SubtitleLine]):
+        """
+        Remove lines with a remembered translation so that they aren't sent for translation.
+
+        Returns the lines that still need to be translated.
+        """
+        remaining = []
+        with self.lock:
+            for line in lines:
+                if self._lookup(line.text):
+                    self.lines_excluded += 1
+                    # The prompt for the line, plus a completion of about the same size
+                    self.tokens_saved += EstimateTokenCount(line.prompt) * 2
+                else:
+                    remaining.append(line)
+
+        return remaining
+
+    def GetReport(self):
+        """
+        Summarise how much work the memory saved
+        """
+        with self.lock:
+            report = f"Translation memory filled {self.lines_filled} lines from {len(self.exact)} remembered lines"
+            if self.lines_excluded:
+                report += f", leaving {self.lines_excluded} lines out of prompts (about {self.tokens_saved} tokens saved)"
+            return report
+
+    def _lookup(self, text : str):
+        """
+        Exact match first, then normalised. The lock must be held.
+        """
+        if not text:
+            return None
+
+        translation = self.exact.get(text)
+        if translation:
+            return translation
+
+        key = self.Normalise(text)
+        return self.normalised.get(key) if key else None
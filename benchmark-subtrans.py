@@ -0,0 +1,601 @@
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pysrt
+from pysrt import SubRipItem, SubRipTime
+
+from PySubtitleGPT.ChatGPTPrompt import ChatGPTPrompt
+from PySubtitleGPT.ChatGPTTranslation import ChatGPTTranslation
+from PySubtitleGPT.ChatGPTTranslationParser import ChatGPTTranslationParser
+from PySubtitleGPT.Helpers import MergeTranslations
+from PySubtitleGPT.IndexedProjectFile import IndexedProjectFile
+from PySubtitleGPT.Options import Options
+from PySubtitleGPT.SubtitleFile import SubtitleFile
+from PySubtitleGPT.SubtitleLine import SubtitleLine
+from PySubtitleGPT.SubtitleProject import SubtitleProject
+from PySubtitleGPT.SubtitleReader import SubtitleReader
+from PySubtitleGPT.StringTable import StringTable
+from PySubtitleGPT.SubtitleSerialisation import SubtitleDecoder, SubtitleEncoder
+from PySubtitleGPT.SubtitleWriter import SubtitleWriter
+
+class LegacySubtitleLine:
+    """
+    The previous SubtitleLine implementation, which wrapped a pysrt SubRipItem, for comparison
+    """
+    def __init__(self, line, translation=None):
+        self._item = SubRipItem.from_lines(str(line).strip().split('\n'))
+        self.translation = translation
+
+    def __str__(self):
+        return str(self._item)
+
+    @property
+    def key(self):
+        return str(self.start) if self.start else self.number
+
+    @property
+    def number(self):
+        return self._item.index
+
+    @property
+    def text(self):
+        return self._item.text_without_tags
+
+    @property
+    def start(self) -> SubRipTime:
+        return self._item.start
+
+    @property
+    def end(self) -> SubRipTime:
+        return self._item.end
+
+    @property
+    def line(self):
+        return str(self._item)
+
+def GenerateSubtitles(count : int, seed : int = 1, scene_length : int = None):
+    """
+    Generate SRT content with a mix of plain and tagged lines, optionally with a long pause every scene_length lines
+    """
+    random.seed(seed)
+    phrases = ["Yes.", "What are you doing here?", "<i>I never said that.</i>", "We have to go,\nright now!", "Over there!"]
+    blocks = []
+    time_ms = 1000
+    for number in range(1, count + 1):
+        start = SubRipTime.from_ordinal(time_ms)
+        end = SubRipTime.from_ordinal(time_ms + random.randint(800, 4000))
+        blocks.append(f"{number}\n{start} --> {end}\n{random.choice(phrases)}\n")
+        time_ms = end.ordinal + random.randint(100, 3000)
+
+        if scene_length and number % scene_length == 0:
+            time_ms += 60000
+
+    return "\n".join(blocks)
+
+def MeasureLines(line_class, items : list, passes : int):
+    """
+    Measure the memory used by a list of lines, the time to create them and the time to read their properties
+    """
+    gc.collect()
+    tracemalloc.start()
+    lines = [ line_class(item) for item in items ]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del lines
+    gc.collect()
+
+    started = time.perf_counter()
+    lines = [ line_class(item) for item in items ]
+    created = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(passes):
+        for line in lines:
+            line.key, line.number, line.text, line.start, line.end
+    accessed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    copies = [ line_class(line) for line in lines ]
+    copied = time.perf_counter() - started
+
+    return { 'memory': memory, 'create': created, 'access': accessed, 'copy': copied }
+
+def BenchmarkLines(args):
+    srt = pysrt.from_string(GenerateSubtitles(args.lines))
+    items = list(srt)
+
+    print(f"{len(items)} lines, {args.passes} passes over the properties")
+    print(f"{'':<20}{'memory':>12}{'create':>10}{'access':>10}{'copy':>10}")
+
+    for name, line_class in [ ("LegacySubtitleLine", LegacySubtitleLine), ("SubtitleLine", SubtitleLine) ]:
+        results = MeasureLines(line_class, items, args.passes)
+        print(f"{name:<20}{results['memory'] / 1024 / 1024:>10.1f}MB{results['create']:>9.2f}s{results['access']:>9.2f}s{results['copy']:>9.2f}s")
+
+def CreateSubtitleFile(count : int, scene_length : int = None):
+    """
+    Create a SubtitleFile with generated subtitles
+    """
+    subtitles = SubtitleFile()
+    subtitles.originals = [ SubtitleLine(item) for item in pysrt.from_string(GenerateSubtitles(count, scene_length=scene_length)) ]
+    return subtitles
+
+def BenchmarkBatches(args):
+    subtitles = CreateSubtitleFile(args.lines)
+    options = Options({ 'scene_threshold': 2.9 })
+
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    subtitles.AutoBatch(options)
+    batched = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    batch_count = sum(scene.size for scene in subtitles.scenes)
+    print(f"{subtitles.linecount} lines in {subtitles.scenecount} scenes and {batch_count} batches")
+    print(f"AutoBatch: {batched:.2f}s, {memory / 1024 / 1024:.1f}MB")
+
+    started = time.perf_counter()
+    for _ in range(args.passes):
+        for scene in subtitles.scenes:
+            for batch in scene.batches:
+                batch.size, batch.start, batch.end, batch.untranslated
+    print(f"Batch properties x{args.passes}: {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    for scene in subtitles.scenes:
+        if scene.size > 1:
+            subtitles.MergeBatches(scene.number, [ batch.number for batch in scene.batches ])
+    print(f"Merge every scene's batches: {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    subtitles.MergeScenes([ scene.number for scene in subtitles.scenes[:len(subtitles.scenes) // 2] ])
+    print(f"Merge half the scenes: {time.perf_counter() - started:.2f}s")
+
+def BenchmarkLookup(args):
+    scene_length = 50
+    subtitles = CreateSubtitleFile(args.scenes * scene_length, scene_length=scene_length)
+    subtitles.AutoBatch(Options({ 'scene_threshold': 30.0, 'min_batch_size': 10, 'max_batch_size': 10 }))
+
+    batch_count = sum(scene.size for scene in subtitles.scenes)
+    print(f"{subtitles.linecount} lines in {subtitles.scenecount} scenes and {batch_count} batches")
+
+    numbers = [ (scene.number, [ batch.number for batch in scene.batches ]) for scene in subtitles.scenes ]
+
+    started = time.perf_counter()
+    for _ in range(args.passes):
+        for scene_number, _ in numbers:
+            subtitles.GetScene(scene_number)
+    print(f"GetScene x{args.passes}: {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    for _ in range(args.passes):
+        for scene_number, batch_numbers in numbers:
+            scene = subtitles.GetScene(scene_number)
+            for batch_number in batch_numbers:
+                scene.GetBatch(batch_number)
+    print(f"GetScene + GetBatch x{args.passes}: {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    for scene_number, _ in numbers:
+        subtitles.MergeBatches(scene_number, [1, 2])
+    print(f"MergeBatches in every scene: {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    for scene_number in range(1, subtitles.scenecount // 2 + 1):
+        subtitles.MergeScenes([ scene_number, scene_number + 1 ])
+    print(f"MergeScenes in pairs: {time.perf_counter() - started:.3f}s")
+
+def BenchmarkReparse(args):
+    subtitles = CreateSubtitleFile(args.lines)
+    options = Options({ 'max_characters': 1000 })
+    subtitles.AutoBatch(options)
+
+    batches = [ batch for scene in subtitles.scenes for batch in scene.batches ]
+
+    # Responses in the format ChatGPT is asked to use, with the lines in a different order to the originals
+    responses = []
+    for batch in batches:
+        lines = [ f"<translation start='{line.start}' end='{line.end}'>\n{line.text.upper()}\n</translation>" for line in batch.originals ]
+        lines.reverse()
+        responses.append(ChatGPTTranslation({ 'text': "\n\n".join(lines) }, None))
+
+    print(f"{subtitles.linecount} lines in {len(batches)} batches")
+
+    started = time.perf_counter()
+    for batch, response in zip(batches, responses):
+        parser = ChatGPTTranslationParser(options)
+        parser.ProcessChatGPTResponse(response)
+        batch.translated, _ = parser.MatchTranslations(batch.originals)
+        parser.ValidateTranslations()
+    print(f"Parse and match every batch: {time.perf_counter() - started:.2f}s")
+
+    # The same responses, but with the timestamps shifted a little as ChatGPT sometimes does
+    random.seed(2)
+    responses = []
+    for batch in batches:
+        lines = []
+        for line in batch.originals:
+            shift = random.randint(-200, 200)
+            start, end = SubRipTime.from_ordinal(line.start_ms + shift), SubRipTime.from_ordinal(line.end_ms + shift)
+            lines.append(f"<translation start='{start}' end='{end}'>\n{line.text.upper()}\n</translation>")
+        responses.append(ChatGPTTranslation({ 'text': "\n\n".join(lines) }, None))
+
+    unmatched_count = 0
+    started = time.perf_counter()
+    for batch, response in zip(batches, responses):
+        parser = ChatGPTTranslationParser(options)
+        parser.ProcessChatGPTResponse(response)
+        translated, unmatched = parser.MatchTranslations(batch.originals)
+        unmatched_count += len(unmatched)
+    print(f"Parse and match with shifted timestamps: {time.perf_counter() - started:.2f}s, {unmatched_count} lines unmatched")
+
+    started = time.perf_counter()
+    for batch in batches:
+        retranslated = [ line.translated for line in batch.originals[::3] ]
+        batch.translated = MergeTranslations(batch.translated, retranslated)
+    print(f"Merge retranslations of a third of the lines: {time.perf_counter() - started:.2f}s")
+
+    # Merging into a list of every translated line in the file, rather than a batch
+    translated = [ line for batch in batches for line in batch.translated ]
+    retranslated = [ line.translated for line in subtitles.originals[::3] ]
+    inserted = [ SubtitleLine.FromFields(None, line.start_ms + 1, line.end_ms, line.text) for line in subtitles.originals[1::3] ]
+    started = time.perf_counter()
+    merged = MergeTranslations(translated, retranslated + inserted)
+    print(f"Merge {len(retranslated)} replaced and {len(inserted)} new lines into {len(translated)} lines: {time.perf_counter() - started:.2f}s, {len(merged)} lines")
+
+def BenchmarkStatus(args):
+    subtitles = CreateSubtitleFile(args.lines)
+    subtitles.AutoBatch(Options({ 'scene_threshold': 2.9 }))
+
+    # Translate every other line
+    started = time.perf_counter()
+    for line in subtitles.originals[::2]:
+        line.translation = line.text.upper()
+    print(f"Translate {subtitles.translatedcount} of {subtitles.linecount} lines: {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    for _ in range(args.passes):
+        for scene in subtitles.scenes:
+            sum(batch.size for batch in scene.batches), sum(len(batch.untranslated) for batch in scene.batches)
+        sum(1 for line in subtitles.originals if line.translation) / len(subtitles.originals)
+    print(f"Count from the lines x{args.passes}: {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    for _ in range(args.passes):
+        for scene in subtitles.scenes:
+            scene.linecount, scene.untranslatedcount, scene.all_translated
+        subtitles.progress
+    print(f"Maintained counts x{args.passes}: {time.perf_counter() - started:.3f}s")
+
+def BenchmarkLoad(args):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.srt")
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write(GenerateSubtitles(args.lines))
+
+        print(f"{args.lines} lines, {os.path.getsize(filename) / 1024 / 1024:.1f}MB file")
+        print(f"{'':<20}{'peak memory':>12}{'time':>10}")
+
+        readers = [
+            ("pysrt.open", lambda: [ SubtitleLine(item) for item in pysrt.open(filename) ]),
+            ("SubtitleReader", lambda: list(SubtitleReader(filename).ReadLines()))
+        ]
+
+        for name, read in readers:
+            gc.collect()
+            tracemalloc.start()
+            lines = read()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            del lines
+            gc.collect()
+
+            started = time.perf_counter()
+            lines = read()
+            elapsed = time.perf_counter() - started
+
+            del lines
+            print(f"{name:<20}{peak / 1024 / 1024:>10.1f}MB{elapsed:>9.2f}s")
+
+def BenchmarkSave(args):
+    subtitles = CreateSubtitleFile(args.lines)
+    for line in subtitles.originals:
+        line.translation = line.text.upper()
+
+    translated = [ line.translated for line in subtitles.originals ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark-ChatGPT.srt")
+
+        # What pysrt would have written, to check the output against
+        pysrt.SubRipFile(items=translated).save(filename)
+        with open(filename, 'rb') as file:
+            expected = file.read()
+
+        # Fresh copies of the lines, which haven't been formatted yet
+        translated = [ line.translated for line in subtitles.originals ]
+        writer = SubtitleWriter(filename)
+
+        started = time.perf_counter()
+        writer.WriteLines(translated)
+        print(f"SubtitleWriter first save: {time.perf_counter() - started:.2f}s")
+
+        # Change one line in a hundred between saves, as if more scenes had been translated
+        started = time.perf_counter()
+        for index in range(args.passes):
+            for line in translated[index::100]:
+                line.text = line.text.lower()
+            writer.WriteLines(translated)
+        print(f"SubtitleWriter repeated saves x{args.passes}: {time.perf_counter() - started:.2f}s")
+
+        for index in range(args.passes):
+            for line in translated[index::100]:
+                line.text = line.text.upper()
+        writer.WriteLines(translated)
+
+        with open(filename, 'rb') as file:
+            print(f"Output matches SubRipFile: {file.read() == expected}")
+
+def BenchmarkProject(args):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.srt")
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write(GenerateSubtitles(args.lines))
+
+        project = SubtitleProject(Options({ 'project': 'write' }))
+        project.Initialise(filename)
+
+        subtitles = project.subtitles
+        subtitles.AutoBatch(Options({ 'scene_threshold': 2.9 }))
+        project.WriteProjectFile()
+
+        batches = [ batch for scene in subtitles.scenes for batch in scene.batches ]
+
+        print(f"{subtitles.linecount} lines in {len(batches)} batches")
+
+        # Translate the batches one at a time, saving progress after each batch
+        journal_time = 0.0
+        rewrite_time = 0.0
+        rewrites = 0
+        for index, batch in enumerate(batches):
+            lines = [ f"<translation start='{line.start}' end='{line.end}'>\n{line.text.upper()}\n</translation>" for line in batch.originals ]
+            batch.translation = ChatGPTTranslation({ 'text': "\n\n".join(lines) }, None)
+            batch.translated = [ line.translated for line in batch.originals ]
+            for line in batch.originals:
+                line.translation = line.text.upper()
+
+            started = time.perf_counter()
+            project._on_batch_translated(batch)
+            journal_time += time.perf_counter() - started
+
+            # Rewriting the whole project is too slow to do after every batch, so sample it
+            if index % max(len(batches) // args.passes, 1) == 0:
+                started = time.perf_counter()
+                project.WriteProjectFile(os.path.join(directory, "rewrite.subtrans"))
+                rewrite_time += time.perf_counter() - started
+                rewrites += 1
+
+        print(f"Rewrite the project file after every batch: {rewrite_time / rewrites * len(batches):.2f}s (estimated from {rewrites} rewrites)")
+        print(f"Append every batch to the journal: {journal_time:.2f}s, project file {os.path.getsize(project.projectfile) / 1024 / 1024:.1f}MB, journal {project.journal.size / 1024 / 1024:.1f}MB")
+
+        started = time.perf_counter()
+        project.ReadProjectFile()
+        print(f"Read the project file and replay the journal: {time.perf_counter() - started:.2f}s, {project.subtitles.translatedcount} lines translated")
+
+def CreateTranslatedProject(count : int):
+    """
+    Create batched subtitles with a translation and a stored response and prompt for every batch
+    """
+    subtitles = CreateSubtitleFile(count)
+    subtitles.AutoBatch(Options({ 'scene_threshold': 2.9 }))
+
+    options = Options()
+    context = {
+        'synopsis': "A retired detective is drawn back into a case that has haunted him for twenty years when a body is found in the harbour of a small fishing town, and he has to work with the young officer who replaced him to find out what really happened.",
+        'characters': "Walter, Ingrid, Sergeant Dahl, Mrs Halvorsen, Petter, The Harbourmaster"
+    }
+
+    for scene in subtitles.scenes:
+        for batch in scene.batches:
+            prompt = ChatGPTPrompt(options.get('instructions'))
+            prompt.GenerateMessages(options.get('gpt_prompt'), batch.originals, { **context, 'summary': f"Scene {scene.number}" })
+
+            lines = [ f"<translation start='{line.start}' end='{line.end}'>\n{line.text.upper()}\n</translation>" for line in batch.originals ]
+            batch.translation = ChatGPTTranslation({ 'text': "\n\n".join(lines) }, prompt)
+            batch.translated = [ line.translated for line in batch.originals ]
+            for line in batch.originals:
+                line.translation = line.text.upper()
+
+    return subtitles
+
+def BenchmarkOpen(args):
+    subtitles = CreateTranslatedProject(args.lines)
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_file = os.path.join(directory, "legacy.subtrans")
+        with open(legacy_file, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(subtitles, cls=SubtitleEncoder, line_blocks=True, ensure_ascii=False, indent=4))
+
+        indexed_file = os.path.join(directory, "indexed.subtrans")
+        IndexedProjectFile(indexed_file).Write(subtitles)
+
+        print(f"{subtitles.linecount} lines, {os.path.getsize(legacy_file) / 1024 / 1024:.1f}MB project file")
+
+        started = time.perf_counter()
+        with open(legacy_file, 'r', encoding='utf-8') as file:
+            legacy = json.load(file, cls=SubtitleDecoder)
+        print(f"Open the JSON project file: {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        indexed = IndexedProjectFile(indexed_file).Read()
+        opened = time.perf_counter() - started
+        summary = [ (scene.number, scene.linecount, scene.translatedcount, scene.all_translated) for scene in indexed.scenes ]
+        print(f"Open the indexed project file: {opened:.3f}s, {len(summary)} scenes, {indexed.translatedcount} lines translated")
+
+        started = time.perf_counter()
+        batch = indexed.scenes[len(indexed.scenes) // 2].batches[0]
+        batch.originals, batch.translation
+        print(f"Load one batch: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        started = time.perf_counter()
+        indexed.originals
+        print(f"Load every batch: {time.perf_counter() - started:.2f}s")
+
+        legacy_json = json.dumps(legacy, cls=SubtitleEncoder, ensure_ascii=False)
+        print(f"Indexed project matches: {json.dumps(indexed, cls=SubtitleEncoder, ensure_ascii=False) == legacy_json}")
+
+def BenchmarkFormats(args):
+    subtitles = CreateTranslatedProject(args.lines)
+    print(f"{subtitles.linecount} lines")
+    print(f"{'':<10}{'size':>10}{'write':>10}{'open':>10}{'load all':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = None
+        for project_format in [ 'json', 'indexed', 'compact' ]:
+            project = SubtitleProject(Options({ 'project': 'read', 'project_format': project_format }))
+            project.projectfile = os.path.join(directory, f"{project_format}.subtrans")
+            project.subtitles = subtitles
+
+            started = time.perf_counter()
+            project.WriteProjectFile()
+            written = time.perf_counter() - started
+
+            started = time.perf_counter()
+            reloaded = project.ReadProjectFile()
+            opened = time.perf_counter() - started
+
+            started = time.perf_counter()
+            reloaded.originals
+            loaded = time.perf_counter() - started
+
+            size = os.path.getsize(project.projectfile)
+            print(f"{project_format:<10}{size / 1024 / 1024:>8.1f}MB{written:>9.2f}s{opened:>9.2f}s{loaded:>9.2f}s")
+
+            reloaded_json = json.dumps(reloaded, cls=SubtitleEncoder, ensure_ascii=False)
+            expected = expected or reloaded_json
+            if reloaded_json != expected:
+                print(f"{project_format} project does not match the json project")
+
+def BenchmarkStrings(args):
+    subtitles = CreateTranslatedProject(args.lines)
+    print(f"{subtitles.linecount} lines")
+    print(f"{'':<22}{'size':>10}{'write':>10}{'load all':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for compact in [ False, True ]:
+            for use_table in [ False, True ]:
+                projectfile = IndexedProjectFile(os.path.join(directory, "strings.subtrans"), compact=compact)
+                if not use_table:
+                    # Nothing is repeated often enough to be stored in the table
+                    projectfile._count_strings = lambda subtitles: (StringTable(), {})
+
+                started = time.perf_counter()
+                projectfile.Write(subtitles)
+                written = time.perf_counter() - started
+
+                reloaded = IndexedProjectFile(projectfile.filename).Read()
+                started = time.perf_counter()
+                for scene in reloaded.scenes:
+                    for batch in scene.batches:
+                        batch.translation
+                loaded = time.perf_counter() - started
+
+                name = f"{'compact' if compact else 'indexed'}{' + strings' if use_table else ''}"
+                size = os.path.getsize(projectfile.filename)
+                print(f"{name:<22}{size / 1024 / 1024:>8.1f}MB{written:>9.2f}s{loaded:>9.2f}s")
+
+def BenchmarkDecode(args):
+    subtitles = CreateTranslatedProject(args.lines)
+
+    encodings = [
+        ("SRT blocks", json.dumps(subtitles, cls=SubtitleEncoder, line_blocks=True, ensure_ascii=False)),
+        ("fields", json.dumps(subtitles, cls=SubtitleEncoder, ensure_ascii=False))
+    ]
+
+    del subtitles
+    gc.collect()
+
+    print(f"{args.lines} lines")
+    for name, data in encodings:
+        elapsed = None
+        for _ in range(args.passes):
+            started = time.perf_counter()
+            decoded = json.loads(data, cls=SubtitleDecoder)
+            elapsed = min(elapsed or float('inf'), time.perf_counter() - started)
+            del decoded
+
+        print(f"Decode a project with lines stored as {name}: {elapsed:.2f}s ({len(data) / 1024 / 1024:.1f}MB)")
+
+def BenchmarkMemory(args):
+    """
+    Measure the peak memory used to write a project in each format, in a separate process for each format
+    because the peak can't be reset
+    """
+    if not args.projectformat:
+        for project_format in [ 'json.dumps', 'json', 'indexed', 'compact' ]:
+            subprocess.run([ sys.executable, __file__, 'memory', '-n', str(args.lines), '--projectformat', project_format ], check=True)
+        return
+
+    import resource
+
+    subtitles = CreateTranslatedProject(args.lines)
+    gc.collect()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "memory.subtrans")
+        # ru_maxrss is in kilobytes on Linux
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        started = time.perf_counter()
+        if args.projectformat == 'json.dumps':
+            # How the json format was written before it was streamed
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write(json.dumps(subtitles, cls=SubtitleEncoder, line_blocks=True, ensure_ascii=False, indent=4))
+        else:
+            project = SubtitleProject(Options({ 'project': 'read', 'project_format': args.projectformat }))
+            project.projectfile = filename
+            project.subtitles = subtitles
+            project.WriteProjectFile()
+        elapsed = time.perf_counter() - started
+
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        size = os.path.getsize(filename)
+        print(f"{args.projectformat:<12}{size / 1024 / 1024:>8.1f}MB{elapsed:>9.2f}s  peak RSS {after / 1024:.0f}MB (+{(after - before) / 1024:.0f}MB while writing)")
+
+benchmarks = {
+    'lines': BenchmarkLines,
+    'batches': BenchmarkBatches,
+    'lookup': BenchmarkLookup,
+    'reparse': BenchmarkReparse,
+    'status': BenchmarkStatus,
+    'load': BenchmarkLoad,
+    'save': BenchmarkSave,
+    'project': BenchmarkProject,
+    'open': BenchmarkOpen,
+    'formats': BenchmarkFormats,
+    'strings': BenchmarkStrings,
+    'decode': BenchmarkDecode,
+    'memory': BenchmarkMemory,
+}
+
+parser = argparse.ArgumentParser(description='Measure the performance of PySubtitleGPT data structures')
+parser.add_argument('benchmark', choices=benchmarks.keys(), help="Which benchmark to run")
+parser.add_argument('-n', '--lines', type=int, default=100000, help="Number of subtitle lines to generate")
+parser.add_argument('--scenes', type=int, default=2000, help="Number of scenes to generate for the lookup benchmark")
+parser.add_argument('--projectformat', help="Project format for the memory benchmark (all of them if not specified)")
+parser.add_argument('--passes', type=int, default=5, help="Number of times to read the properties of every line")
+
+args = parser.parse_args()
+
+benchmarks[args.benchmark](args)
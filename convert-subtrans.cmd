@@ -0,0 +1,10 @@
+@echo off
+
+rem Activate the virtual environment
+call envsubtrans\Scripts\activate.bat
+
+rem Run the script with the provided arguments
+python convert-subtrans.py %*
+
+rem Deactivate the virtual environment
+call envsubtrans\Scripts\deactivate
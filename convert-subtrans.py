@@ -0,0 +1,38 @@
+import os
+import argparse
+import logging
+
+from PySubtitleGPT.Options import Options
+from PySubtitleGPT.ProjectJournal import ProjectJournal
+from PySubtitleGPT.SubtitleProject import SubtitleProject, project_formats
+
+logging_level = eval(f"logging.{os.getenv('LOG_LEVEL', 'INFO')}")
+logging.basicConfig(format='%(levelname)s: %(message)s', level=logging_level)
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='Converts a project file to a different format')
+parser.add_argument('input', help="Project file path")
+parser.add_argument('-o', '--output', help="Converted project file path (the project file is replaced if not specified)")
+parser.add_argument('-f', '--format', type=str, required=True, choices=project_formats, help="The format to convert the project file to")
+
+args = parser.parse_args()
+
+try:
+    project = SubtitleProject(Options({ 'project': 'read', 'project_format': args.format }))
+    project.projectfile = args.input
+    project.journal = ProjectJournal(args.input)
+
+    subtitles = project.ReadProjectFile()
+    if not subtitles or not subtitles.scenes:
+        raise ValueError(f"Unable to read project file {args.input}")
+
+    input_size = os.path.getsize(args.input)
+
+    project.WriteProjectFile(args.output or args.input)
+
+    output_size = os.path.getsize(args.output or args.input)
+    logging.info(f"Converted {subtitles.linecount} lines to {args.format} format, {input_size / 1024:.0f}KB to {output_size / 1024:.0f}KB")
+
+except Exception as e:
+    print("Error:", e)
+    raise
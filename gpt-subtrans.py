@@ -16,9 +16,11 @@ parser.add_argument('-o', '--output', help="Output SRT file path")
 parser.add_argument('-l', '--target_language', type=str, default=None, help="The target language for the translation")
 parser.add_argument('-m', '--moviename', type=str, default=None, help="Optionally specify the name of the movie to help the translator")
 parser.add_argument('-r', '--ratelimit', type=int, default=None, help="Maximum number of batches per minute to process")
+parser.add_argument('--tokenratelimit', type=int, default=None, help="Maximum number of tokens per minute to use")
 parser.add_argument('-k', '--apikey', type=str, default=None, help="Your OpenAI API Key (https://platform.openai.com/account/api-keys)")
-parser.add_argument('-t', '--temperature', type=float, default=0.0, help="A higher temperature increases the random variance of translations.")
+parser.add_argument('-t', '--temperature', type=float, default=None, help="A higher temperature increases the random variance of translations.")
 parser.add_argument('-p', '--project', type=str, default=None, help="Read or Write project file to working directory")
+parser.add_argument('--projectformat', type=str, default=None, choices=['json', 'indexed', 'compact'], help="How to store the project file: a single JSON document, indexed (the default) or compact")
 parser.add_argument('-c', '--character', action='append', type=str, default=None, help="Read or Write project file to working directory")
 parser.add_argument('-s', '--substitution', action='append', type=str, default=None, help="A pair of strings separated by ::, to subsitute in source or translation")
 parser.add_argument('-i', '--instruction', action='append', type=str, default=None, help="An instruction for Chat GPT about the translation")
@@ -27,9 +29,21 @@ parser.add_argument('--synopsis', type=str, default=None, help="A brief synopsis
 parser.add_argument('--characters', type=str, default=None, help="A list of character names")
 parser.add_argument('--minbatchsize', type=int, default=None, help="Minimum number of lines to consider starting a new batch")
 parser.add_argument('--maxbatchsize', type=int, default=None, help="Maximum number of lines before starting a new batch is compulsory")
+parser.add_argument('--batchtokens', type=int, default=None, help="Pack batches up to an estimated number of tokens instead of using the batch size")
+parser.add_argument('--adaptivebatches', action='store_true', help="Adjust the batch size during translation based on the responses")
 parser.add_argument('--batchthreshold', type=float, default=None, help="Number of seconds between lines to consider for batching")
 parser.add_argument('--scenethreshold', type=float, default=None, help="Number of seconds between lines to consider a new scene")
 parser.add_argument('--maxlines', type=int, default=None, help="Maximum number of batches to process")
+parser.add_argument('--responsecache', type=str, default=None, help="Path of a file to cache OpenAI responses in, to avoid paying for them again")
+parser.add_argument('--bypasscache', action='store_true', help="Don't use cached responses (they will still be updated)")
+parser.add_argument('--parallelbatches', action='store_true', help="Translate all the batches in a scene at the same time")
+parser.add_argument('--consistencypass', action='store_true', help="Review batches translated in parallel for consistency with the rest of the scene")
+parser.add_argument('--targetedretries', action='store_true', help="Only retranslate the lines that failed validation, rather than the whole batch")
+parser.add_argument('--translationmemory', action='store_true', help="Fill in repeated lines with the translation of an earlier occurrence")
+parser.add_argument('--skiprepeats', action='store_true', help="Leave lines that can be filled from the translation memory out of the prompts")
+parser.add_argument('--matchtolerance', type=float, default=None, help="Number of seconds a translation's timestamps can differ from the original line and still be matched with it")
+parser.add_argument('--stream', action='store_true', help="Stream responses from OpenAI so that translated lines are reported as they arrive")
+parser.add_argument('--maxthreads', type=int, default=None, help="Maximum number of scenes to translate at the same time")
 
 args = parser.parse_args()
 
@@ -37,7 +51,18 @@ try:
     source = Options({
         'api_key': args.apikey,
         'max_lines': args.maxlines,
+        'max_threads': args.maxthreads,
+        'batch_mode': "parallel" if args.parallelbatches else None,
+        'consistency_pass': args.consistencypass,
+        'stream_responses': args.stream,
+        'targeted_retranslation': args.targetedretries,
+        'translation_memory': args.translationmemory or args.skiprepeats,
+        'exclude_remembered_lines': args.skiprepeats,
+        'match_tolerance': args.matchtolerance,
+        'response_cache': args.responsecache,
+        'bypass_cache': args.bypasscache,
         'rate_limit': args.ratelimit,
+        'token_rate_limit': args.tokenratelimit,
         'target_language': args.target_language,
         'movie_name': args.moviename or args.input,
         'synopsis': args.synopsis,
@@ -47,9 +72,12 @@ try:
         'instruction_args': args.instruction,
         'min_batch_size': args.minbatchsize,
         'max_batch_size': args.maxbatchsize,
+        'batch_token_budget': args.batchtokens,
+        'adaptive_batch_size': args.adaptivebatches,
         'batch_threshold': args.batchthreshold,
         'scene_threshold': args.scenethreshold,
-        'project': args.project and args.project.lower()
+        'project': args.project and args.project.lower(),
+        'project_format': args.projectformat
     })
 
     # Process the project options
@@ -65,6 +93,8 @@ try:
         logging.info(f"Writing project data to {str(project.projectfile)}")
         project.WriteProjectFile()
 
+    project.Close()
+
 except Exception as e:
     print("Error:", e)
     raise